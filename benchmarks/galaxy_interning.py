@@ -0,0 +1,71 @@
+"""
+Measure the memory held by a worker's references to galaxies, e.g. from the
+measurements of many sessions, with and without shared (interned)
+`GalaxyData` instances, and the time taken to build them.
+
+    python benchmarks/galaxy_interning.py --references 5000 --galaxies 300
+"""
+
+import argparse
+import gc
+import tracemalloc
+from time import perf_counter
+
+from hubbleds.galaxies import GalaxyData, intern_galaxy
+
+
+def _galaxy_json(galaxy_id: int) -> dict:
+    return {
+        "id": galaxy_id,
+        "name": f"J{galaxy_id:06d}+000000.0.fits",
+        "ra": 150.0 + galaxy_id / 1000,
+        "decl": 2.0 + galaxy_id / 1000,
+        "z": 0.01 + galaxy_id / 100000,
+        "type": "Sp",
+        "element": "H-α",
+    }
+
+
+def _separate(rows: list[dict]) -> list[GalaxyData]:
+    return [GalaxyData.model_validate(row) for row in rows]
+
+
+def _interned(rows: list[dict]) -> list[GalaxyData]:
+    return [intern_galaxy(row) for row in rows]
+
+
+def _measure(build, rows: list[dict]) -> tuple[int, float]:
+    gc.collect()
+    tracemalloc.start()
+    start = perf_counter()
+    galaxies = build(rows)
+    elapsed = perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del galaxies
+    return current, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--references", type=int, default=5000)
+    parser.add_argument("--galaxies", type=int, default=300)
+    args = parser.parse_args()
+
+    # Each reference arrives as its own dictionary, as in an API response
+    rows = [_galaxy_json(i % args.galaxies) for i in range(args.references)]
+
+    # Warm the registry, as the galaxy catalog does when the server starts
+    _interned(rows[: args.galaxies])
+
+    separate, separate_time = _measure(_separate, rows)
+    interned, interned_time = _measure(_interned, rows)
+
+    print(f"{args.references} references to {args.galaxies} galaxies")
+    print(f"  separate galaxies: {separate / 1024:10.1f} KiB {1000 * separate_time:8.1f} ms")
+    print(f"  interned galaxies: {interned / 1024:10.1f} KiB {1000 * interned_time:8.1f} ms")
+    print(f"  memory reduction:  {100 * (1 - interned / separate):10.1f} %")
+
+
+if __name__ == "__main__":
+    main()
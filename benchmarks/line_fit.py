@@ -0,0 +1,49 @@
+"""
+Compare `fit_line` with the astropy fit it replaces for lines through the
+origin, at the sizes used in the story: one student's measurements, a
+class, and a large set of classes.
+
+    python benchmarks/line_fit.py --points 5 150 5000 --repeat 500
+"""
+
+import argparse
+from timeit import timeit
+
+from astropy.modeling import fitting, models
+from numpy import isclose
+from numpy.random import default_rng
+
+from hubbleds.utils import fit_line
+
+
+def _astropy_fit(x, y):
+    # The previous implementation
+    fit = fitting.LinearLSQFitter()
+    line_init = models.Linear1D(intercept=0, fixed={"intercept": True})
+    return fit(line_init, x, y)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--points", type=int, nargs="+", default=[5, 150, 5000])
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = default_rng(42)
+    for points in args.points:
+        x = rng.uniform(10, 500, points)
+        y = 70 * x + rng.normal(0, 800, points)
+
+        assert isclose(fit_line(x, y).slope.value, _astropy_fit(x, y).slope.value)
+
+        astropy_seconds = timeit(lambda: _astropy_fit(x, y), number=args.repeat)
+        direct_seconds = timeit(lambda: fit_line(x, y), number=args.repeat)
+
+        print(f"{points} points")
+        print(f"  astropy: {1e6 * astropy_seconds / args.repeat:10.1f} µs")
+        print(f"  direct:  {1e6 * direct_seconds / args.repeat:10.1f} µs")
+        print(f"  speedup: {astropy_seconds / direct_seconds:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Compare the ways of hydrating a measurements response body into
+`StudentMeasurement` objects, at class size and all-data size.
+
+    python benchmarks/measurement_hydration.py --rows 150 50000 --galaxies 300
+"""
+
+import argparse
+import json
+from time import perf_counter
+
+from hubbleds.state import StudentMeasurement, parse_measurements
+
+
+def _measurement_json(index: int, galaxies: int) -> dict:
+    galaxy_id = index % galaxies
+    return {
+        "student_id": index // 5,
+        "class_id": index // 100,
+        "rest_wave_unit": "angstrom",
+        "obs_wave_value": 6600.0 + index % 50,
+        "obs_wave_unit": "angstrom",
+        "velocity_value": 1500.0 + index % 700,
+        "velocity_unit": "km / s",
+        "ang_size_value": 30.0,
+        "ang_size_unit": "arcsecond",
+        "est_dist_value": 200.0,
+        "est_dist_unit": "Mpc",
+        "measurement_number": None,
+        "brightness": 1.0,
+        "galaxy": {
+            "id": galaxy_id,
+            "name": f"J{galaxy_id:06d}+000000.0.fits",
+            "ra": 150.0 + galaxy_id / 1000,
+            "decl": 2.0 + galaxy_id / 1000,
+            "z": 0.01 + galaxy_id / 100000,
+            "type": "Sp",
+            "element": "H-α",
+        },
+    }
+
+
+def _per_row(content: bytes) -> list[StudentMeasurement]:
+    # The previous path
+    return [StudentMeasurement(**m) for m in json.loads(content)["measurements"]]
+
+
+def _best_of(func, content: bytes, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        func(content)
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[150, 50000])
+    parser.add_argument("--galaxies", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    paths = {
+        "per-row validation": _per_row,
+        "batch validation": parse_measurements,
+    }
+
+    for rows in args.rows:
+        content = json.dumps(
+            {"measurements": [_measurement_json(i, args.galaxies) for i in range(rows)]}
+        ).encode()
+
+        # Register the galaxies first, as the galaxy catalog does on startup
+        parse_measurements(content)
+
+        print(f"{rows} rows ({len(content) / 1024:.0f} KiB)")
+        for label, func in paths.items():
+            seconds = _best_of(func, content, args.repeat)
+            print(f"  {label:22s} {1000 * seconds:10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Compare the story and stage state encoders and decoders with the previous
+`json.dumps(..., cls=CDSJSONEncoder)` and `json.loads` path, on states with
+many multiple choice and free response entries. The states are plain
+dictionaries and models shaped like the story's, so no app state is built.
+
+    python benchmarks/state_serialization.py --questions 150 --repeat 2000
+"""
+
+import argparse
+import datetime
+import enum
+import json
+from timeit import timeit
+
+import numpy as np
+from pydantic import BaseModel
+
+from cosmicds.utils import CDSJSONEncoder
+
+from hubbleds.serialization import dump_model, dumps, loads
+
+
+class _Marker(enum.Enum):
+    first = 1
+    last = 2
+
+
+class _StageState(BaseModel):
+    current_step: _Marker = _Marker.last
+    stage_id: str = "class_results"
+    seen: list[int] = list(range(40))
+    fit_slope: float = 21.4
+    histogram_range: list[float] = [10.5, 14.2]
+    updated: datetime.datetime = datetime.datetime(2024, 9, 1, 12, 30)
+
+
+def _story_state(questions: int) -> dict:
+    # Shaped as built by `remote._story_state`, with the answers from their stores
+    return {
+        "app": {"update_db": True, "show_team_interface": False, "speech": {}},
+        "story": {
+            "title": "Hubble's Law",
+            "story_id": "hubbles_law",
+            "calculations": {"ages": np.linspace(10, 15, 40).tolist()},
+            "validation_failure_counts": {},
+            "has_best_fit_galaxy": False,
+            "best_fit_slope": 16.2,
+            "mc_scoring": {
+                "scores": {
+                    f"mc-{i}": dict(
+                        tag=f"mc-{i}", score=10, choice=i % 4, tries=1, wrong_attempts=0, stage=i % 6
+                    )
+                    for i in range(questions)
+                }
+            },
+            "free_responses": {
+                "responses": {
+                    f"fr-{i}": dict(
+                        tag=f"fr-{i}",
+                        response="The galaxies farther away are moving faster. " * 3,
+                        initialized=True,
+                        stage=i % 6,
+                    )
+                    for i in range(questions)
+                }
+            },
+        },
+    }
+
+
+def _previous_stage_json(stage_state: _StageState) -> str:
+    state = stage_state.model_dump()
+    state["current_step"] = stage_state.current_step.value
+    return json.dumps(state, cls=CDSJSONEncoder)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--questions", type=int, default=150)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    story_state = _story_state(args.questions)
+    stage_state = _StageState()
+    story_json = json.dumps(story_state, cls=CDSJSONEncoder)
+    stage_json = _previous_stage_json(stage_state)
+
+    assert loads(dumps(story_state)) == json.loads(story_json)
+    assert loads(dump_model(stage_state)) == json.loads(stage_json)
+    assert _StageState.model_validate(loads(stage_json)) == stage_state
+
+    timings = {
+        "story encode (json)": lambda: json.dumps(story_state, cls=CDSJSONEncoder),
+        "story encode (new)": lambda: dumps(story_state),
+        "story decode (json)": lambda: json.loads(story_json),
+        "story decode (new)": lambda: loads(story_json),
+        "stage encode (json)": lambda: _previous_stage_json(stage_state),
+        "stage encode (new)": lambda: dump_model(stage_state),
+        "stage decode (json)": lambda: _StageState(**json.loads(stage_json)),
+        "stage decode (new)": lambda: _StageState.model_validate(loads(stage_json)),
+    }
+
+    print(f"{args.questions} MC and {args.questions} FR entries ({len(story_json)} bytes)")
+    for label, func in timings.items():
+        seconds = timeit(func, number=args.repeat)
+        print(f"  {label:20s} {1e6 * seconds / args.repeat:10.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
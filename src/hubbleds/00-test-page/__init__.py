@@ -9,7 +9,9 @@ from cosmicds.components import ScaffoldAlert
 from cosmicds.logger import setup_logger
 
 # hubbleds
+from hubbleds.async_remote import ASYNC_API
 from hubbleds.remote import LOCAL_API
+from hubbleds.write_behind import stage_state_write, schedule_write
 from hubbleds.base_component_state import (
     transition_to,
     transition_previous,
@@ -18,6 +20,8 @@ from hubbleds.base_component_state import (
 from hubbleds.state import (
     LOCAL_STATE, 
     GLOBAL_STATE, 
+    MC_SCORES,
+    FREE_RESPONSES,
     mc_callback, 
     fr_callback, 
     get_free_response, 
@@ -45,7 +49,7 @@ def Page():
     loaded_component_state = solara.use_reactive(False)
     
     async def _load_component_state():
-        LOCAL_API.get_stage_state(GLOBAL_STATE, LOCAL_STATE, COMPONENT_STATE)
+        await ASYNC_API.get_stage_state(GLOBAL_STATE, LOCAL_STATE, COMPONENT_STATE)
         logger.info("Finished loading component state")
         loaded_component_state.set(True)
     
@@ -55,10 +59,15 @@ def Page():
         if not loaded_component_state.value:
             return
 
-        # Listen for changes in the states and write them to the database
-        LOCAL_API.put_stage_state(GLOBAL_STATE, LOCAL_STATE, COMPONENT_STATE)
-
-        logger.info("Wrote component state to database.")
+        # Listen for changes in the states and queue a write to the database;
+        #  bursts of changes are coalesced into a single write
+        schedule_write(
+            stage_state_write(COMPONENT_STATE.value.stage_id),
+            LOCAL_API.put_stage_state,
+            GLOBAL_STATE,
+            LOCAL_STATE,
+            COMPONENT_STATE,
+        )
 
     solara.lab.use_task(_write_component_state, dependencies=[COMPONENT_STATE.value])
     
@@ -91,9 +100,9 @@ def Page():
     
     with solara.Card():
         with solara.Div():
-            solara.Text(f"mc_scoring: {LOCAL_STATE.value.mc_scoring}")
+            solara.Text(f"mc_scoring: {MC_SCORES.serialize()}")
         with solara.Div():
-            solara.Text(f"free_responses: {LOCAL_STATE.value.free_responses}")
+            solara.Text(f"free_responses: {FREE_RESPONSES.serialize()}")
 
     
     # convenience function
@@ -135,7 +144,7 @@ def Page():
                 event_back_callback = lambda _: transition_previous(COMPONENT_STATE),
                 can_advance=COMPONENT_STATE.value.can_transition(next=True),
                 show=COMPONENT_STATE.value.is_current_step(Marker.mark3),
-                event_fr_callback = lambda event: fr_callback(event, LOCAL_STATE, COMPONENT_STATE, lambda: LOCAL_API.put_story_state(GLOBAL_STATE, LOCAL_STATE)),
+                event_fr_callback = lambda event: fr_callback(event, LOCAL_STATE, COMPONENT_STATE),
                 state_view={
                     'free_response': get_free_response(LOCAL_STATE, COMPONENT_STATE,'fr-1')
                 }
@@ -0,0 +1,293 @@
+"""
+A process-wide snapshot of the "all data" payload (every student's
+measurements and the student and class summaries), which is nearly the same
+for every student who reaches it.
+
+The snapshot is refreshed at most every `ttl` seconds. In incremental mode,
+which needs server support, a refresh only asks for the rows of students and
+classes whose `last_data_update` is newer than the latest one already held;
+otherwise, and every `full_refresh` seconds regardless, the whole payload is
+reloaded.
+Measurements are held in a `MeasurementTable` sorted by class, and sessions
+get per-class views of it.
+"""
+
+import datetime
+from itertools import chain
+from threading import Lock
+from time import monotonic
+from typing import Callable, Optional
+
+from numpy import argsort, isin, searchsorted, unique
+
+from cosmicds.logger import setup_logger
+
+from .columnar import AllDataPayload, MeasurementTable
+from .state import ClassSummary, StudentSummary
+
+logger = setup_logger("ALL-DATA")
+
+AllDataView = tuple[
+    MeasurementTable, tuple[StudentSummary, ...], tuple[ClassSummary, ...]
+]
+
+
+def _utc(timestamp: datetime.datetime) -> datetime.datetime:
+    # Timestamps without a timezone are taken to be in UTC, so that they can
+    #  be compared with those that have one
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=datetime.timezone.utc)
+    return timestamp.astimezone(datetime.timezone.utc)
+
+
+class _Snapshot:
+    """
+    The data of one story as of one refresh. Snapshots are never modified
+    once they are published, so sessions can read them without a lock.
+    """
+
+    def __init__(
+        self,
+        measurements: MeasurementTable,
+        student_summaries: dict[int, StudentSummary],
+        class_summaries: dict[int, ClassSummary],
+        watermark: Optional[datetime.datetime],
+        refreshed_at: float,
+        fully_refreshed_at: Optional[float],
+    ):
+        self.measurements = measurements
+        self.student_summaries = student_summaries
+        self.class_summaries = class_summaries
+        self.watermark = watermark
+        self.refreshed_at = refreshed_at
+        self.fully_refreshed_at = fully_refreshed_at
+        # Views are built on demand; two sessions may build the same one
+        self.views: dict[Optional[int], AllDataView] = {}
+
+
+class _StoryData:
+    def __init__(self):
+        # Held by the one session refreshing the story
+        self.refresh_lock = Lock()
+        self.snapshot: Optional[_Snapshot] = None
+
+
+class AllDataSnapshot:
+    """
+    Parameters
+    ----------
+    ttl: float
+        The number of seconds the snapshot is served without a refresh
+    full_refresh: float
+        The maximum number of seconds between full reloads
+    incremental: bool
+        Whether to ask for only the rows updated since the last refresh. The
+        production server doesn't support this yet; only the local stand-in
+        (see `hubbleds.stand_in`) does.
+    """
+
+    def __init__(self, ttl: float, full_refresh: float, incremental: bool = False):
+        self.ttl = ttl
+        self.full_refresh = full_refresh
+        self.incremental = incremental
+        self._lock = Lock()
+        self._stories: dict[str, _StoryData] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.incremental_refreshes = 0
+        self.full_refreshes = 0
+        self.failed_refreshes = 0
+
+    def _story(self, story_id: str) -> _StoryData:
+        with self._lock:
+            return self._stories.setdefault(story_id, _StoryData())
+
+    def get(
+        self,
+        story_id: str,
+        class_id: Optional[int],
+        fetch: Callable[[Optional[datetime.datetime]], AllDataPayload],
+    ) -> AllDataView:
+        """
+        Return the measurements and summaries of every class other than
+        `class_id`, refreshing the snapshot first if it is out of date.
+
+        `fetch` is called with the watermark for an incremental refresh, or
+        `None` for a full one. It returns the parsed all-data payload, whose
+        `since` must echo the watermark if only newer rows were included.
+        The returned table is shared between sessions.
+
+        One session refreshes an out-of-date snapshot while the others keep
+        being served the previous one; sessions only wait when there is no
+        snapshot yet. If a refresh fails, the previous snapshot is kept.
+        """
+        story = self._story(story_id)
+        snapshot = story.snapshot
+
+        if snapshot is not None and monotonic() - snapshot.refreshed_at < self.ttl:
+            self.hits += 1
+        elif snapshot is not None and not story.refresh_lock.acquire(blocking=False):
+            self.stale_hits += 1
+        else:
+            if snapshot is None:
+                story.refresh_lock.acquire()
+            try:
+                snapshot = self._refresh(story, fetch)
+            finally:
+                story.refresh_lock.release()
+
+        view = snapshot.views.get(class_id)
+        if view is None:
+            view = snapshot.views[class_id] = self._view(snapshot, class_id)
+
+        return view
+
+    def _refresh(
+        self,
+        story: _StoryData,
+        fetch: Callable[[Optional[datetime.datetime]], AllDataPayload],
+    ) -> _Snapshot:
+        previous = story.snapshot
+        now = monotonic()
+
+        # Another session may have refreshed the snapshot while we waited
+        if previous is not None and now - previous.refreshed_at < self.ttl:
+            self.hits += 1
+            return previous
+
+        incremental = (
+            self.incremental
+            and previous is not None
+            and previous.watermark is not None
+            and previous.fully_refreshed_at is not None
+            and now - previous.fully_refreshed_at < self.full_refresh
+        )
+
+        try:
+            payload = fetch(previous.watermark if incremental else None)
+            snapshot = self._apply(previous, payload, incremental, now)
+        except Exception as e:
+            if previous is None:
+                raise
+            self.failed_refreshes += 1
+            logger.warning("Failed to refresh all data; serving previous snapshot: %s", e)
+            return previous
+
+        story.snapshot = snapshot
+
+        logger.info(
+            "Refreshed all data (%s measurements received): %s",
+            len(payload.measurements),
+            self.stats,
+        )
+        return snapshot
+
+    def _apply(
+        self,
+        previous: Optional[_Snapshot],
+        payload: AllDataPayload,
+        incremental: bool,
+        now: float,
+    ) -> _Snapshot:
+        measurements = payload.measurements
+        student_summaries = [StudentSummary(**summary) for summary in payload.student_data]
+        class_summaries = [ClassSummary(**summary) for summary in payload.class_data]
+
+        if incremental and payload.since is not None:
+            # A student's measurements are always sent together, so they
+            #  replace whatever the snapshot held for that student
+            kept = ~isin(
+                previous.measurements.values("student_id"),
+                measurements.values("student_id"),
+            )
+            measurements = previous.measurements.filter(kept).concatenate(measurements)
+            student_summary_map = dict(previous.student_summaries)
+            class_summary_map = dict(previous.class_summaries)
+            watermark = previous.watermark
+            fully_refreshed_at = previous.fully_refreshed_at
+            self.incremental_refreshes += 1
+        else:
+            student_summary_map, class_summary_map = {}, {}
+            watermark = None
+            fully_refreshed_at = now
+            self.full_refreshes += 1
+
+        for summary in student_summaries:
+            student_summary_map[summary.student_id] = summary
+        for summary in class_summaries:
+            class_summary_map[summary.class_id] = summary
+
+        updates = [
+            _utc(summary.last_data_update)
+            for summary in chain(student_summaries, class_summaries)
+            if summary.last_data_update is not None
+        ]
+        if watermark is not None:
+            updates.append(watermark)
+
+        return _Snapshot(
+            # Each class's rows are contiguous, so that views can slice them
+            measurements=measurements.filter(
+                argsort(measurements.values("class_id"), kind="stable")
+            ),
+            student_summaries=student_summary_map,
+            class_summaries=class_summary_map,
+            watermark=max(updates, default=None),
+            refreshed_at=now,
+            fully_refreshed_at=fully_refreshed_at,
+        )
+
+    def _view(self, snapshot: _Snapshot, class_id: Optional[int]) -> AllDataView:
+        measurements = snapshot.measurements
+        class_students = set()
+
+        if class_id is not None:
+            class_ids = measurements.values("class_id")
+            start, end = searchsorted(class_ids, [class_id, class_id + 1])
+            if start < end:
+                class_students = set(
+                    unique(measurements.values("student_id")[start:end]).tolist()
+                )
+                # A class at either end leaves a single slice, which shares
+                #  the snapshot's data; otherwise the two slices are copied
+                #  together, once per class and refresh
+                if start == 0:
+                    measurements = measurements.filter(slice(end, None))
+                elif end == len(class_ids):
+                    measurements = measurements.filter(slice(0, start))
+                else:
+                    measurements = measurements.filter(slice(0, start)).concatenate(
+                        measurements.filter(slice(end, None))
+                    )
+
+        return (
+            measurements,
+            tuple(
+                summary
+                for student_id, summary in snapshot.student_summaries.items()
+                if student_id not in class_students
+            ),
+            tuple(
+                summary
+                for summary in snapshot.class_summaries.values()
+                if summary.class_id != class_id
+            ),
+        )
+
+    def invalidate(self, story_id: Optional[str] = None):
+        with self._lock:
+            if story_id is None:
+                self._stories.clear()
+            else:
+                self._stories.pop(story_id, None)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            "stories": len(self._stories),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "incremental_refreshes": self.incremental_refreshes,
+            "full_refreshes": self.full_refreshes,
+            "failed_refreshes": self.failed_refreshes,
+        }
@@ -0,0 +1,326 @@
+"""
+An asyncio-native counterpart of `LocalAPI`.
+
+`LocalAPI` uses a blocking `requests` session, so calling it from a coroutine
+(e.g. a `solara.lab.use_task` function) stalls the event loop shared by every
+session on the worker. `AsyncLocalAPI` has the same methods as coroutines.
+Single requests are made with a pooled `httpx.AsyncClient`; calls that go
+through the worker-wide caches (whose single-flight fetches use thread
+locks) or that make several dependent requests, such as the writes, run the
+`LocalAPI` method in a worker thread, inside the calling session's kernel
+context. Both share the caches, request building and state updates of
+`hubbleds.remote`.
+"""
+
+import asyncio
+import os
+from typing import Any, Callable
+from weakref import WeakKeyDictionary
+
+import httpx
+from solara import Reactive
+from solara.server import kernel_context
+from solara.toestand import Ref
+
+from cosmicds.logger import setup_logger
+from cosmicds.state import BaseState, GlobalState
+
+from .columnar import MeasurementTable
+from .galaxies import GalaxyCatalog
+from .remote import (
+    ALL_DATA_SNAPSHOT,
+    LOCAL_API,
+    SPECTRUM_CACHE,
+    SPECTRUM_PREFETCHER,
+    _parse_spectrum,
+)
+from .state import (
+    ClassSummary,
+    GalaxyData,
+    LocalState,
+    SpectrumData,
+    StudentMeasurement,
+    StudentSummary,
+    parse_measurements,
+)
+from .serialization import loads
+
+logger = setup_logger("ASYNC-API")
+
+# Nearly all requests go to the one API host, so these are effectively
+#  per-host limits
+API_MAX_CONNECTIONS = int(os.getenv("CDS_API_MAX_CONNECTIONS", "20"))
+API_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("CDS_API_MAX_KEEPALIVE_CONNECTIONS", "10"))
+API_TIMEOUT = float(os.getenv("CDS_API_TIMEOUT", "30"))
+API_CONNECT_TIMEOUT = float(os.getenv("CDS_API_CONNECT_TIMEOUT", "5"))
+
+
+class AsyncLocalAPI:
+    """
+    Coroutine versions of the `LocalAPI` methods, with the same arguments and
+    return values. Connections are pooled per event loop and reused across
+    sessions; the authentication headers are those of `LOCAL_API`.
+    """
+
+    def __init__(self, sync_api=LOCAL_API):
+        self._sync_api = sync_api
+        self._clients: WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient] = (
+            WeakKeyDictionary()
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # An `AsyncClient` can only be used from the loop it was created on
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None or client.is_closed:
+            client = self._clients[loop] = httpx.AsyncClient(
+                headers=dict(self._sync_api.request_session.headers),
+                limits=httpx.Limits(
+                    max_connections=API_MAX_CONNECTIONS,
+                    max_keepalive_connections=API_MAX_KEEPALIVE_CONNECTIONS,
+                ),
+                timeout=httpx.Timeout(API_TIMEOUT, connect=API_CONNECT_TIMEOUT),
+            )
+        return client
+
+    async def aclose(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+
+    async def _in_thread(self, func: Callable, *args) -> Any:
+        """
+        Run a blocking `LocalAPI` method in a worker thread, inside the kernel
+        context of the calling session, so that it can use reactive state.
+        """
+        context = (
+            kernel_context.get_current_context()
+            if kernel_context.has_current_context()
+            else None
+        )
+
+        def _run():
+            if context is None:
+                return func(*args)
+            with context:
+                return func(*args)
+
+        return await asyncio.to_thread(_run)
+
+    async def get_galaxy_catalog(self, local_state: Reactive[LocalState]) -> GalaxyCatalog:
+        return await self._in_thread(self._sync_api.get_galaxy_catalog, local_state)
+
+    async def get_galaxies(self, local_state: Reactive[LocalState]) -> list[GalaxyData]:
+        return list((await self.get_galaxy_catalog(local_state)).galaxies)
+
+    async def get_galaxy(
+        self, galaxy_id: int, local_state: Reactive[LocalState]
+    ) -> GalaxyData | None:
+        return (await self.get_galaxy_catalog(local_state)).by_id.get(galaxy_id)
+
+    async def load_spectrum_data(
+        self, gal_data: GalaxyData, local_state: Reactive[LocalState]
+    ) -> SpectrumData | None:
+        key = self._sync_api._spectrum_key(gal_data, local_state.value.story_id)
+
+        spec_data = SPECTRUM_CACHE.get(key)
+        if spec_data is None:
+            # Waiting on a prefetch blocks, so do it off the event loop
+            spec_data = await asyncio.to_thread(SPECTRUM_PREFETCHER.wait, key)
+        if spec_data is None:
+            spec_data = await self._fetch_spectrum_data(gal_data, *key)
+            if spec_data is not None:
+                SPECTRUM_CACHE.put(key, spec_data)
+
+        logger.debug("Spectrum cache stats: %s", SPECTRUM_CACHE.stats)
+
+        return spec_data
+
+    async def _fetch_spectrum_data(
+        self,
+        gal_data: GalaxyData,
+        story_id: str,
+        galaxy_type: str,
+        file_name: str,
+    ) -> SpectrumData | None:
+        source = self._sync_api._spectrum_source(gal_data, story_id, galaxy_type, file_name)
+        if isinstance(source, SpectrumData):
+            return source
+
+        response = await self.client.get(source)
+        # Parsing the FITS file is CPU-bound, so keep it off the event loop
+        return await asyncio.to_thread(_parse_spectrum, gal_data, response.content)
+
+
+    async def get_stage_state(
+        self,
+        global_state: Reactive[GlobalState],
+        local_state: Reactive[LocalState],
+        component_state: Reactive[BaseState],
+    ) -> BaseState | None:
+        response = await self.client.get(
+            self._sync_api._stage_state_url(global_state, local_state, component_state)
+        )
+        return self._sync_api._set_stage_state(response, component_state)
+
+    async def get_app_story_states(
+        self,
+        global_state: Reactive[GlobalState],
+        local_state: Reactive[LocalState],
+    ) -> LocalState | None:
+        response = await self.client.get(
+            self._sync_api._story_state_url(global_state, local_state)
+        )
+        return self._sync_api._set_app_story_states(response, global_state, local_state)
+
+    async def get_measurements(
+        self, global_state: Reactive[GlobalState], local_state: Reactive[LocalState]
+    ) -> list[StudentMeasurement]:
+        if not global_state.value.update_db or self._sync_api.is_educator:
+            Ref(local_state.fields.measurements_loaded).set(True)
+            logger.info("Skipping retrieval of measurements from database.")
+            return []
+
+        response = await self.client.get(
+            self._sync_api._measurements_url(
+                local_state.value.story_id, global_state.value.student.id
+            )
+        )
+        parsed_measurements = (
+            await asyncio.to_thread(parse_measurements, response.content)
+            if response.status_code == 200
+            else None
+        )
+
+        return self._sync_api._set_measurements(parsed_measurements, global_state, local_state)
+
+    async def get_sample_measurements(
+        self, global_state: Reactive[GlobalState], local_state: Reactive[LocalState]
+    ) -> list[StudentMeasurement]:
+        return await self._in_thread(
+            self._sync_api.get_sample_measurements, global_state, local_state
+        )
+
+    async def get_sample_galaxy(self, local_state: Reactive[LocalState]) -> GalaxyData:
+        return await self._in_thread(self._sync_api.get_sample_galaxy, local_state)
+
+    async def get_measurement(
+        self,
+        galaxy_id: int,
+        global_state: Reactive[GlobalState],
+        local_state: Reactive[LocalState],
+    ) -> StudentMeasurement:
+        return await self._in_thread(
+            self._sync_api.get_measurement, galaxy_id, global_state, local_state
+        )
+
+    async def get_sample_measurement(
+        self,
+        galaxy_id: int,
+        global_state: Reactive[GlobalState],
+        local_state: Reactive[LocalState],
+    ) -> StudentMeasurement:
+        return await self._in_thread(
+            self._sync_api.get_sample_measurement, galaxy_id, global_state, local_state
+        )
+
+    async def load_session_states(
+        self, global_state: Reactive[GlobalState], local_state: Reactive[LocalState]
+    ):
+        return await self._in_thread(
+            self._sync_api.load_session_states, global_state, local_state
+        )
+
+    async def get_class_measurements(
+        self,
+        global_state: Reactive[GlobalState],
+        local_state: Reactive[LocalState],
+    ) -> list[StudentMeasurement]:
+        return await self._in_thread(
+            self._sync_api.get_class_measurements, global_state, local_state
+        )
+
+    async def get_students_completed_measurements_count(
+        self,
+        global_state: Reactive[GlobalState],
+        local_state: Reactive[LocalState],
+    ) -> int:
+        class_info = global_state.value.classroom.class_info
+        if class_info is None or 'id' not in class_info:
+            logger.warning("No class id found in classroom info.")
+            return 0
+
+        response = await self.client.get(
+            self._sync_api._students_completed_url(
+                local_state.value.story_id, global_state.value.student.id, class_info['id']
+            )
+        )
+        # TODO: Handle non-200 status codes
+        return loads(response.content)["students_completed_measurements"]
+
+    async def get_all_data(
+        self,
+        global_state: Reactive[GlobalState],
+        local_state: Reactive[LocalState],
+    ) -> tuple[MeasurementTable, list[StudentSummary], list[ClassSummary]]:
+        story_id = local_state.value.story_id
+        class_info = global_state.value.classroom.class_info
+        class_id = class_info['id'] if class_info is not None else None
+
+        # The snapshot is shared by every worker thread and refreshed by
+        #  streaming the response through the parser, so it is read from a
+        #  thread rather than re-implemented here
+        all_data = await asyncio.to_thread(
+            ALL_DATA_SNAPSHOT.get,
+            story_id,
+            class_id,
+            lambda since: self._sync_api._fetch_all_data(story_id, since),
+        )
+
+        return self._sync_api._set_all_data(all_data, local_state)
+
+
+    async def put_stage_state(
+        self,
+        global_state: Reactive[GlobalState],
+        local_state: Reactive[LocalState],
+        component_state: Reactive[BaseState],
+    ):
+        return await self._in_thread(
+            self._sync_api.put_stage_state, global_state, local_state, component_state
+        )
+
+    async def put_story_state(
+        self,
+        global_state: Reactive[GlobalState],
+        local_state: Reactive[LocalState],
+    ):
+        return await self._in_thread(
+            self._sync_api.put_story_state, global_state, local_state
+        )
+
+    async def put_measurements(
+        self, global_state: Reactive[GlobalState], local_state: Reactive[LocalState]
+    ):
+        return await self._in_thread(
+            self._sync_api.put_measurements, global_state, local_state
+        )
+
+    async def put_sample_measurements(
+        self, global_state: Reactive[GlobalState], local_state: Reactive[LocalState]
+    ):
+        return await self._in_thread(
+            self._sync_api.put_sample_measurements, global_state, local_state
+        )
+
+    async def delete_all_measurements(
+        self, global_state: Reactive[GlobalState], local_state: Reactive[LocalState]
+    ):
+        return await self._in_thread(
+            self._sync_api.delete_all_measurements, global_state, local_state
+        )
+
+
+ASYNC_API = AsyncLocalAPI()
@@ -0,0 +1,424 @@
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from threading import Lock, RLock
+from time import monotonic
+from typing import Any, Callable, Hashable, Iterable, Optional
+
+from .logger import setup_logger
+
+logger = setup_logger("CACHE")
+
+
+class SizedLRUCache:
+    """
+    A thread-safe least-recently-used cache bounded by the total (estimated)
+    size of its values in bytes. The cache is meant to be shared by every
+    session on a worker, so it keeps simple hit/miss/eviction counters that
+    can be logged or inspected.
+
+    Parameters
+    ----------
+    max_bytes: int
+        The maximum total size of the cached values
+    sizeof: Callable
+        A function returning the estimated size, in bytes, of a value
+    name: str
+        A label used in log messages
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        sizeof: Callable[[Any], int],
+        name: str = "cache",
+    ):
+        self.max_bytes = max_bytes
+        self.name = name
+        self._sizeof = sizeof
+        self._entries: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self._lock = RLock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+    def put(self, key: Hashable, value: Any):
+        size = self._sizeof(value)
+
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+
+            # Values larger than the whole cache are never stored
+            if size > self.max_bytes:
+                logger.warning(
+                    "Value of size %s for key `%s` exceeds the %s limit of %s bytes.",
+                    size, key, self.name, self.max_bytes,
+                )
+                return
+
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Return the cached value for `key`, calling `loader` to create and
+        store it on a miss. `None` results are not cached.
+        """
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is not sentinel:
+            return value
+
+        value = loader()
+        if value is not None:
+            self.put(key, value)
+
+        return value
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self.current_bytes = 0
+            elif key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+
+    @property
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class CachePrefetcher:
+    """
+    Warms a `SizedLRUCache` in the background using a bounded pool of
+    worker threads. Requests for keys that are already cached or in flight
+    are deduplicated, and each pending request is reference counted so that
+    cancelling on behalf of one session does not drop a prefetch another
+    session is still waiting on.
+
+    Loaders run outside of any Solara context, so they must not read
+    reactive state; capture whatever they need before submitting.
+
+    Parameters
+    ----------
+    cache: SizedLRUCache
+        The cache to fill
+    max_workers: int
+        The maximum number of concurrent loads
+    name: str
+        A label used for the worker threads and log messages
+    """
+
+    def __init__(self, cache: SizedLRUCache, max_workers: int = 4, name: str = "prefetch"):
+        self.cache = cache
+        self.name = name
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=name
+        )
+        self._lock = RLock()
+        self._pending: dict[Hashable, list] = {}
+        self.submitted = 0
+        self.deduplicated = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    def submit(self, key: Hashable, loader: Callable[[], Any]) -> bool:
+        """
+        Schedule `loader` to fill `key` in the cache. Returns whether this
+        call holds a reference to a pending prefetch (and so should be
+        matched by a call to `cancel`).
+        """
+        with self._lock:
+            if key in self._pending:
+                self._pending[key][1] += 1
+                self.deduplicated += 1
+                return True
+
+            if key in self.cache:
+                self.deduplicated += 1
+                return False
+
+            future = self._executor.submit(self._run, key, loader)
+            self._pending[key] = [future, 1]
+            self.submitted += 1
+
+        future.add_done_callback(lambda f: self._on_done(key, f))
+        return True
+
+    def _run(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        # Another path may have filled the cache while this was queued
+        if key in self.cache:
+            return None
+
+        value = loader()
+        if value is not None:
+            self.cache.put(key, value)
+        return value
+
+    def _on_done(self, key: Hashable, future: Future):
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is not None and entry[0] is future:
+                del self._pending[key]
+
+            if future.cancelled():
+                self.cancelled += 1
+            elif future.exception() is not None:
+                self.failed += 1
+                logger.warning(
+                    "Failed to prefetch `%s` into %s: %s",
+                    key, self.cache.name, future.exception(),
+                )
+            else:
+                self.completed += 1
+
+    def cancel(self, keys: Iterable[Hashable]):
+        """
+        Release one reference to each of `keys`, cancelling the prefetches
+        that are no longer wanted and have not started yet.
+        """
+        with self._lock:
+            for key in keys:
+                entry = self._pending.get(key)
+                if entry is None:
+                    continue
+
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    entry[0].cancel()
+
+    def wait(self, key: Hashable, default: Any = None) -> Any:
+        """
+        If a prefetch for `key` is running, block until it finishes and
+        return its result. A prefetch that has not started yet is cancelled
+        so that the caller can load the value itself without waiting in the
+        queue. Otherwise, `default` is returned.
+        """
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                return default
+
+            future = entry[0]
+            if future.cancel():
+                return default
+
+        try:
+            value = future.result()
+        except Exception:
+            return default
+
+        return default if value is None else value
+
+    @property
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "in_flight": len(self._pending),
+                "submitted": self.submitted,
+                "deduplicated": self.deduplicated,
+                "completed": self.completed,
+                "failed": self.failed,
+                "cancelled": self.cancelled,
+            }
+
+
+NOT_MODIFIED = object()
+
+
+class RevalidatingCache:
+    """
+    A process-wide cache whose entries are served as-is for `ttl` seconds
+    and then revalidated with a conditional fetch. The fetch function is
+    passed the validator (e.g. an HTTP ETag) of the current entry and
+    returns either `NOT_MODIFIED` or a `(value, validator)` tuple. Only one
+    session revalidates a given key at a time; the others wait and then
+    reuse its result. If a revalidation fails, the stale value is kept.
+    A fetch that was started before the key was invalidated is returned to
+    its caller but not stored. Expired entries are kept for revalidation
+    until the cache is full, when the least recently used entry is evicted.
+
+    Parameters
+    ----------
+    ttl: float
+        The number of seconds an entry is served without revalidation
+    max_entries: int
+        The maximum number of entries kept
+    name: str
+        A label used in log messages
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 256, name: str = "cache"):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.name = name
+        self._lock = Lock()
+        # A lock and the number of callers holding or waiting for it, by key;
+        #  a key's lock is dropped when its last caller is done
+        self._key_locks: dict[Hashable, list] = {}
+        self._entries: OrderedDict[Hashable, tuple[Any, Optional[str], float]] = OrderedDict()
+        # Bumped by `invalidate`, so that fetches in flight don't store
+        #  what they read before it; a key's generation is only kept while
+        #  it has callers
+        self._generation = 0
+        self._key_generations: dict[Hashable, int] = {}
+        self.hits = 0
+        self.revalidated = 0
+        self.refreshed = 0
+        self.evictions = 0
+
+    @contextmanager
+    def _key_lock(self, key: Hashable):
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, [Lock(), 0])
+            key_lock[1] += 1
+
+        try:
+            with key_lock[0]:
+                yield
+        finally:
+            with self._lock:
+                key_lock[1] -= 1
+                if key_lock[1] == 0:
+                    del self._key_locks[key]
+                    self._key_generations.pop(key, None)
+
+    def _current_generation(self, key: Hashable) -> tuple[int, int]:
+        with self._lock:
+            return self._generation, self._key_generations.get(key, 0)
+
+    def _fresh(self, key: Hashable) -> tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            self._entries.move_to_end(key)
+            if monotonic() - entry[2] < self.ttl:
+                return True, entry[0]
+        return False, None
+
+    def get(
+        self,
+        key: Hashable,
+        fetch: Callable[[Optional[str]], Any],
+    ) -> Any:
+        fresh, value = self._fresh(key)
+        if fresh:
+            self.hits += 1
+            return value
+
+        with self._key_lock(key):
+            # Another session may have refreshed the entry while we waited
+            fresh, value = self._fresh(key)
+            if fresh:
+                self.hits += 1
+                return value
+
+            generation = self._current_generation(key)
+            with self._lock:
+                entry = self._entries.get(key)
+            validator = entry[1] if entry is not None else None
+            try:
+                result = fetch(validator)
+                if result is NOT_MODIFIED and entry is None:
+                    # There is nothing to revalidate, so this is a miss
+                    logger.warning(
+                        "Unexpected `not modified` for uncached %s entry `%s`.",
+                        self.name, key,
+                    )
+                    result = fetch(None)
+            except Exception as e:
+                result = self._fetch_failed(key, entry, e)
+
+            return self._store(key, entry, result, generation)
+
+    def _fetch_failed(self, key: Hashable, entry, error: Exception) -> Any:
+        if entry is None:
+            raise error
+        logger.warning("Serving stale %s entry for `%s`: %s", self.name, key, error)
+        return NOT_MODIFIED
+
+    def _store(
+        self, key: Hashable, entry, result: Any, generation: tuple[int, int]
+    ) -> Any:
+        if result is NOT_MODIFIED:
+            if entry is None:
+                raise LookupError(f"No {self.name} entry for `{key}` to revalidate.")
+            value, validator = entry[0], entry[1]
+            self.revalidated += 1
+        else:
+            value, validator = result
+            self.refreshed += 1
+
+        with self._lock:
+            current = (self._generation, self._key_generations.get(key, 0))
+            if current == generation:
+                self._entries[key] = (value, validator, monotonic())
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    evicted, _ = self._entries.popitem(last=False)
+                    self.evictions += 1
+                    logger.debug("Evicted %s entry `%s`.", self.name, evicted)
+            else:
+                logger.debug(
+                    "Not storing %s entry for `%s` fetched before invalidation.",
+                    self.name, key,
+                )
+
+        return value
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        with self._lock:
+            if key is None:
+                self._generation += 1
+                self._entries.clear()
+                self._key_generations.clear()
+            else:
+                # Without callers there is no fetch in flight to discard
+                if key in self._key_locks:
+                    self._key_generations[key] = self._key_generations.get(key, 0) + 1
+                self._entries.pop(key, None)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "refreshed": self.refreshed,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,264 @@
+"""
+Columnar measurement data.
+
+`MeasurementTable` holds measurements as typed NumPy columns with null masks,
+as an alternative to lists of `StudentMeasurement` wherever many rows are
+processed together. Large responses (e.g. the all-data payload) are decoded
+straight from the response stream into a table, without building a Python
+object per row.
+"""
+
+from array import array
+from typing import IO, Any, Iterable, NamedTuple, Optional
+
+import ijson
+from numpy import argsort, dtype as np_dtype, frombuffer, isin, isnan, ma, ndarray, unique
+from glue.core import Data
+
+# The columns of a measurement table, with their array typecodes
+MEASUREMENT_COLUMNS: dict[str, str] = {
+    "student_id": "q",
+    "class_id": "q",
+    "galaxy_id": "q",
+    "obs_wave_value": "d",
+    "velocity_value": "d",
+    "ang_size_value": "d",
+    "est_dist_value": "d",
+    "brightness": "d",
+}
+
+# Measurement keys, relative to the measurement, and the columns they fill
+_MEASUREMENT_KEYS: dict[str, str] = {
+    **{name: name for name in MEASUREMENT_COLUMNS},
+    "galaxy.id": "galaxy_id",
+}
+
+
+class MeasurementTable:
+    """
+    An immutable struct-of-arrays table of measurements. Each column is a
+    masked array whose mask marks missing values; missing floats are also
+    stored as NaN. Operations return new tables that share or copy the
+    column data, so a table can be safely shared between sessions.
+
+    Tables compare by identity, so that storing one in reactive state does
+    not trigger element-wise comparisons.
+    """
+
+    __slots__ = ("_columns",)
+
+    def __init__(self, columns: dict[str, ma.MaskedArray]):
+        for column in columns.values():
+            column.flags.writeable = False
+        self._columns = columns
+
+    def __len__(self) -> int:
+        return len(next(iter(self._columns.values()), ()))
+
+    def __getitem__(self, name: str) -> ma.MaskedArray:
+        return self._columns[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._columns
+
+    def __repr__(self) -> str:
+        return f"<MeasurementTable: {len(self)} rows, columns {list(self._columns)}>"
+
+    @property
+    def columns(self) -> list[str]:
+        return list(self._columns)
+
+    def values(self, name: str) -> ndarray:
+        """The values of a column, with missing floats as NaN."""
+        return ma.getdata(self._columns[name])
+
+    def nulls(self, name: str) -> ndarray:
+        return ma.getmaskarray(self._columns[name])
+
+    @classmethod
+    def empty(cls) -> "MeasurementTable":
+        return _TableBuilder().build()
+
+    @classmethod
+    def from_models(cls, measurements: Iterable) -> "MeasurementTable":
+        """
+        Build a table from `StudentMeasurement` objects, e.g. to combine a
+        short list of them with a table parsed from a response.
+        """
+        builder = _TableBuilder()
+        for measurement in measurements:
+            builder.start_row()
+            for name in MEASUREMENT_COLUMNS:
+                builder.set(name, getattr(measurement, name))
+        return builder.build()
+
+    @classmethod
+    def from_glue_data(cls, data: Data) -> "MeasurementTable":
+        """
+        Build a table from the measurement components of a glue `Data`.
+        NaN floats are treated as missing.
+        """
+        columns = {}
+        for name in MEASUREMENT_COLUMNS:
+            if name not in data.components:
+                continue
+            values = data[name]
+            mask = isnan(values) if values.dtype.kind == "f" else False
+            # Copy, since tables make their columns read-only
+            columns[name] = ma.MaskedArray(values, mask=mask, copy=True)
+        return cls(columns)
+
+    def to_glue_data(self, label: Optional[str] = None) -> Data:
+        """
+        Build a glue `Data` with one component per column. Missing floats
+        are NaN and missing integers are -1.
+
+        Only the `MEASUREMENT_COLUMNS` are included; the units, the
+        measurement number, the rest wavelength and the galaxy fields other
+        than its ID are not. The all-data viewers in stage 5 only use
+        `est_dist_value`, `velocity_value` and `class_id`.
+        """
+        data_dict: dict[str, Any] = {
+            name: column.filled(float("nan") if column.dtype.kind == "f" else -1)
+            for name, column in self._columns.items()
+        }
+        if label:
+            data_dict["label"] = label
+        return Data(**data_dict)
+
+    def filter(self, rows) -> "MeasurementTable":
+        """
+        Select rows by boolean mask, index array or slice. A slice shares the
+        table's data rather than copying it.
+        """
+        return MeasurementTable(
+            {name: column[rows] for name, column in self._columns.items()}
+        )
+
+    def complete(self, *names: str) -> "MeasurementTable":
+        """
+        The rows in which none of the given columns are missing.
+        """
+        keep = ~ma.getmaskarray(self._columns[names[0]])
+        for name in names[1:]:
+            keep &= ~ma.getmaskarray(self._columns[name])
+        return self.filter(keep)
+
+    def concatenate(self, *others: "MeasurementTable") -> "MeasurementTable":
+        tables = (self,) + others
+        return MeasurementTable(
+            {
+                name: ma.concatenate([table[name] for table in tables])
+                for name in self._columns
+            }
+        )
+
+    def group_by(self, name: str) -> dict[int, "MeasurementTable"]:
+        """
+        Split the table by the values of an integer column. Rows in which
+        the column is missing are left out.
+        """
+        table = self.complete(name)
+        keys = table.values(name)
+        order = argsort(keys, kind="stable")
+        unique_keys, starts = unique(keys[order], return_index=True)
+        bounds = list(starts[1:]) + [len(order)]
+
+        return {
+            int(key): table.filter(order[start:end])
+            for key, start, end in zip(unique_keys, starts, bounds)
+        }
+
+    def group_by_student(self) -> dict[int, "MeasurementTable"]:
+        return self.group_by("student_id")
+
+    def group_by_class(self) -> dict[int, "MeasurementTable"]:
+        return self.group_by("class_id")
+
+    def rows_where(self, name: str, values: Iterable[int]) -> "MeasurementTable":
+        """
+        The rows whose value of `name` is one of `values`.
+        """
+        return self.filter(~self.nulls(name) & isin(self.values(name), list(values)))
+
+
+class _TableBuilder:
+    def __init__(self, columns: dict[str, str] = MEASUREMENT_COLUMNS):
+        self.values = {name: array(code) for name, code in columns.items()}
+        self.nulls = {name: bytearray() for name in columns}
+        self._defaults = {
+            name: float("nan") if code == "d" else 0 for name, code in columns.items()
+        }
+
+    def start_row(self):
+        for name, values in self.values.items():
+            values.append(self._defaults[name])
+            self.nulls[name].append(1)
+
+    def set(self, name: str, value: Any):
+        if value is None:
+            return
+        self.values[name][-1] = value
+        self.nulls[name][-1] = 0
+
+    def build(self) -> MeasurementTable:
+        return MeasurementTable(
+            {
+                name: ma.MaskedArray(
+                    frombuffer(values, dtype=np_dtype(values.typecode)).copy(),
+                    mask=frombuffer(self.nulls[name], dtype=bool).copy(),
+                )
+                for name, values in self.values.items()
+            }
+        )
+
+
+class AllDataPayload(NamedTuple):
+    measurements: MeasurementTable
+    student_data: list[dict]
+    class_data: list[dict]
+    since: Optional[str]
+
+
+def parse_all_data(source: bytes | IO[bytes]) -> AllDataPayload:
+    """
+    Parse an all-data response in one streaming pass. Measurements become
+    a table (rows without a class are dropped), while the summaries, of
+    which there is one per student or class, are returned as dictionaries.
+    """
+    builder = _TableBuilder()
+    summaries: dict[str, list[dict]] = {"studentData": [], "classData": []}
+    since = None
+
+    summary_builder = None
+    summary_key = None
+
+    for prefix, event, value in ijson.parse(source, use_float=True):
+        if summary_builder is not None:
+            if prefix == f"{summary_key}.item" and event == "end_map":
+                summaries[summary_key].append(summary_builder.value)
+                summary_builder = None
+            else:
+                summary_builder.event(event, value)
+            continue
+
+        if prefix == "measurements.item":
+            if event == "start_map":
+                builder.start_row()
+        elif prefix.startswith("measurements.item."):
+            column = _MEASUREMENT_KEYS.get(prefix[len("measurements.item."):])
+            if column is not None and event in ("number", "null"):
+                builder.set(column, value)
+        elif prefix in ("studentData.item", "classData.item") and event == "start_map":
+            summary_key = prefix.split(".")[0]
+            summary_builder = ijson.ObjectBuilder()
+            summary_builder.event(event, value)
+        elif prefix == "since" and event == "string":
+            since = value
+
+    return AllDataPayload(
+        measurements=builder.build().complete("class_id"),
+        student_data=summaries["studentData"],
+        class_data=summaries["classData"],
+        since=since,
+    )
@@ -3,17 +3,137 @@ from typing import Callable, Optional
 import plotly.graph_objects as go
 import reacton.ipyvuetify as rv
 import solara
-from hubbleds.state import GalaxyData
-from pandas import DataFrame
+from hubbleds.async_remote import ASYNC_API
+from hubbleds.state import GalaxyData, LOCAL_STATE, SpectrumData
 from hubbleds.components.spectrum_viewer.plotly_figure import FigurePlotly
 from cosmicds.logger import setup_logger
 from hubbleds.viewer_marker_colors import GENERIC_COLOR, H_ALPHA_COLOR, MY_DATA_COLOR, LIGHT_GENERIC_COLOR
-from hubbleds.utils import PLOTLY_MARGINS
+from hubbleds.utils import PLOTLY_MARGINS, minmax_downsample_indices
+import numpy as np
 
 from glue_plotly.common import DEFAULT_FONT
 
 logger = setup_logger("SPECTRUM")
 
+# The width (in pixels) the spectrum is drawn at when not given, which is
+#  that of the widest layout the viewer is used in
+SPECTRUM_PLOT_WIDTH = 1000
+# Samples this close (in Angstroms) to the marked lines are always sent as-is
+LOD_FEATURE_HALF_WIDTH = 15
+
+
+def _level_of_detail_indices(wave, flux, bounds, features, plot_width=SPECTRUM_PLOT_WIDTH):
+    """
+    Indices of the spectrum samples to draw. The whole spectrum is decimated
+    to the min and max of each pixel column of the plot area, so that it
+    draws the same as at full resolution; the zoomed window, if any, and the
+    samples around the marked spectral features are kept at full resolution.
+    """
+    bins = max(plot_width - PLOTLY_MARGINS["l"] - PLOTLY_MARGINS["r"], 1)
+    indices = [minmax_downsample_indices(flux, bins)]
+
+    # A window that covers the whole spectrum adds nothing to the first pass
+    if bounds and (min(bounds) > wave[0] or max(bounds) < wave[-1]):
+        indices.append(np.flatnonzero((wave >= min(bounds)) & (wave <= max(bounds))))
+
+    for feature in features:
+        indices.append(np.flatnonzero(np.abs(wave - feature) <= LOD_FEATURE_HALF_WIDTH))
+
+    return np.unique(np.concatenate(indices))
+
+
+def _spectrum_figure(spec, wave, flux, x_bounds, spectrum_color):
+    """
+    The spectrum figure, without the measurement and feature markers. The
+    trace shows the decimated ``wave`` and ``flux``, while the y-axis range
+    is set from the full flux of ``spec``.
+    """
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=wave,
+        y=flux,
+        line=dict(
+            color=spectrum_color,
+            width=2,
+        ),
+        mode='lines',
+        hoverinfo="x"
+    ))
+
+    fig.update_layout(
+        plot_bgcolor="white",
+        font_family=DEFAULT_FONT,
+        title_font_family=DEFAULT_FONT,
+        margin=PLOTLY_MARGINS,
+        yaxis=dict(
+            linecolor="black",
+            fixedrange=True,
+            title="Brightness",
+            showgrid=False,
+            showline=True,
+            linewidth=1,
+            mirror=True,
+            title_font_family=DEFAULT_FONT, 
+            title_font_size=16, 
+            tickfont_size=12,
+            ticks="outside",
+            ticklen=5,
+            tickwidth=1,
+            tickcolor="black",
+            ),
+        xaxis=dict(
+            linecolor="black",
+            title="Wavelength (Angstroms)",
+            showgrid=False,
+            showline=True,
+            linewidth=1,
+            mirror=True,
+            title_font_family=DEFAULT_FONT, 
+            title_font_size=16, 
+            tickfont_size=12,
+            hoverformat=".0f",
+            ticks="outside",
+            ticklen=5,
+            tickwidth=1,
+            tickcolor="black",
+            ticksuffix=" Å",
+            ),
+        showlegend=False,
+        hoverlabel=dict(
+            font_size=16,
+            bgcolor="white",
+        ),
+    )
+
+    fig.update_layout(
+        xaxis_zeroline=False,
+        yaxis_zeroline=False,
+        xaxis=dict(
+            showspikes=True,
+            # showline=spectrum_click_enabled,
+            spikecolor="black",
+            spikethickness=1,
+            spikedash="solid",
+            spikemode="across",
+            spikesnap="cursor",
+        ),
+        spikedistance=-1,
+        hovermode="x",
+    )
+
+    if x_bounds:  # and y_bounds.value:
+        fig.update_xaxes(range=x_bounds)
+        # fig.update_yaxes(range=y_bounds.value)
+    # else:
+    fig.update_yaxes(
+        range=[
+            spec.flux.min() * 0.95,
+            spec.flux.max() * 1.25,
+        ]
+    )
+
+    return fig
+
 
 @solara.component
 def SpectrumViewer(
@@ -33,6 +153,7 @@ def SpectrumViewer(
     on_spectrum_bounds_changed: Callable = lambda x: None,
     max_spectrum_bounds: Optional[solara.Reactive[list[float]]] = None,
     spectrum_color: str = GENERIC_COLOR,
+    plot_width: int = SPECTRUM_PLOT_WIDTH,
 ):
     
     logger.info("Creating SpectrumViewer")
@@ -52,7 +173,8 @@ def SpectrumViewer(
         if galaxy_data is None:
             return False
 
-        return galaxy_data.spectrum_as_data_frame
+        # The arrays are shared with the spectrum cache, and aren't copied
+        return await ASYNC_API.load_spectrum_data(galaxy_data, LOCAL_STATE)
 
     spec_data_task = solara.lab.use_task(   # noqa: SH101 
         _load_spectrum,
@@ -63,10 +185,39 @@ def SpectrumViewer(
         spec = spec_data_task.value 
         logger.info('spec_data_task is finished')
         if (spec is not None) and (max_spectrum_bounds is not None):
-            logger.info(f"\tSetting max_spectrum_bounds to {spec['wave'].min()} and {spec['wave'].max()}")
-            max_spectrum_bounds.set([spec["wave"].min(), spec["wave"].max()])
+            logger.info(f"\tSetting max_spectrum_bounds to {spec.wave.min()} and {spec.wave.max()}")
+            max_spectrum_bounds.set([spec.wave.min(), spec.wave.max()])
     
 
+    def _decimated_spectrum():
+        spec = spec_data_task.value
+        if galaxy_data is None or not isinstance(spec, SpectrumData):
+            return None
+
+        wave, flux = spec.wave, spec.flux
+        # A click records the x of the nearest drawn sample, so wherever the
+        #  spectrum can be measured every sample is drawn
+        if spectrum_click_enabled or marker_position is not None:
+            return wave, flux
+
+        features = [galaxy_data.redshift_rest_wave_value, galaxy_data.rest_wave_value]
+        indices = _level_of_detail_indices(wave, flux, x_bounds.value, features, plot_width)
+        logger.debug("Sending %s of %s spectrum points", len(indices), len(wave))
+
+        return wave[indices], flux[indices]
+
+    decimated_spectrum = solara.use_memo(  # noqa: SH101
+        _decimated_spectrum,
+        dependencies=[
+            id(spec_data_task.value),
+            galaxy_data,
+            x_bounds.value,
+            spectrum_click_enabled,
+            marker_position is not None,
+            plot_width,
+        ],
+    )
+
     def _rest_wave_tool_toggled():
         on_rest_wave_tool_clicked()
 
@@ -109,8 +260,8 @@ def SpectrumViewer(
         try:
             if spec_data_task.value is not None and spectrum_bounds is not None:
                 spectrum_bounds.set([
-                    spec_data_task.value["wave"].min(),
-                    spec_data_task.value["wave"].max(),
+                    spec_data_task.value.wave.min(),
+                    spec_data_task.value.wave.max(),
                 ])
         except Exception as e:
             print(e)
@@ -207,7 +358,7 @@ def SpectrumViewer(
                 rv.ProgressCircular(size=100, indeterminate=True, color="primary")
 
             return
-        elif not isinstance(spec_data_task.value, DataFrame):
+        elif not isinstance(spec_data_task.value, SpectrumData):
             with rv.Sheet(
                 style_="height: 360px", class_="d-flex justify-center align-center"
             ):
@@ -219,62 +370,9 @@ def SpectrumViewer(
             logger.info('galaxy_data is None')
             return
 
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(
-                        x= spec_data_task.value["wave"], 
-                        y= spec_data_task.value["flux"],
-                        line=dict(
-                            color=spectrum_color,
-                            width=2,
-                        ),
-                      mode='lines', 
-                      hoverinfo="x"
-                    ))
-         
-        fig.update_layout(
-            plot_bgcolor="white",
-            font_family=DEFAULT_FONT,
-            title_font_family=DEFAULT_FONT,
-            margin=PLOTLY_MARGINS,
-            yaxis=dict(
-                linecolor="black",
-                fixedrange=True,
-                title="Brightness",
-                showgrid=False,
-                showline=True,
-                linewidth=1,
-                mirror=True,
-                title_font_family=DEFAULT_FONT, 
-                title_font_size=16, 
-                tickfont_size=12,
-                ticks="outside",
-                ticklen=5,
-                tickwidth=1,
-                tickcolor="black",
-                ),
-            xaxis=dict(
-                linecolor="black",
-                title="Wavelength (Angstroms)",
-                showgrid=False,
-                showline=True,
-                linewidth=1,
-                mirror=True,
-                title_font_family=DEFAULT_FONT, 
-                title_font_size=16, 
-                tickfont_size=12,
-                hoverformat=".0f",
-                ticks="outside",
-                ticklen=5,
-                tickwidth=1,
-                tickcolor="black",
-                ticksuffix=" Å",
-                ),
-            showlegend=False,
-            hoverlabel=dict(
-                font_size=16,
-                bgcolor="white",
-            ),
-        )
+        wave, flux = decimated_spectrum
+
+        fig = _spectrum_figure(spec_data_task.value, wave, flux, x_bounds.value, spectrum_color)
 
         # This is the line that appears when user first makes observed wavelength measurement
         fig.add_vline(
@@ -390,33 +488,6 @@ def SpectrumViewer(
             visible=1 in toggle_group_state.value,
         )
 
-        fig.update_layout(
-            xaxis_zeroline=False,
-            yaxis_zeroline=False,
-            xaxis=dict(
-                showspikes=True,
-                # showline=spectrum_click_enabled,
-                spikecolor="black",
-                spikethickness=1,
-                spikedash="solid",
-                spikemode="across",
-                spikesnap="cursor",
-            ),
-            spikedistance=-1,
-            hovermode="x",
-        )
-
-        if x_bounds.value:  # and y_bounds.value:
-            fig.update_xaxes(range=x_bounds.value)
-            # fig.update_yaxes(range=y_bounds.value)
-        # else:
-        fig.update_yaxes(
-            range=[
-                spec_data_task.value["flux"].min() * 0.95,
-                spec_data_task.value["flux"].max() * 1.25,
-            ]
-        )
-
         fig.update_layout(dragmode="zoom" if 0 in toggle_group_state.value else False)
         
         
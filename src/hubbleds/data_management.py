@@ -103,6 +103,7 @@ DB_SUMMARY_FIELDS = [DB_H0_FIELD, DB_AGE_FIELD]
 
 # Misc
 SPECTRUM_EXTENSION = ".fits"
+SPECTRUM_TYPE_FOLDERS = {"Sp": "spiral", "E": "elliptical", "Ir": "irregular"}
 
 
 def reverse(d):
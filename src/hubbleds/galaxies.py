@@ -0,0 +1,86 @@
+"""
+Galaxy data, shared between sessions. A worker keeps one `GalaxyData`
+instance per galaxy, which the galaxy catalog and every measurement of that
+galaxy refer to, rather than each holding its own copy.
+"""
+
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import Mapping, NamedTuple
+
+from pydantic import BaseModel, ConfigDict
+
+from .data_management import ELEMENT_REST
+
+
+class GalaxyData(BaseModel):
+    # Galaxy data is shared between sessions through the catalog cache
+    model_config = ConfigDict(frozen=True)
+
+    id: int
+    name: str
+    ra: float
+    decl: float
+    z: float
+    type: str
+    element: str
+
+    @property
+    def rest_wave_value(self) -> float:
+        return round(ELEMENT_REST[self.element])
+
+    @property
+    def redshift_rest_wave_value(self) -> float:
+        return (ELEMENT_REST[self.element] * (1 + self.z))
+
+
+class GalaxyCatalog(NamedTuple):
+    galaxies: tuple[GalaxyData, ...]
+    by_id: Mapping[int, GalaxyData]
+
+
+# The most recently used galaxies on this worker. A galaxy that falls out is
+#  simply registered again, as a new instance, the next time it is seen.
+GALAXY_REGISTRY_SIZE = int(os.getenv("CDS_GALAXY_REGISTRY_SIZE", "10000"))
+_GALAXY_REGISTRY: OrderedDict[int, GalaxyData] = OrderedDict()
+_GALAXY_REGISTRY_LOCK = Lock()
+
+
+def _registered(galaxy_id) -> GalaxyData | None:
+    with _GALAXY_REGISTRY_LOCK:
+        registered = _GALAXY_REGISTRY.get(galaxy_id)
+        if registered is not None:
+            _GALAXY_REGISTRY.move_to_end(galaxy_id)
+        return registered
+
+
+def intern_galaxy(galaxy: GalaxyData | dict) -> GalaxyData:
+    """
+    Return the shared instance of a galaxy, registering it if it is new.
+    A galaxy whose data differs from the registered one for its id (e.g.
+    after a catalog update) is returned as-is.
+    """
+    if isinstance(galaxy, dict):
+        registered = _registered(galaxy.get("id"))
+        # Skip validating dictionaries that hold exactly the registered data;
+        #  anything else, including partial data, is validated
+        if registered is not None and all(
+            field in galaxy and galaxy[field] == getattr(registered, field)
+            for field in GalaxyData.model_fields
+        ):
+            return registered
+        galaxy = GalaxyData.model_validate(galaxy)
+
+    with _GALAXY_REGISTRY_LOCK:
+        registered = _GALAXY_REGISTRY.setdefault(galaxy.id, galaxy)
+        _GALAXY_REGISTRY.move_to_end(galaxy.id)
+        while len(_GALAXY_REGISTRY) > GALAXY_REGISTRY_SIZE:
+            _GALAXY_REGISTRY.popitem(last=False)
+
+    if registered is galaxy or registered == galaxy:
+        return registered
+    return galaxy
+
+
+__all__ = ["GalaxyCatalog", "GalaxyData", "intern_galaxy"]
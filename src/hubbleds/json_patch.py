@@ -0,0 +1,96 @@
+"""
+Minimal JSON Patch (RFC 6902) support for persisting state as deltas.
+
+Only the `add`, `remove` and `replace` operations are produced. Dictionaries
+are compared key by key, while any other changed value (including lists) is
+replaced as a whole.
+"""
+
+from copy import deepcopy
+from typing import Any
+
+
+def _escape(key: Any) -> str:
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def _equal(a: Any, b: Any) -> bool:
+    if a is b:
+        return True
+    if type(a) is not type(b):
+        return False
+    try:
+        if a == b:
+            return True
+    except (TypeError, ValueError):
+        # e.g. numpy arrays, whose comparison is element-wise
+        return False
+
+    # NaN is never equal to itself, but both sides are encoded as the same
+    #  `null`, so an unchanged NaN needs no operation
+    if isinstance(a, float):
+        return a != a and b != b
+    if isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(_equal(x, y) for x, y in zip(a, b))
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(_equal(a[key], b[key]) for key in a)
+    return False
+
+
+def make_patch(old: Any, new: Any, path: str = "") -> list[dict]:
+    """
+    Create the list of patch operations that turns `old` into `new`.
+    """
+    if not (isinstance(old, dict) and isinstance(new, dict)):
+        if _equal(old, new):
+            return []
+        return [{"op": "replace", "path": path, "value": new}]
+
+    ops = []
+    for key in old.keys() - new.keys():
+        ops.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+
+    for key, value in new.items():
+        child_path = f"{path}/{_escape(key)}"
+        if key not in old:
+            ops.append({"op": "add", "path": child_path, "value": value})
+        else:
+            ops.extend(make_patch(old[key], value, child_path))
+
+    return ops
+
+
+def apply_patch(document: Any, ops: list[dict]) -> Any:
+    """
+    Apply `ops` to a copy of `document` and return the result.
+    """
+    document = deepcopy(document)
+
+    for op in ops:
+        tokens = [_unescape(token) for token in op["path"].split("/")[1:]]
+        if not tokens:
+            if op["op"] == "remove":
+                raise ValueError("Cannot remove the document root.")
+            document = deepcopy(op["value"])
+            continue
+
+        parent = document
+        for token in tokens[:-1]:
+            parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+
+        last = tokens[-1]
+        if isinstance(parent, list):
+            last = int(last)
+
+        if op["op"] in ("add", "replace"):
+            parent[last] = deepcopy(op["value"])
+        elif op["op"] == "remove":
+            del parent[last]
+        else:
+            raise ValueError(f"Unsupported patch operation `{op['op']}`.")
+
+    return document
@@ -3,13 +3,52 @@ from cosmicds.layout import BaseLayout, BaseSetup
 from cosmicds.logger import setup_logger
 from hubbleds.remote import LOCAL_API
 from hubbleds.utils import push_to_route
+from hubbleds.write_behind import (
+    MEASUREMENTS_WRITE,
+    SAMPLE_MEASUREMENTS_WRITE,
+    STATE_WRITES,
+    STORY_STATE_WRITE,
+    flush_writes,
+    schedule_write,
+    state_writes,
+    suppress_writes,
+)
 from solara.toestand import Ref
 
-from .state import GLOBAL_STATE, LOCAL_STATE
+from .state import FREE_RESPONSES, GLOBAL_STATE, LOCAL_STATE, MC_SCORES
 
 logger = setup_logger("LAYOUT")
 
 
+def _schedule_story_state_write(tag: str):
+    # Answers are kept outside of `LOCAL_STATE`, so their changes don't reach
+    #  the layout's write task
+    schedule_write(
+        STORY_STATE_WRITE, LOCAL_API.put_story_state, GLOBAL_STATE, LOCAL_STATE
+    )
+
+
+MC_SCORES.on_change(_schedule_story_state_write)
+FREE_RESPONSES.on_change(_schedule_story_state_write)
+
+
+def _on_route_change(path: str, route_index: int | None):
+    # Send the writes of the previous page before moving on, so that they
+    #  aren't lost if the student closes the app on the new page
+    flush_writes()
+
+    if not LOCAL_STATE.value.route_restored:
+        return
+
+    logger.info(f"Storing path location as `{path}`")
+    # Store the current route index so that users will be returned to their
+    #  previous location when they return to the app
+    Ref(LOCAL_STATE.fields.last_route).set(f"{path}")
+    Ref(LOCAL_STATE.fields.max_route_index).set(
+        max(route_index or 0, LOCAL_STATE.value.max_route_index or 0)
+    )
+
+
 @solara.component
 def Layout(children=[]):
     BaseSetup(
@@ -42,14 +81,8 @@ def Layout(children=[]):
             GLOBAL_STATE.value.student.id,
         )
 
-        # Retrieve the student's app and local states
-        LOCAL_API.get_app_story_states(GLOBAL_STATE, LOCAL_STATE)
-
-        # Load in the student's measurements
-        measurements = LOCAL_API.get_measurements(GLOBAL_STATE, LOCAL_STATE)
-        sample_measurements = LOCAL_API.get_sample_measurements(
-            GLOBAL_STATE, LOCAL_STATE
-        )
+        # Retrieve the student's app and local states, and their measurements
+        LOCAL_API.load_session_states(GLOBAL_STATE, LOCAL_STATE)
 
         logger.info("Finished loading state.")
 
@@ -59,43 +92,48 @@ def Layout(children=[]):
 
     solara.use_memo(_load_global_local_states, dependencies=[])
 
+    written_states = solara.use_ref(None)
+
     def _write_local_global_states():
         if not loaded_states.value:
             return
 
-        # Listen for changes in the states and write them to the database
-        put_state = LOCAL_API.put_story_state(GLOBAL_STATE, LOCAL_STATE)
+        # Listen for changes in the states and queue writes to the database;
+        #  bursts of changes are coalesced into a single write of each kind.
+        #  Only the writes that store the changed fields are scheduled.
+        states = (GLOBAL_STATE.value, LOCAL_STATE.value)
+        writes = state_writes(written_states.current, states)
+        written_states.current = states
+
+        if STORY_STATE_WRITE in writes:
+            schedule_write(
+                STORY_STATE_WRITE, LOCAL_API.put_story_state, GLOBAL_STATE, LOCAL_STATE
+            )
 
         # Be sure to write the measurement data separately since it's stored
         #  in another location in the database
-        put_meas = LOCAL_API.put_measurements(GLOBAL_STATE, LOCAL_STATE)
-        put_samp = LOCAL_API.put_sample_measurements(GLOBAL_STATE, LOCAL_STATE)
-
-        if put_state and put_meas and put_samp:
-            logger.info("Wrote state to database.")
-        else:
-            logger.info(
-                f"Did not write {'story state' if not put_state else ''} "
-                f"{'measurements' if not put_meas else ''} "
-                f"{'sample measurements' if not put_samp else ''} "
-                f"to database."
+        if MEASUREMENTS_WRITE in writes:
+            schedule_write(
+                MEASUREMENTS_WRITE, LOCAL_API.put_measurements, GLOBAL_STATE, LOCAL_STATE
+            )
+        if SAMPLE_MEASUREMENTS_WRITE in writes:
+            schedule_write(
+                SAMPLE_MEASUREMENTS_WRITE,
+                LOCAL_API.put_sample_measurements,
+                GLOBAL_STATE,
+                LOCAL_STATE,
             )
 
+        suppressed = len(STATE_WRITES) - len(writes)
+        if suppressed:
+            suppress_writes(suppressed)
+
     solara.lab.use_task(
         _write_local_global_states, dependencies=[GLOBAL_STATE.value, LOCAL_STATE.value]
     )
 
     def _store_user_location():
-        if not route_restored.value:
-            return
-
-        logger.info(f"Storing path location as `{route_current.path}`")
-        # Store the current route index so that users will be returned to their
-        #  previous location when they return to the app
-        Ref(LOCAL_STATE.fields.last_route).set(f"{route_current.path}")
-        Ref(LOCAL_STATE.fields.max_route_index).set(
-            max(route_index or 0, LOCAL_STATE.value.max_route_index or 0)
-        )
+        _on_route_change(route_current.path, route_index)
 
     solara.use_effect(_store_user_location, dependencies=[route_current])
 
@@ -0,0 +1,15 @@
+"""
+Loggers for the modules that don't otherwise depend on cosmicds, so that they
+can be imported, and tested, without it.
+"""
+
+try:
+    from cosmicds.logger import setup_logger
+except ImportError:
+    import logging
+
+    def setup_logger(name: str) -> logging.Logger:
+        return logging.getLogger(name)
+
+
+__all__ = ["setup_logger"]
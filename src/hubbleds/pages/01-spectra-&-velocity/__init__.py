@@ -2,7 +2,9 @@ import solara
 from solara.lab import computed
 from hubbleds.state import LOCAL_STATE, GLOBAL_STATE, get_multiple_choice, mc_callback
 from .component_state import COMPONENT_STATE, Marker
+from hubbleds.async_remote import ASYNC_API
 from hubbleds.remote import LOCAL_API
+from hubbleds.write_behind import stage_state_write, schedule_write
 from glue_jupyter import JupyterApplication
 import asyncio
 from pathlib import Path
@@ -94,10 +96,10 @@ def Page():
     router = solara.use_router()
     location = solara.use_context(solara.routing._location_context)
 
-    def _load_component_state():
+    async def _load_component_state():
         # Load stored component state from database, measurement data is
         #   considered higher-level and is loaded when the story starts.
-        LOCAL_API.get_stage_state(GLOBAL_STATE, LOCAL_STATE, COMPONENT_STATE)
+        await ASYNC_API.get_stage_state(GLOBAL_STATE, LOCAL_STATE, COMPONENT_STATE)
 
         total_galaxies = Ref(COMPONENT_STATE.fields.total_galaxies)
 
@@ -112,18 +114,32 @@ def Page():
         logger.info("Finished loading component state.")
         loaded_component_state.set(True)
 
-    solara.use_memo(_load_component_state, dependencies=[])
+    solara.lab.use_task(_load_component_state, dependencies=[])
+
+    prefetched_spectra = solara.use_ref([])
+
+    def _prefetch_spectra(galaxies: list[GalaxyData]):
+        # Warm the spectrum cache so the first click on a table row is fast
+        prefetched_spectra.current += LOCAL_API.prefetch_spectrum_data(galaxies, LOCAL_STATE)
+
+    def _cancel_spectrum_prefetch():
+        return lambda: LOCAL_API.cancel_spectrum_prefetch(prefetched_spectra.current)
+
+    solara.use_effect(_cancel_spectrum_prefetch, dependencies=[])
 
     def _write_component_state():
         if not loaded_component_state.value:
             return
 
-        # Listen for changes in the states and write them to the database
-        res = LOCAL_API.put_stage_state(GLOBAL_STATE, LOCAL_STATE, COMPONENT_STATE)
-        if res:
-            logger.info("Wrote component state to database.")
-        else:
-            logger.info("Did not write component state to database.")
+        # Listen for changes in the states and queue a write to the database;
+        #  bursts of changes are coalesced into a single write
+        schedule_write(
+            stage_state_write(COMPONENT_STATE.value.stage_id),
+            LOCAL_API.put_stage_state,
+            GLOBAL_STATE,
+            LOCAL_STATE,
+            COMPONENT_STATE,
+        )
 
     solara.lab.use_task(_write_component_state, dependencies=[COMPONENT_STATE.value])
     
@@ -231,6 +247,7 @@ def Page():
                              for galaxy in sample]
         measurements = LOCAL_STATE.value.measurements + new_measurements
         Ref(LOCAL_STATE.fields.measurements).set(measurements)
+        _prefetch_spectra(list(sample))
     
     def _select_one_random_galaxy():
         if len(LOCAL_STATE.value.measurements) >= 5:
@@ -460,6 +477,7 @@ def Page():
                         )
                     ]
                 )
+                _prefetch_spectra([galaxy])
                 
                 
             total_galaxies = Ref(COMPONENT_STATE.fields.total_galaxies)
@@ -7,7 +7,7 @@ from hubbleds.base_component_state import BaseComponentState
 import solara
 from typing import Any
 
-from hubbleds.state import LOCAL_STATE
+from hubbleds.state import question_completed
 
 
 class Marker(enum.Enum, BaseMarker):
@@ -192,7 +192,7 @@ class ComponentState(BaseComponentState, BaseState):
     
     @property
     def dot_seq10_gate(self) -> bool:
-        return LOCAL_STATE.value.question_completed("vel_meas_consensus")
+        return question_completed("vel_meas_consensus")
 
     @property
     def ref_dat1_gate(self) -> bool:
@@ -208,7 +208,7 @@ class ComponentState(BaseComponentState, BaseState):
     
     @property
     def end_sta1_gate(self) -> bool:
-        return LOCAL_STATE.value.question_completed("reflect_vel_value")
+        return question_completed("reflect_vel_value")
 
     @property
     def nxt_stg_gate(self) -> bool:
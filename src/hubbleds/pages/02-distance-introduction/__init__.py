@@ -5,7 +5,9 @@ from solara.toestand import Ref
 from hubbleds.components import Stage2Slideshow, STAGE_2_SLIDESHOW_LENGTH
 from hubbleds.state import LOCAL_STATE, GLOBAL_STATE, get_multiple_choice, mc_callback 
 from .component_state import COMPONENT_STATE
+from hubbleds.async_remote import ASYNC_API
 from hubbleds.remote import LOCAL_API
+from hubbleds.write_behind import stage_state_write, schedule_write
 from ...utils import get_image_path, DISTANCE_CONSTANT, push_to_route
 
 from cosmicds.logger import setup_logger
@@ -19,28 +21,30 @@ def Page():
     router = solara.use_router()
     location = solara.use_context(solara.routing._location_context)
 
-    def _load_component_state():
+    async def _load_component_state():
         # Load stored component state from database, measurement data is
         # considered higher-level and is loaded when the story starts
-        LOCAL_API.get_stage_state(GLOBAL_STATE, LOCAL_STATE, COMPONENT_STATE)
+        await ASYNC_API.get_stage_state(GLOBAL_STATE, LOCAL_STATE, COMPONENT_STATE)
 
         # TODO: What else to we need to do here?
         logger.info("Finished loading component state for stage 2.")
         loaded_component_state.set(True)
 
-    solara.use_memo(_load_component_state, dependencies=[])
+    solara.lab.use_task(_load_component_state, dependencies=[])
 
     def _write_component_state():
         if not loaded_component_state.value:
             return
 
-        # Listen for changes in the states and write them to the database
-        res = LOCAL_API.put_stage_state(GLOBAL_STATE, LOCAL_STATE, COMPONENT_STATE)
-        
-        if res:
-            logger.info("Wrote component state for stage 2 to database.")
-        else:
-            logger.info("Did not write component state for stage 2 to database.")
+        # Listen for changes in the states and queue a write to the database;
+        #  bursts of changes are coalesced into a single write
+        schedule_write(
+            stage_state_write(COMPONENT_STATE.value.stage_id),
+            LOCAL_API.put_stage_state,
+            GLOBAL_STATE,
+            LOCAL_STATE,
+            COMPONENT_STATE,
+        )
 
     logger.info("Trying to write component state for stage 2.")
     solara.lab.use_task(_write_component_state, dependencies=[COMPONENT_STATE.value])
@@ -37,7 +37,14 @@ from hubbleds.components import (
     )
 
 from hubbleds.data_management import *
+from hubbleds.async_remote import ASYNC_API
 from hubbleds.remote import LOCAL_API
+from hubbleds.write_behind import (
+    MEASUREMENTS_WRITE,
+    SAMPLE_MEASUREMENTS_WRITE,
+    stage_state_write,
+    schedule_write,
+)
 from hubbleds.state import (
     GLOBAL_STATE, 
     LOCAL_STATE,
@@ -198,23 +205,26 @@ def Page():
 
     distance_tool_bg_count = solara.use_reactive(0)
 
-    def _load_component_state():
-        LOCAL_API.get_stage_state(GLOBAL_STATE, LOCAL_STATE, COMPONENT_STATE)
+    async def _load_component_state():
+        await ASYNC_API.get_stage_state(GLOBAL_STATE, LOCAL_STATE, COMPONENT_STATE)
         logger.info("Finished loading component state")
         loaded_component_state.set(True)
     
-    solara.use_memo(_load_component_state, dependencies=[])
+    solara.lab.use_task(_load_component_state, dependencies=[])
     
     def _write_component_state():
         if not loaded_component_state.value:
             return
 
-        # Listen for changes in the states and write them to the database
-        res = LOCAL_API.put_stage_state(GLOBAL_STATE, LOCAL_STATE, COMPONENT_STATE)
-        if res:
-            logger.info("Wrote component state for stage 3 to database.")
-        else:
-            logger.info("Did not write component state for stage 3 to database.")
+        # Listen for changes in the states and queue a write to the database;
+        #  bursts of changes are coalesced into a single write
+        schedule_write(
+            stage_state_write(COMPONENT_STATE.value.stage_id),
+            LOCAL_API.put_stage_state,
+            GLOBAL_STATE,
+            LOCAL_STATE,
+            COMPONENT_STATE,
+        )
 
     solara.lab.use_task(_write_component_state, dependencies=[COMPONENT_STATE.value])
     
@@ -368,9 +378,9 @@ def Page():
 
     def put_measurements(samples):
         if samples:
-            LOCAL_API.put_sample_measurements(GLOBAL_STATE, LOCAL_STATE)
+            schedule_write(SAMPLE_MEASUREMENTS_WRITE, LOCAL_API.put_sample_measurements, GLOBAL_STATE, LOCAL_STATE)
         else:
-            LOCAL_API.put_measurements(GLOBAL_STATE, LOCAL_STATE)
+            schedule_write(MEASUREMENTS_WRITE, LOCAL_API.put_measurements, GLOBAL_STATE, LOCAL_STATE)
             
     def _update_angular_size(update_example: bool, galaxy, angular_size, count, meas_num = 'first', brightness = 1.0):
         # if bool(galaxy) and angular_size is not None:
@@ -18,7 +18,9 @@ from hubbleds.components import DataTable, HubbleExpUniverseSlideshow, LineDrawV
 from hubbleds.state import LOCAL_STATE, GLOBAL_STATE, StudentMeasurement, get_multiple_choice, get_free_response, mc_callback, fr_callback
 from hubbleds.viewers.hubble_scatter_viewer import HubbleScatterView
 from .component_state import COMPONENT_STATE, Marker
+from hubbleds.async_remote import ASYNC_API
 from hubbleds.remote import LOCAL_API
+from hubbleds.write_behind import stage_state_write, schedule_write
 from hubbleds.utils import AGE_CONSTANT, models_to_glue_data, PLOTLY_MARGINS, get_image_path, push_to_route
 from hubbleds.demo_helpers import set_dummy_all_measurements
 from cosmicds.logger import setup_logger
@@ -84,15 +86,23 @@ def Page():
 
     gjapp, viewers = solara.use_memo(glue_setup, dependencies=[])
 
-    def check_completed_students_count():
+    async def check_completed_students_count():
         logger.info("Checking how many students have completed measurements")
-        count = LOCAL_API.get_students_completed_measurements_count(GLOBAL_STATE, LOCAL_STATE)
+        count = await ASYNC_API.get_students_completed_measurements_count(GLOBAL_STATE, LOCAL_STATE)
         logger.info(f"Count: {count}")
         return count
 
     def load_class_data():
         logger.info("Loading class data")
         class_measurements = LOCAL_API.get_class_measurements(GLOBAL_STATE, LOCAL_STATE)
+        return _set_class_data(class_measurements)
+
+    async def load_class_data_async():
+        logger.info("Loading class data")
+        class_measurements = await ASYNC_API.get_class_measurements(GLOBAL_STATE, LOCAL_STATE)
+        return _set_class_data(class_measurements)
+
+    def _set_class_data(class_measurements: List[StudentMeasurement]):
         measurements = Ref(LOCAL_STATE.fields.class_measurements)
         student_ids = Ref(LOCAL_STATE.fields.stage_4_class_data_students)
         if not class_measurements:
@@ -138,36 +148,59 @@ def Page():
 
     async def keep_checking_class_data():
         enough_students_ready = Ref(LOCAL_STATE.fields.enough_students_ready)
-        # Add a state guard in case task cancellation fails
-        while COMPONENT_STATE.value.current_step == Marker.wwt_wait:
-            count = check_completed_students_count()
+
+        def _on_count(count):
+            logger.info(f"Count: {count}")
             if (not enough_students_ready.value) and count >= 12:
                 enough_students_ready.set(True)
             completed_count.set(count)
-            await asyncio.sleep(10)
+
+        # Add a state guard in case task cancellation fails: stop waiting as
+        #  soon as the student leaves the waiting room
+        loop = asyncio.get_running_loop()
+        left_waiting_room = asyncio.Event()
+
+        def _on_component_state(state):
+            if state.current_step != Marker.wwt_wait:
+                loop.call_soon_threadsafe(left_waiting_room.set)
+
+        # The count is polled once per class and pushed to every waiting student
+        unsubscribe = LOCAL_API.subscribe_students_completed_count(
+            GLOBAL_STATE, LOCAL_STATE, _on_count
+        )
+        unsubscribe_step = COMPONENT_STATE.subscribe(_on_component_state)
+        try:
+            if COMPONENT_STATE.value.current_step == Marker.wwt_wait:
+                await left_waiting_room.wait()
+        finally:
+            unsubscribe_step()
+            unsubscribe()
 
     class_ready_task = solara.lab.use_task(keep_checking_class_data, dependencies=[])
 
-    def _on_waiting_room_advance():
+    def _cancel_class_ready_task():
         if class_ready_task.pending:
             try:
                 class_ready_task.cancel()
             except RuntimeError:
                 pass
+
+    def _on_waiting_room_advance():
+        _cancel_class_ready_task()
         load_class_data()
         transition_next(COMPONENT_STATE)
 
-    def _load_component_state():
+    async def _load_component_state():
         # Load stored component state from database, measurement data is
         # considered higher-level and is loaded when the story starts
-        LOCAL_API.get_stage_state(GLOBAL_STATE, LOCAL_STATE, COMPONENT_STATE)
+        await ASYNC_API.get_stage_state(GLOBAL_STATE, LOCAL_STATE, COMPONENT_STATE)
 
         # TODO: What else to we need to do here?
         logger.info("Finished loading component state for stage 4.")
 
         value = LOCAL_STATE.value.enough_students_ready \
                 or \
-                (check_completed_students_count() >= 12)
+                (await check_completed_students_count() >= 12)
 
         Ref(LOCAL_STATE.fields.enough_students_ready).set(value)
         if GLOBAL_STATE.value.educator:
@@ -175,24 +208,29 @@ def Page():
         set_skip_waiting_room(value)
         if value:
             if COMPONENT_STATE.value.current_step == Marker.wwt_wait:
-                _on_waiting_room_advance()
+                _cancel_class_ready_task()
+                await load_class_data_async()
+                transition_next(COMPONENT_STATE)
             else:
-                load_class_data()
+                await load_class_data_async()
 
         loaded_component_state.set(True)
 
-    solara.use_memo(_load_component_state, dependencies=[])
+    solara.lab.use_task(_load_component_state, dependencies=[])
 
     def _write_component_state():
         if not loaded_component_state.value:
             return
 
-        # Listen for changes in the states and write them to the database
-        res = LOCAL_API.put_stage_state(GLOBAL_STATE, LOCAL_STATE, COMPONENT_STATE)
-        if res:
-            logger.info("Wrote component state for stage 4 to database.")
-        else:
-            logger.info("Did not write component state for stage 4 to database.")
+        # Listen for changes in the states and queue a write to the database;
+        #  bursts of changes are coalesced into a single write
+        schedule_write(
+            stage_state_write(COMPONENT_STATE.value.stage_id),
+            LOCAL_API.put_stage_state,
+            GLOBAL_STATE,
+            LOCAL_STATE,
+            COMPONENT_STATE,
+        )
 
 
     solara.lab.use_task(_write_component_state, dependencies=[COMPONENT_STATE.value])
@@ -201,7 +239,7 @@ def Page():
     async def _load_student_data():
         if not LOCAL_STATE.value.measurements_loaded:
             logger.info("Loading measurements")
-            measurements = LOCAL_API.get_measurements(GLOBAL_STATE, LOCAL_STATE)
+            measurements = await ASYNC_API.get_measurements(GLOBAL_STATE, LOCAL_STATE)
             student_plot_data.set(measurements)
     solara.lab.use_task(_load_student_data)
 
@@ -461,7 +499,7 @@ def Page():
                 event_back_callback=lambda _: transition_previous(COMPONENT_STATE),
                 can_advance=COMPONENT_STATE.value.can_transition(next=True),
                 show=COMPONENT_STATE.value.is_current_step(Marker.sho_est1),
-                event_fr_callback = lambda event: fr_callback(event, LOCAL_STATE, COMPONENT_STATE, lambda: LOCAL_API.put_story_state(GLOBAL_STATE, LOCAL_STATE)),
+                event_fr_callback = lambda event: fr_callback(event, LOCAL_STATE, COMPONENT_STATE),
                 state_view={
                     'free_response_a': get_free_response(LOCAL_STATE, COMPONENT_STATE,'shortcoming-1'),
                     'free_response_b': get_free_response(LOCAL_STATE, COMPONENT_STATE,'shortcoming-2'),
@@ -22,11 +22,14 @@ from hubbleds.base_component_state import transition_next, transition_previous
 from hubbleds.components import UncertaintySlideshow, IdSlider
 from hubbleds.tools import *  # noqa
 from hubbleds.state import LOCAL_STATE, GLOBAL_STATE, ClassSummary, StudentMeasurement, StudentSummary, get_free_response, get_multiple_choice, mc_callback, fr_callback
-from hubbleds.utils import create_single_summary, make_summary_data, models_to_glue_data, get_image_path, push_to_route
+from hubbleds.columnar import MeasurementTable
+from hubbleds.utils import component_summary, create_single_summary, make_summary_data, models_to_glue_data, get_image_path, push_to_route
 from hubbleds.viewers.hubble_histogram_viewer import HubbleHistogramView
 from hubbleds.viewers.hubble_scatter_viewer import HubbleScatterView
 from .component_state import COMPONENT_STATE, Marker
+from hubbleds.async_remote import ASYNC_API
 from hubbleds.remote import LOCAL_API
+from hubbleds.write_behind import stage_state_write, schedule_write
 from hubbleds.viewer_marker_colors import (
     MY_DATA_COLOR,
     MY_DATA_COLOR_NAME,
@@ -56,27 +59,30 @@ def Page():
     router = solara.use_router()
     location = solara.use_context(solara.routing._location_context)
 
-    def _load_component_state():
+    async def _load_component_state():
         # Load stored component state from database, measurement data is
         # considered higher-level and is loaded when the story starts
-        LOCAL_API.get_stage_state(GLOBAL_STATE, LOCAL_STATE, COMPONENT_STATE)
+        await ASYNC_API.get_stage_state(GLOBAL_STATE, LOCAL_STATE, COMPONENT_STATE)
 
         # TODO: What else to we need to do here?
         logger.info("Finished loading component state for stage 4.")
         loaded_component_state.set(True)
 
-    solara.use_memo(_load_component_state, dependencies=[])
+    solara.lab.use_task(_load_component_state, dependencies=[])
 
     def _write_component_state():
         if not loaded_component_state.value:
             return
 
-        # Listen for changes in the states and write them to the database
-        res = LOCAL_API.put_stage_state(GLOBAL_STATE, LOCAL_STATE, COMPONENT_STATE)
-        if res:
-            logger.info("Wrote stage 5 component state to database.")
-        else:
-            logger.info("Did not write stage 5 component state to database.")
+        # Listen for changes in the states and queue a write to the database;
+        #  bursts of changes are coalesced into a single write
+        schedule_write(
+            stage_state_write(COMPONENT_STATE.value.stage_id),
+            LOCAL_API.put_stage_state,
+            GLOBAL_STATE,
+            LOCAL_STATE,
+            COMPONENT_STATE,
+        )
 
     solara.lab.use_task(_write_component_state, dependencies=[COMPONENT_STATE.value])
     
@@ -156,6 +162,15 @@ def Page():
         if (not GLOBAL_STATE.value.update_db) and len(LOCAL_STATE.value.measurements)>0:
             class_measurements.extend(m for m in LOCAL_STATE.value.measurements)
 
+        class_info = GLOBAL_STATE.value.classroom.class_info
+        if class_info is not None:
+            # The cached class measurements are shared between sessions, so
+            #  they are copied rather than changed
+            class_measurements = [
+                m if m.class_id == class_info["id"] else m.model_copy(update={"class_id": class_info["id"]})
+                for m in class_measurements
+            ]
+
         measurements = Ref(LOCAL_STATE.fields.class_measurements)
         student_ids = Ref(LOCAL_STATE.fields.stage_5_class_data_students)
         if class_measurements and not student_ids.value:
@@ -166,18 +181,19 @@ def Page():
         all_measurements, student_summaries, class_summaries = LOCAL_API.get_all_data(GLOBAL_STATE, LOCAL_STATE)
         if GLOBAL_STATE.value.classroom.class_info is not None:
             class_id = GLOBAL_STATE.value.classroom.class_info["id"]
-            class_distances = [distance for m in class_measurements if ((distance := m.est_dist_value) is not None and m.velocity_value is not None)]
-            class_velocities = [velocity for m in class_measurements if (m.est_dist_value is not None and (velocity := m.velocity_value) is not None)]
-            my_class_h0, my_class_age = create_single_summary(distances=class_distances, velocities=class_velocities)
+            # The other classes' data arrives as a table, so only our own
+            #  class is converted from models
+            class_table = MeasurementTable.from_models(class_measurements)
+            class_points = class_table.complete("est_dist_value", "velocity_value")
+            my_class_h0, my_class_age = create_single_summary(
+                distances=class_points.values("est_dist_value"),
+                velocities=class_points.values("velocity_value"),
+            )
             class_summaries.append(ClassSummary(class_id=class_id, hubble_fit_value=my_class_h0, age_value=my_class_age))
-            for measurement in class_measurements:
-                measurement.class_id = class_id
-            all_measurements.extend(class_measurements)
+            all_measurements = all_measurements.concatenate(class_table)
 
-        all_meas = Ref(LOCAL_STATE.fields.all_measurements)
         all_stu_summaries = Ref(LOCAL_STATE.fields.student_summaries)
         all_cls_summaries = Ref(LOCAL_STATE.fields.class_summaries)
-        all_meas.set(all_measurements)
         all_stu_summaries.set(student_summaries)
         all_cls_summaries.set(class_summaries)
 
@@ -261,7 +277,7 @@ def Page():
         student_hist_viewer.layers[0].state.color = MY_CLASS_COLOR
         student_hist_viewer.add_subset(my_summ_subset)
 
-        all_data = models_to_glue_data(all_measurements, label="All Measurements")
+        all_data = all_measurements.to_glue_data(label="All Measurements")
         all_data = GLOBAL_STATE.value.add_or_update_data(all_data)
 
         student_summ_data = models_to_glue_data(student_summaries, label="All Student Summaries")
@@ -437,13 +453,18 @@ def Page():
         class_data_size = Ref(COMPONENT_STATE.fields.class_data_size)
 
         class_summary_data = GLOBAL_STATE.value.glue_data_collection["Class Summaries"]
-        student_low_age.set(round(min(class_summary_data["age_value"])))
-        student_high_age.set(round(max(class_summary_data["age_value"])))
+        class_ages = component_summary(class_summary_data, class_summary_data.id["age_value"]).sorted_values
+        # The sorted ages leave out missing values, and may be empty
+        if len(class_ages) > 0:
+            student_low_age.set(round(class_ages[0]))
+            student_high_age.set(round(class_ages[-1]))
         class_data_size.set(len(class_summary_data["age_value"]))
 
         all_class_summ_data = GLOBAL_STATE.value.glue_data_collection["All Class Summaries"]
-        class_low_age.set(round(min(all_class_summ_data["age_value"])))
-        class_high_age.set(round(max(all_class_summ_data["age_value"])))
+        all_class_ages = component_summary(all_class_summ_data, all_class_summ_data.id["age_value"]).sorted_values
+        if len(all_class_ages) > 0:
+            class_low_age.set(round(all_class_ages[0]))
+            class_high_age.set(round(all_class_ages[-1]))
 
     solara.use_memo(_parse_component_state, dependencies=[loaded_component_state.value])
 
@@ -645,7 +666,7 @@ def Page():
                             age_calc_short1=get_free_response(LOCAL_STATE, COMPONENT_STATE,"shortcoming-1").get("response"),
                             age_calc_short2=get_free_response(LOCAL_STATE, COMPONENT_STATE,"shortcoming-2").get("response"),
                             age_calc_short_other=get_free_response(LOCAL_STATE, COMPONENT_STATE,"other-shortcomings").get("response"),    
-                            event_fr_callback = lambda event: fr_callback(event, LOCAL_STATE, COMPONENT_STATE, lambda: LOCAL_API.put_story_state(GLOBAL_STATE, LOCAL_STATE)),
+                            event_fr_callback = lambda event: fr_callback(event, LOCAL_STATE, COMPONENT_STATE),
                             free_responses=[get_free_response(LOCAL_STATE, COMPONENT_STATE,'shortcoming-4'), get_free_response(LOCAL_STATE, COMPONENT_STATE,'systematic-uncertainty')],
                             event_set_step=uncertainty_step.set,
                             event_set_max_step_completed=uncertainty_max_step_completed.set,
@@ -715,7 +736,7 @@ def Page():
                         age_calc_short1=get_free_response(LOCAL_STATE, COMPONENT_STATE,"shortcoming-1").get("response"),
                         age_calc_short2=get_free_response(LOCAL_STATE, COMPONENT_STATE,"shortcoming-2").get("response"),
                         age_calc_short_other=get_free_response(LOCAL_STATE, COMPONENT_STATE,"other-shortcomings").get("response"),  
-                        event_fr_callback = lambda event: fr_callback(event, LOCAL_STATE, COMPONENT_STATE, lambda: LOCAL_API.put_story_state(GLOBAL_STATE, LOCAL_STATE)),
+                        event_fr_callback = lambda event: fr_callback(event, LOCAL_STATE, COMPONENT_STATE),
                         free_responses=[get_free_response(LOCAL_STATE, COMPONENT_STATE,'shortcoming-4'), get_free_response(LOCAL_STATE, COMPONENT_STATE,'systematic-uncertainty')],
                         event_set_step=uncertainty_step.set,
                         event_set_max_step_completed=uncertainty_max_step_completed.set,
@@ -822,10 +843,10 @@ def Page():
         event_back_callback=lambda _: transition_previous(COMPONENT_STATE),
         can_advance=COMPONENT_STATE.value.can_transition(next=True),
         show=COMPONENT_STATE.value.is_current_step(Marker.mos_lik4),
-        event_fr_callback = lambda event: fr_callback(event, LOCAL_STATE, COMPONENT_STATE, lambda: LOCAL_API.put_story_state(GLOBAL_STATE, LOCAL_STATE)),
+        event_fr_callback = lambda event: fr_callback(event, LOCAL_STATE, COMPONENT_STATE),
         state_view={
             'free_response_a': get_free_response(LOCAL_STATE, COMPONENT_STATE,'best-guess-age'),
-            # 'best_guess_answered': LOCAL_STATE.value.question_completed("best-guess-age"),
+            # 'best_guess_answered': question_completed("best-guess-age"),
             'free_response_b': get_free_response(LOCAL_STATE, COMPONENT_STATE,'my-reasoning')
         }
     )
@@ -836,11 +857,11 @@ def Page():
         event_back_callback=lambda _: transition_previous(COMPONENT_STATE),
         can_advance=COMPONENT_STATE.value.can_transition(next=True),
         show=COMPONENT_STATE.value.is_current_step(Marker.con_int3),
-        event_fr_callback = lambda event: fr_callback(event, LOCAL_STATE, COMPONENT_STATE, lambda: LOCAL_API.put_story_state(GLOBAL_STATE, LOCAL_STATE)),
+        event_fr_callback = lambda event: fr_callback(event, LOCAL_STATE, COMPONENT_STATE),
         state_view={
             'free_response_a': get_free_response(LOCAL_STATE, COMPONENT_STATE,'likely-low-age'),
             'free_response_b': get_free_response(LOCAL_STATE, COMPONENT_STATE,'likely-high-age'),
-            # 'high_low_answered': LOCAL_STATE.value.question_completed("likely-low-age") and LOCAL_STATE.value.question_completed("likely-high-age"),
+            # 'high_low_answered': question_completed("likely-low-age") and question_completed("likely-high-age"),
             'free_response_c': get_free_response(LOCAL_STATE, COMPONENT_STATE,'my-reasoning-2'),
         }
     )
@@ -928,7 +949,7 @@ def Page():
                     event_back_callback=lambda _: transition_previous(COMPONENT_STATE),
                     can_advance=COMPONENT_STATE.value.can_transition(next=True),
                     show=COMPONENT_STATE.value.is_current_step(Marker.two_his5),
-                    event_fr_callback = lambda event: fr_callback(event, LOCAL_STATE, COMPONENT_STATE, lambda: LOCAL_API.put_story_state(GLOBAL_STATE, LOCAL_STATE)),
+                    event_fr_callback = lambda event: fr_callback(event, LOCAL_STATE, COMPONENT_STATE),
                     state_view={
                         'free_response': get_free_response(LOCAL_STATE, COMPONENT_STATE,'unc-range-change-reasoning'),
                     }
@@ -954,7 +975,7 @@ def Page():
             event_back_callback=lambda _: transition_previous(COMPONENT_STATE),
             can_advance=COMPONENT_STATE.value.can_transition(next=True),
             show=COMPONENT_STATE.value.is_current_step(Marker.con_int2c),
-            event_fr_callback = lambda event: fr_callback(event, LOCAL_STATE, COMPONENT_STATE, lambda: LOCAL_API.put_story_state(GLOBAL_STATE, LOCAL_STATE)),
+            event_fr_callback = lambda event: fr_callback(event, LOCAL_STATE, COMPONENT_STATE),
             state_view={
                 "low_guess": get_free_response(LOCAL_STATE, COMPONENT_STATE,"likely-low-age").get("response"),
                 "high_guess": get_free_response(LOCAL_STATE, COMPONENT_STATE,"likely-high-age").get("response"),
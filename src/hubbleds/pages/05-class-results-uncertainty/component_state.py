@@ -5,7 +5,7 @@ from pydantic import BaseModel, field_validator, computed_field
 from cosmicds.state import BaseState
 from hubbleds.base_marker import BaseMarker
 from hubbleds.base_component_state import BaseComponentState
-from hubbleds.state import LOCAL_STATE
+from hubbleds.state import question_completed
 
 import enum
 
@@ -81,7 +81,7 @@ class ComponentState(BaseComponentState, BaseState):
 
     @property
     def cla_age1_gate(self) -> bool:
-        return LOCAL_STATE.value.question_completed("age-slope-trend")
+        return question_completed("age-slope-trend")
 
     @property
     def mos_lik1_gate(self) -> bool:
@@ -89,11 +89,11 @@ class ComponentState(BaseComponentState, BaseState):
 
     # @property
     # def con_int1_gate(self) -> bool:
-    #     return LOCAL_STATE.value.question_completed("best-guess-age") and LOCAL_STATE.value.question_completed("my-reasoning")    
+    #     return question_completed("best-guess-age") and question_completed("my-reasoning")    
     
     # @property
     # def cla_dat1_gate(self) -> bool:
-    #     return LOCAL_STATE.value.question_completed("likely-low-age") and LOCAL_STATE.value.question_completed("likely-high-age") and LOCAL_STATE.value.question_completed("my-reasoning-2")  
+    #     return question_completed("likely-low-age") and question_completed("likely-high-age") and question_completed("my-reasoning-2")  
 
     @property
     def you_age1c_gate(self) -> bool:
@@ -101,23 +101,23 @@ class ComponentState(BaseComponentState, BaseState):
     
     # @property
     # def two_his1_gate(self) -> bool:
-    #     return LOCAL_STATE.value.question_completed("new-most-likely-age") and LOCAL_STATE.value.question_completed("new-likely-low-age") and LOCAL_STATE.value.question_completed("new-likely-high-age") and LOCAL_STATE.value.question_completed("my-updated-reasoning")  
+    #     return question_completed("new-most-likely-age") and question_completed("new-likely-low-age") and question_completed("new-likely-high-age") and question_completed("my-updated-reasoning")  
 
     @property
     def two_his3_gate(self) -> bool:
-        return LOCAL_STATE.value.question_completed("histogram-range")
+        return question_completed("histogram-range")
     
     @property
     def two_his4_gate(self) -> bool:
-        return LOCAL_STATE.value.question_completed("histogram-percent-range")
+        return question_completed("histogram-percent-range")
     
     @property
     def two_his5_gate(self) -> bool:
-        return LOCAL_STATE.value.question_completed("histogram-distribution")
+        return question_completed("histogram-distribution")
 
     # @property
     # def mor_dat1_gate(self) -> bool:
-    #     return LOCAL_STATE.value.question_completed("unc-range-change-reasoning")
+    #     return question_completed("unc-range-change-reasoning")
     
 
 COMPONENT_STATE = solara.reactive(ComponentState())
@@ -14,7 +14,9 @@ from cosmicds.logger import setup_logger
 from cosmicds.utils import show_legend, show_layer_traces_in_legend
 
 # hubbleds
+from hubbleds.async_remote import ASYNC_API
 from hubbleds.remote import LOCAL_API
+from hubbleds.write_behind import stage_state_write, schedule_write
 from hubbleds.base_component_state import (
     transition_previous,
     transition_next,
@@ -25,7 +27,8 @@ from hubbleds.state import (
     mc_callback, 
     fr_callback, 
     get_free_response, 
-    get_multiple_choice
+    get_multiple_choice,
+    question_completed,
 )
 from hubbleds.viewer_marker_colors import (
     MY_CLASS_COLOR,
@@ -158,23 +161,26 @@ def Page():
 
     gjapp, viewer = solara.use_memo(_glue_setup)
 
-    def _load_component_state():
-        LOCAL_API.get_stage_state(GLOBAL_STATE, LOCAL_STATE, COMPONENT_STATE)
+    async def _load_component_state():
+        await ASYNC_API.get_stage_state(GLOBAL_STATE, LOCAL_STATE, COMPONENT_STATE)
         logger.info("Finished loading component state")
         loaded_component_state.set(True)
 
-    solara.use_memo(_load_component_state, dependencies=[])
+    solara.lab.use_task(_load_component_state, dependencies=[])
 
     def _write_component_state():
         if not loaded_component_state.value:
             return
 
-        # Listen for changes in the states and write them to the database
-        res = LOCAL_API.put_stage_state(GLOBAL_STATE, LOCAL_STATE, COMPONENT_STATE)
-        if res:
-            logger.info("Wrote stage 6 component state to database.")
-        else:
-            logger.info("Did not write stage 6 component state to database.")
+        # Listen for changes in the states and queue a write to the database;
+        #  bursts of changes are coalesced into a single write
+        schedule_write(
+            stage_state_write(COMPONENT_STATE.value.stage_id),
+            LOCAL_API.put_stage_state,
+            GLOBAL_STATE,
+            LOCAL_STATE,
+            COMPONENT_STATE,
+        )
 
     solara.lab.use_task(_write_component_state, dependencies=[COMPONENT_STATE.value])
 
@@ -339,12 +345,12 @@ def Page():
                 can_advance=COMPONENT_STATE.value.can_transition(next=True),
                 show=COMPONENT_STATE.value.is_current_step(Marker.pro_dat4),
                 event_mc_callback = lambda event: mc_callback(event, LOCAL_STATE, COMPONENT_STATE),
-                event_fr_callback = lambda event: fr_callback(event, LOCAL_STATE, COMPONENT_STATE, lambda: LOCAL_API.put_story_state(GLOBAL_STATE, LOCAL_STATE)),
+                event_fr_callback = lambda event: fr_callback(event, LOCAL_STATE, COMPONENT_STATE),
                 state_view={
                     'mc_score': get_multiple_choice(LOCAL_STATE, COMPONENT_STATE, 'pro-dat4'), 
                     'score_tag': 'pro-dat4',
                     'free_response': get_free_response(LOCAL_STATE, COMPONENT_STATE, 'prodata-free-4'),
-                    'mc_completed': LOCAL_STATE.value.question_completed("pro-dat4"),
+                    'mc_completed': question_completed("pro-dat4"),
                 }
             )
             ScaffoldAlert(
@@ -380,12 +386,12 @@ def Page():
                 can_advance=COMPONENT_STATE.value.can_transition(next=True),
                 show=COMPONENT_STATE.value.is_current_step(Marker.pro_dat7),
                 event_mc_callback = lambda event: mc_callback(event, LOCAL_STATE, COMPONENT_STATE),
-                event_fr_callback = lambda event: fr_callback(event, LOCAL_STATE, COMPONENT_STATE, lambda: LOCAL_API.put_story_state(GLOBAL_STATE, LOCAL_STATE)),
+                event_fr_callback = lambda event: fr_callback(event, LOCAL_STATE, COMPONENT_STATE),
                 state_view={
                     'mc_score': get_multiple_choice(LOCAL_STATE, COMPONENT_STATE, 'pro-dat7'), 
                     'score_tag': 'pro-dat7',
                     'free_response': get_free_response(LOCAL_STATE, COMPONENT_STATE, 'prodata-free-7'),
-                    'mc_completed': LOCAL_STATE.value.question_completed("pro-dat7"),
+                    'mc_completed': question_completed("pro-dat7"),
                 }                
             )
             ScaffoldAlert(
@@ -394,7 +400,7 @@ def Page():
                 event_back_callback=lambda _: transition_previous(COMPONENT_STATE),
                 can_advance=COMPONENT_STATE.value.can_transition(next=True),
                 show=COMPONENT_STATE.value.is_current_step(Marker.pro_dat8),
-                event_fr_callback = lambda event: fr_callback(event, LOCAL_STATE, COMPONENT_STATE, lambda: LOCAL_API.put_story_state(GLOBAL_STATE, LOCAL_STATE)),
+                event_fr_callback = lambda event: fr_callback(event, LOCAL_STATE, COMPONENT_STATE),
                 state_view={
                     'free_response_a': get_free_response(LOCAL_STATE, COMPONENT_STATE,'prodata-reflect-8a'),
                     'free_response_b': get_free_response(LOCAL_STATE, COMPONENT_STATE,'prodata-reflect-8b'),
@@ -5,7 +5,7 @@ from pydantic import field_validator
 from cosmicds.state import BaseState
 from hubbleds.base_marker import BaseMarker
 from hubbleds.base_component_state import BaseComponentState
-from hubbleds.state import LOCAL_STATE
+from hubbleds.state import question_completed
 
 import enum
 from typing import Any
@@ -53,31 +53,31 @@ class ComponentState(BaseComponentState, BaseState):
     
     @property
     def pro_dat2_gate(self) -> bool:
-        return LOCAL_STATE.value.question_completed("pro-dat1")
+        return question_completed("pro-dat1")
     
     @property
     def pro_dat4_gate(self) -> bool:
-        return LOCAL_STATE.value.question_completed("pro-dat2") 
+        return question_completed("pro-dat2") 
     
     @property
     def pro_dat5_gate(self) -> bool:
-        return LOCAL_STATE.value.question_completed("pro-dat4") #and LOCAL_STATE.value.question_completed("prodata-free-4")
+        return question_completed("pro-dat4") #and question_completed("prodata-free-4")
     
     @property
     def pro_dat7_gate(self) -> bool:
-        return LOCAL_STATE.value.question_completed("pro-dat6")
+        return question_completed("pro-dat6")
     
     @property
     def pro_dat8_gate(self) -> bool:
-        return LOCAL_STATE.value.question_completed("pro-dat7") #and LOCAL_STATE.value.question_completed("prodata-free-7")
+        return question_completed("pro-dat7") #and question_completed("prodata-free-7")
     
     # @property
     # def pro_dat9_gate(self) -> bool:
-    #     return LOCAL_STATE.value.question_completed("prodata-reflect-8a") #and LOCAL_STATE.value.question_completed("prodata-reflect-8b") and LOCAL_STATE.value.question_completed("prodata-reflect-8c")
+    #     return question_completed("prodata-reflect-8a") #and question_completed("prodata-reflect-8b") and question_completed("prodata-reflect-8c")
     
     @property
     def sto_fin1_gate(self) -> bool:
-        return LOCAL_STATE.value.question_completed("pro-dat9")
+        return question_completed("pro-dat9")
     
     
 COMPONENT_STATE = solara.reactive(ComponentState())
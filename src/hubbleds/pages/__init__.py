@@ -7,6 +7,7 @@ from solara.toestand import Ref
 from hubbleds.components import IntroSlideshowVue
 from hubbleds.state import LOCAL_STATE, GLOBAL_STATE
 
+from hubbleds.async_remote import ASYNC_API
 from hubbleds.remote import LOCAL_API
 from hubbleds.widgets.exploration_tool.exploration_tool import ExplorationTool
 from ..utils import get_image_path, push_to_route
@@ -27,12 +28,12 @@ def Page():
     
     loaded_component_state = solara.use_reactive(False)
 
-    def _load_component_state():
-        LOCAL_API.get_stage_state(GLOBAL_STATE, LOCAL_STATE, COMPONENT_STATE)
+    async def _load_component_state():
+        await ASYNC_API.get_stage_state(GLOBAL_STATE, LOCAL_STATE, COMPONENT_STATE)
         logger.info("Finished loading component state.")
         loaded_component_state.set(True)
 
-    solara.use_memo(_load_component_state, dependencies=[])
+    solara.lab.use_task(_load_component_state, dependencies=[])
 
     def _write_component_state():
         if not loaded_component_state.value:
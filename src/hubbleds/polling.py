@@ -0,0 +1,157 @@
+"""
+Shared polling of values that are the same for many sessions, such as how
+many students of a class have finished their measurements. Rather than every
+session polling the API on its own schedule, one poller thread per key
+fetches the value and broadcasts changes to every subscribed session.
+"""
+
+import os
+from itertools import count
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Hashable
+
+from solara.server import kernel_context
+
+from .logger import setup_logger
+
+logger = setup_logger("POLLING")
+
+CLASS_POLL_INTERVAL = float(os.getenv("CDS_CLASS_POLL_INTERVAL", "10"))
+
+
+class _Poll:
+    def __init__(self):
+        # The kernel context, callback and fetch of each subscriber, oldest first
+        self.subscribers: dict[
+            int, tuple[Any, Callable[[Any], None], Callable[[], Any]]
+        ] = {}
+        self.stopped = Event()
+        self.has_value = False
+        self.value = None
+        self.thread: Thread | None = None
+
+
+class FanOutPoller:
+    """
+    Runs one polling thread per key while that key has subscribers. The
+    thread starts with the first subscriber and stops with the last one.
+    Each subscriber is called with the first value and then whenever the
+    value changes, inside the kernel context it subscribed from.
+
+    Parameters
+    ----------
+    interval: float
+        The number of seconds between fetches
+    name: str
+        A label used for the poller threads and log messages
+    """
+
+    def __init__(self, interval: float, name: str = "poller"):
+        self.interval = interval
+        self.name = name
+        self._lock = Lock()
+        self._polls: dict[Hashable, _Poll] = {}
+        self._tokens = count()
+        self.fetches = 0
+        self.broadcasts = 0
+
+    def subscribe(
+        self,
+        key: Hashable,
+        fetch: Callable[[], Any],
+        callback: Callable[[Any], None],
+    ) -> Callable[[], None]:
+        """
+        Subscribe `callback` to the value of `key`, and return a function
+        that cancels the subscription. The poller uses the `fetch` of its
+        oldest current subscriber, so every subscriber's `fetch` must return
+        the same value. It runs in the poller thread, so it must not read
+        reactive state.
+        """
+        context = (
+            kernel_context.get_current_context()
+            if kernel_context.has_current_context()
+            else None
+        )
+        token = next(self._tokens)
+
+        with self._lock:
+            poll = self._polls.get(key)
+            if poll is None:
+                poll = self._polls[key] = _Poll()
+                poll.thread = Thread(
+                    target=self._run,
+                    args=(key, poll),
+                    name=f"{self.name}-{key}",
+                    daemon=True,
+                )
+                poll.thread.start()
+                logger.info("Started %s for `%s`.", self.name, key)
+
+            poll.subscribers[token] = (context, callback, fetch)
+            has_value, value = poll.has_value, poll.value
+
+        # Late subscribers don't wait for the next change
+        if has_value:
+            callback(value)
+
+        return lambda: self._unsubscribe(key, poll, token)
+
+    def _unsubscribe(self, key: Hashable, poll: _Poll, token: int):
+        with self._lock:
+            poll.subscribers.pop(token, None)
+            if poll.subscribers or self._polls.get(key) is not poll:
+                return
+
+            del self._polls[key]
+            poll.stopped.set()
+
+        logger.info("Stopped %s for `%s`.", self.name, key)
+
+    def _run(self, key: Hashable, poll: _Poll):
+        while not poll.stopped.is_set():
+            with self._lock:
+                subscribers = list(poll.subscribers.values())
+            if not subscribers:
+                break
+
+            try:
+                value = subscribers[0][2]()
+                self.fetches += 1
+            except Exception as e:
+                logger.warning("Failed to poll `%s` in %s: %s", key, self.name, e)
+            else:
+                with self._lock:
+                    changed = not poll.has_value or value != poll.value
+                    poll.has_value, poll.value = True, value
+                    subscribers = list(poll.subscribers.values())
+
+                if changed:
+                    self._broadcast(key, value, subscribers)
+
+            poll.stopped.wait(self.interval)
+
+    def _broadcast(self, key: Hashable, value: Any, subscribers: list):
+        self.broadcasts += 1
+        for context, callback, _ in subscribers:
+            try:
+                if context is None:
+                    callback(value)
+                else:
+                    with context:
+                        callback(value)
+            except Exception as e:
+                logger.warning("Failed to deliver `%s` from %s: %s", key, self.name, e)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "pollers": len(self._polls),
+                "subscribers": sum(len(p.subscribers) for p in self._polls.values()),
+                "fetches": self.fetches,
+                "broadcasts": self.broadcasts,
+            }
+
+
+CLASS_PROGRESS_POLLER = FanOutPoller(CLASS_POLL_INTERVAL, name="class-progress-poller")
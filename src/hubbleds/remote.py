@@ -1,16 +1,17 @@
-from cosmicds.utils import CDSJSONEncoder
 from hubbleds.state import ClassSummary, StudentMeasurement, StudentSummary
 from contextlib import closing
 from io import BytesIO
-import json
 from astropy.io import fits
-from hubbleds.state import GalaxyData, SpectrumData, LocalState
+from hubbleds.state import GalaxyCatalog, GalaxyData, SpectrumData, LocalState, intern_galaxy
+from hubbleds.state import FREE_RESPONSES, MC_SCORES, parse_measurements
 from cosmicds.remote import BaseAPI
 from cosmicds.state import GlobalState, BaseState, GLOBAL_STATE
+import solara
 from solara import Reactive
+from solara.server import kernel_context
 from solara.toestand import Ref
 from cosmicds.logger import setup_logger
-from typing import List
+from typing import Callable, List
 
 from pathlib import Path
 from csv import DictReader
@@ -19,56 +20,335 @@ logger = setup_logger("API")
 
 from .data_management import DB_VELOCITY_FIELD
 from numpy.random import Generator, PCG64, SeedSequence
-from numpy import arange, asarray, ravel, column_stack
+from numpy import arange, asarray, memmap, ravel, column_stack
 from typing import Any
 from pandas import read_csv
 
-from .data_management import ELEMENT_REST
+from .data_management import ELEMENT_REST, SPECTRUM_TYPE_FOLDERS
+from .cache import NOT_MODIFIED, CachePrefetcher, RevalidatingCache, SizedLRUCache
+from types import MappingProxyType
+from collections import Counter, defaultdict
+from .json_patch import make_patch
+from .serialization import dump_model, dumps, loads
+from .spectrum_store import SPECTRUM_STORE
+from .polling import CLASS_PROGRESS_POLLER
+from .all_data import AllDataSnapshot
+from .columnar import AllDataPayload, MeasurementTable, parse_all_data
+from datetime import datetime
+import os
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
 DEBOUNCE_TIMEOUT = 1
 
+# Spectra are identical for every student, so they are cached once per worker
+SPECTRUM_CACHE_MAX_BYTES = int(os.getenv("CDS_SPECTRUM_CACHE_MB", "256")) * 1024 ** 2
+
+
+def _spectrum_nbytes(spec_data: SpectrumData) -> int:
+    # Views of the memory-mapped store share the OS page cache, so they only
+    #  cost their array headers
+    return sum(
+        256 if isinstance(column, memmap) else column.nbytes
+        for column in (spec_data.wave, spec_data.flux, spec_data.ivar)
+    )
+
+
+SPECTRUM_CACHE = SizedLRUCache(
+    SPECTRUM_CACHE_MAX_BYTES, _spectrum_nbytes, name="spectrum cache"
+)
+# The last stored payload of each measurement, by kernel context and then by
+#  (story, student, endpoint), so that unchanged measurements are not written
+#  again; a session's entries are dropped when its kernel shuts down
+ACKNOWLEDGED_MEASUREMENTS: dict[str | None, defaultdict[tuple, dict]] = {}
+MEASUREMENT_WRITE_STATS: Counter[str] = Counter()
+MEASUREMENT_BATCH_URL = os.getenv("CDS_MEASUREMENT_BATCH_URL")
+BATCH_SUPPORTED: dict[str, bool] = {}
+
+# The last stored story state and its version, by kernel context and then by
+#  (story, student); a session's entries are dropped when its kernel shuts down
+ACKNOWLEDGED_STORY_STATES: dict[str | None, dict[tuple, tuple[int, dict]]] = {}
+STATE_VERSION_HEADER = "X-State-Version"
+STORY_STATE_URL = os.getenv("CDS_STORY_STATE_URL")
+
+# App state fields that belong to the session rather than the stored state
+SESSION_APP_FIELDS = frozenset({"student", "classroom", "update_db", "show_team_interface"})
+
+# Whether each story state endpoint, by base URL, accepts patches
+PATCH_SUPPORTED: dict[str, bool] = {}
+
+SPECTRUM_PREFETCHER = CachePrefetcher(
+    SPECTRUM_CACHE,
+    max_workers=int(os.getenv("CDS_SPECTRUM_PREFETCH_WORKERS", "4")),
+    name="spectrum-prefetch",
+)
+
+# The galaxy catalog is the same for every student of a story
+GALAXY_CATALOG_CACHE = RevalidatingCache(
+    ttl=float(os.getenv("CDS_GALAXY_CATALOG_TTL", "600")), name="galaxy catalog"
+)
+
+# Class measurements are shared by every student of a class; the cache also
+#  merges concurrent requests from one classroom into a single fetch
+CLASS_MEASUREMENTS_CACHE = RevalidatingCache(
+    ttl=float(os.getenv("CDS_CLASS_MEASUREMENTS_TTL", "30")),
+    max_entries=int(os.getenv("CDS_CLASS_MEASUREMENTS_CACHE_ENTRIES", "256")),
+    name="class measurements",
+)
+
+# Every class's data other than the student's own, shared by all sessions
+# Incremental refreshes need an all-data endpoint that accepts `since`, which
+#  for now only the stand-in provides (see `hubbleds.stand_in`)
+ALL_DATA_SNAPSHOT = AllDataSnapshot(
+    ttl=float(os.getenv("CDS_ALL_DATA_TTL", "60")),
+    full_refresh=float(os.getenv("CDS_ALL_DATA_FULL_REFRESH", "3600")),
+    incremental=os.getenv("CDS_ALL_DATA_INCREMENTAL", "false").strip().lower() == "true",
+)
+ALL_DATA_URL = os.getenv("CDS_ALL_DATA_URL")
+INCREMENTAL_ALL_DATA_SUPPORTED: dict[str, bool] = {}
+
+
+def _parse_spectrum(gal_data: GalaxyData, content: bytes) -> SpectrumData | None:
+    with closing(BytesIO(content)) as f:
+        f.name = gal_data.name
+
+        with fits.open(f) as hdulist:
+            data = hdulist["COADD"].data if "COADD" in hdulist else None
+
+    if data is None:
+        logger.error("No extension named 'COADD' in spectrum file.")
+        return
+
+    logger.info("Loaded spectrum data for galaxy `%s` from database.", gal_data.id)
+
+    return SpectrumData(
+        name=gal_data.name,
+        # FITS columns are big-endian; convert them once, here
+        wave=asarray(10 ** data["loglam"], dtype=float),
+        flux=asarray(data["flux"], dtype=float),
+        ivar=asarray(data["ivar"], dtype=float),
+    )
+
+
+def _dirty_measurements(
+    measurements: list[StudentMeasurement], acknowledged: dict
+) -> dict[tuple, dict]:
+    dirty = {}
+    for measurement in measurements:
+        key = (measurement.galaxy_id, measurement.measurement_number)
+        payload = measurement.dict(exclude={"galaxy"})
+        if acknowledged.get(key) != payload:
+            dirty[key] = payload
+
+    MEASUREMENT_WRITE_STATS["avoided"] += len(measurements) - len(dirty)
+    return dirty
+
+
+def _acknowledge_measurements(
+    dirty: dict[tuple, dict],
+    stored: list[bool],
+    acknowledged: dict,
+    student_id: int,
+    endpoint: str,
+) -> bool:
+    for (key, payload), success in zip(dirty.items(), stored):
+        if success:
+            acknowledged[key] = payload
+        else:
+            logger.warning(
+                "Failed to store measurement for galaxy `%s` by student `%s`.",
+                key[0],
+                student_id,
+            )
+
+    logger.info(
+        "Stored %s of %s changed measurements for student `%s` (%s).",
+        sum(stored), len(dirty), student_id, endpoint,
+    )
+    logger.debug("Measurement write stats: %s", dict(MEASUREMENT_WRITE_STATS))
+
+    return all(stored)
+
+
+def _invalidate_class_measurements(
+    story_id: str, endpoint: str, global_state: Reactive[GlobalState]
+):
+    # The class view is stale once any of its students stores new measurements
+    class_info = global_state.value.classroom.class_info
+    if endpoint == "submit-measurement" and class_info is not None and "id" in class_info:
+        CLASS_MEASUREMENTS_CACHE.invalidate((story_id, class_info["id"]))
+
+
+def _story_state(
+    global_state: Reactive[GlobalState], local_state: Reactive[LocalState]
+) -> dict:
+    return {
+        "app": global_state.value.model_dump(),
+        "story": {
+            **local_state.value.as_dict(),
+            MC_SCORES.field: MC_SCORES.serialize(),
+            FREE_RESPONSES.field: FREE_RESPONSES.serialize(),
+        },
+    }
+
+
+def _session_id() -> str | None:
+    return (
+        kernel_context.get_current_context().id
+        if kernel_context.has_current_context()
+        else None
+    )
+
+
+def _session_story_states() -> dict[tuple, tuple[int, dict]]:
+    """
+    The acknowledged story states of the current session. The stored states
+    are those built by `_story_state`, which are not modified afterwards.
+    """
+    return ACKNOWLEDGED_STORY_STATES.setdefault(_session_id(), {})
+
+
+def _session_measurements(key: tuple) -> dict:
+    """
+    The acknowledged measurement payloads of the current session for a
+    (story, student, endpoint) key.
+    """
+    return ACKNOWLEDGED_MEASUREMENTS.setdefault(_session_id(), defaultdict(dict))[key]
+
+
+def _on_kernel_start():
+    context_id = kernel_context.get_current_context().id
+
+    def _on_kernel_shutdown():
+        # The session's last writes still read and update its acknowledged
+        #  payloads, so they run before those are dropped
+        from .write_behind import close_write_queue
+
+        close_write_queue(context_id)
+        ACKNOWLEDGED_STORY_STATES.pop(context_id, None)
+        ACKNOWLEDGED_MEASUREMENTS.pop(context_id, None)
+
+    return _on_kernel_shutdown
+
+
+solara.lab.on_kernel_start(_on_kernel_start)
+
+
+def _stage_state_json(component_state: Reactive[BaseState]) -> bytes:
+    return dump_model(
+        component_state.value,
+        exclude={"selected_galaxy", "selected_example_galaxy"},
+    )
+
 
 class LocalAPI(BaseAPI):
+    def get_galaxy_catalog(self, local_state: Reactive[LocalState]) -> GalaxyCatalog:
+        story_id = local_state.value.story_id
+
+        def _fetch(etag: str | None):
+            headers = {"If-None-Match": etag} if etag else {}
+            r = self.request_session.get(
+                f"{self.API_URL}/{story_id}/galaxies?types=Sp", headers=headers
+            )
+            if r.status_code == 304:
+                logger.debug("Galaxy catalog for `%s` not modified.", story_id)
+                return NOT_MODIFIED
+            r.raise_for_status()
+
+            galaxies = tuple(intern_galaxy(x) for x in loads(r.content))
+            catalog = GalaxyCatalog(
+                galaxies=galaxies,
+                by_id=MappingProxyType({galaxy.id: galaxy for galaxy in galaxies}),
+            )
+            logger.info("Loaded %s galaxies from database.", len(galaxies))
+            return catalog, r.headers.get("ETag")
+
+        return GALAXY_CATALOG_CACHE.get(story_id, _fetch)
+
     def get_galaxies(self, local_state: Reactive[LocalState]) -> list[GalaxyData]:
-        galaxy_data_json = self.request_session.get(
-            f"{self.API_URL}/{local_state.value.story_id}/galaxies?types=Sp"
-        ).json()
+        return list(self.get_galaxy_catalog(local_state).galaxies)
 
-        galaxy_data = [GalaxyData(**x) for x in galaxy_data_json]
+    def get_galaxy(
+        self, galaxy_id: int, local_state: Reactive[LocalState]
+    ) -> GalaxyData | None:
+        return self.get_galaxy_catalog(local_state).by_id.get(galaxy_id)
 
-        return galaxy_data
+    @staticmethod
+    def _spectrum_key(gal_data: GalaxyData, story_id: str) -> tuple[str, str, str]:
+        file_name = f"{gal_data.name.replace('.fits', '')}.fits"
+        return story_id, gal_data.type, file_name
 
     def load_spectrum_data(
         self, gal_data: GalaxyData, local_state: Reactive[LocalState]
     ) -> SpectrumData | None:
-        file_name = f"{gal_data.name.replace('.fits', '')}.fits"
-
-        type_folders = {"Sp": "spiral", "E": "elliptical", "Ir": "irregular"}
-        folder = type_folders[gal_data.type]
-        url = (
-            f"{self.API_URL}/{local_state.value.story_id}/spectra/{folder}/{file_name}"
-        )
-        response = self.request_session.get(url)
+        key = self._spectrum_key(gal_data, local_state.value.story_id)
 
-        with closing(BytesIO(response.content)) as f:
-            f.name = gal_data.name
+        # Don't download a spectrum a second time if it's already being prefetched
+        spec_data = SPECTRUM_PREFETCHER.wait(key)
+        if spec_data is None:
+            spec_data = SPECTRUM_CACHE.get_or_load(
+                key, lambda: self._fetch_spectrum_data(gal_data, *key)
+            )
 
-            with fits.open(f) as hdulist:
-                data = hdulist["COADD"].data if "COADD" in hdulist else None
+        logger.debug("Spectrum cache stats: %s", SPECTRUM_CACHE.stats)
 
-        if data is None:
-            logger.error("No extension named 'COADD' in spectrum file.")
-            return
-
-        spec_data = SpectrumData(
-            name=gal_data.name,
-            wave=10 ** data["loglam"],
-            flux=data["flux"],
-            ivar=data["ivar"],
-        )
+        return spec_data
 
-        logger.info("Loaded spectrum data for galaxy `%s` from database.", gal_data.id)
+    def prefetch_spectrum_data(
+        self, galaxies: list[GalaxyData], local_state: Reactive[LocalState]
+    ) -> list[tuple[str, str, str]]:
+        """
+        Start loading the spectra of `galaxies` into the shared cache in the
+        background. Returns the keys holding a pending prefetch, which can be
+        passed to `cancel_spectrum_prefetch`.
+        """
+        story_id = local_state.value.story_id
+        keys = []
+        for gal_data in galaxies:
+            key = self._spectrum_key(gal_data, story_id)
+            loader = lambda gal_data=gal_data, key=key: self._fetch_spectrum_data(gal_data, *key)
+            if SPECTRUM_PREFETCHER.submit(key, loader):
+                keys.append(key)
+
+        logger.info("Spectrum prefetch stats: %s", SPECTRUM_PREFETCHER.stats)
+
+        return keys
+
+    def cancel_spectrum_prefetch(self, keys: list[tuple[str, str, str]]):
+        SPECTRUM_PREFETCHER.cancel(keys)
+
+    def _spectrum_source(
+        self,
+        gal_data: GalaxyData,
+        story_id: str,
+        galaxy_type: str,
+        file_name: str,
+    ) -> SpectrumData | str:
+        """
+        The spectrum from the local store if it has it, or else the URL to
+        download it from. Shared by the sync and async clients.
+        """
+        folder = SPECTRUM_TYPE_FOLDERS[galaxy_type]
+
+        stored = SPECTRUM_STORE.get(folder, file_name)
+        if stored is not None:
+            logger.info("Loaded spectrum data for galaxy `%s` from store.", gal_data.id)
+            return SpectrumData(name=gal_data.name, **stored)
+
+        return f"{self.API_URL}/{story_id}/spectra/{folder}/{file_name}"
+
+    def _fetch_spectrum_data(
+        self,
+        gal_data: GalaxyData,
+        story_id: str,
+        galaxy_type: str,
+        file_name: str,
+    ) -> SpectrumData | None:
+        source = self._spectrum_source(gal_data, story_id, galaxy_type, file_name)
+        if isinstance(source, SpectrumData):
+            return source
 
-        return spec_data
+        response = self.request_session.get(source)
+        return _parse_spectrum(gal_data, response.content)
 
     def get_dummy_data(self) -> List[StudentMeasurement]:
         path = (Path(__file__).parent / "data" / "dummy_student_data.csv").as_posix()
@@ -92,28 +372,41 @@ class LocalAPI(BaseAPI):
     def get_measurements(
         self, global_state: Reactive[GlobalState], local_state: Reactive[LocalState]
     ) -> list[StudentMeasurement]:
-        url = (
-            f"{self.API_URL}/{local_state.value.story_id}/measurements/"
-            f"{global_state.value.student.id}"
-        )
         if not global_state.value.update_db or self.is_educator:
             Ref(local_state.fields.measurements_loaded).set(True)
             logger.info("Skipping retrieval of measurements from database.")
             return []
-        
-        r = self.request_session.get(url)
-            
-        measurements = Ref(local_state.fields.measurements)
-        if r.status_code == 200:
-            measurement_json = r.json()
 
-            parsed_measurements = []
+        parsed_measurements = self._fetch_measurements(
+            local_state.value.story_id, global_state.value.student.id
+        )
+
+        return self._set_measurements(parsed_measurements, global_state, local_state)
+
+    def _fetch_measurements(
+        self, story_id: str, student_id: int
+    ) -> list[StudentMeasurement] | None:
+        r = self.request_session.get(self._measurements_url(story_id, student_id))
+        if r.status_code != 200:
+            return None
+
+        return parse_measurements(r.content)
 
-            for measurement in measurement_json["measurements"]:
-                measurement = StudentMeasurement(**measurement)
-                parsed_measurements.append(measurement)
+    def _measurements_url(self, story_id: str, student_id: int) -> str:
+        return f"{self.API_URL}/{story_id}/measurements/{student_id}"
 
+    def _set_measurements(
+        self,
+        parsed_measurements: list[StudentMeasurement] | None,
+        global_state: Reactive[GlobalState],
+        local_state: Reactive[LocalState],
+    ) -> list[StudentMeasurement]:
+        measurements = Ref(local_state.fields.measurements)
+        if parsed_measurements is not None:
             measurements.set(parsed_measurements)
+            self._mark_measurements_stored(
+                parsed_measurements, "submit-measurement", global_state, local_state
+            )
 
         Ref(local_state.fields.measurements_loaded).set(True)
 
@@ -124,58 +417,207 @@ class LocalAPI(BaseAPI):
     def get_sample_measurements(
         self, global_state: Reactive[GlobalState], local_state: Reactive[LocalState]
     ) -> list[StudentMeasurement]:
-        
-        if not global_state.value.update_db or self.is_educator:
-            sample_measurement_json = {"measurements": []}
-        else:
+        sample_measurements, stored_count = self._fetch_sample_measurements(
+            local_state.value.story_id,
+            global_state.value.student.id,
+            global_state.value.update_db and not self.is_educator,
+        )
+
+        return self._set_sample_measurements(
+            sample_measurements, stored_count, global_state, local_state
+        )
+
+    def _fetch_sample_measurements(
+        self, story_id: str, student_id: int, from_db: bool
+    ) -> tuple[list[StudentMeasurement], int]:
+        """
+        Return the student's two example measurements, creating any that are
+        missing, along with the number of them that came from the database.
+        """
+        if from_db:
             r = self.request_session.get(
-                f"{self.API_URL}/{local_state.value.story_id}/sample-"
-                f"measurements/{global_state.value.student.id}"
+                f"{self.API_URL}/{story_id}/sample-measurements/{student_id}"
             )
+            sample_measurements = parse_measurements(r.content)
+        else:
+            sample_measurements = []
 
-            sample_measurement_json = r.json()
+        # Only the measurements that came from the database count as stored
+        stored_count = len(sample_measurements)
 
-        if len(sample_measurement_json["measurements"]) == 0:
+        if stored_count < 2:
             logger.info(
-                "Failed to find sample galaxies for user `%s`: creating new "
-                "sample measurement.",
-                global_state.value.student.id,
+                "Found %s of 2 example measurements for user `%s`: creating the "
+                "missing ones.",
+                stored_count,
+                student_id,
             )
-            sample_gal_data = LOCAL_API.get_sample_galaxy(local_state)
-            for meas in ['first', 'second']:
-                sample_measurement_json["measurements"].append(
+            sample_gal_data = self._fetch_sample_galaxy(story_id)
+            for meas in ["first", "second"][stored_count:]:
+                sample_measurements.append(
                     StudentMeasurement(
-                        student_id=global_state.value.student.id,
+                        student_id=student_id,
                         galaxy=sample_gal_data,
                         measurement_number=meas
-                    ).dict()
+                    )
                 )
-        elif len(sample_measurement_json["measurements"]) == 1:
-            logger.info(
-                "Example measurements only had the first. Creating missing second measurement"
-            )
-            sample_gal_data = LOCAL_API.get_sample_galaxy(local_state)
-            sample_measurement_json["measurements"].append(
-                StudentMeasurement(
-                    student_id=global_state.value.student.id,
-                    galaxy=sample_gal_data,
-                    measurement_number='second'
-                ).dict()
-            )
 
-        sample_measurements = Ref(local_state.fields.example_measurements)
-        parsed_sample_measurements = []
+        return sample_measurements, stored_count
 
-        for measurement in sample_measurement_json["measurements"]:
-            measurement = StudentMeasurement(**measurement)
-            parsed_sample_measurements.append(measurement)
+    def _set_sample_measurements(
+        self,
+        parsed_sample_measurements: list[StudentMeasurement],
+        stored_count: int,
+        global_state: Reactive[GlobalState],
+        local_state: Reactive[LocalState],
+    ) -> list[StudentMeasurement]:
+        sample_measurements = Ref(local_state.fields.example_measurements)
 
         sample_measurements.set(parsed_sample_measurements)
+        self._mark_measurements_stored(
+            parsed_sample_measurements[:stored_count],
+            "sample-measurement",
+            global_state,
+            local_state,
+        )
 
         logger.info("Loaded example measurements from database.")
 
         return sample_measurements.value
 
+    def load_session_states(
+        self, global_state: Reactive[GlobalState], local_state: Reactive[LocalState]
+    ):
+        """
+        Load the student's app and story states, measurements and example
+        measurements. The measurement requests run in worker threads while
+        the story states load; the reactive states are only updated from the
+        calling thread, in the same order as loading them one by one.
+        """
+        story_id = local_state.value.story_id
+        student_id = global_state.value.student.id
+        from_db = global_state.value.update_db and not self.is_educator
+
+        def _timed(phase, func, *args):
+            start = perf_counter()
+            try:
+                return func(*args)
+            finally:
+                logger.info(
+                    "Bootstrap phase `%s` took %.0f ms.",
+                    phase,
+                    1000 * (perf_counter() - start),
+                )
+
+        start = perf_counter()
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="bootstrap") as pool:
+            measurements_future = (
+                pool.submit(_timed, "measurements", self._fetch_measurements, story_id, student_id)
+                if from_db
+                else None
+            )
+            sample_measurements_future = pool.submit(
+                _timed,
+                "sample measurements",
+                self._fetch_sample_measurements,
+                story_id,
+                student_id,
+                from_db,
+            )
+
+            _timed("story states", self.get_app_story_states, global_state, local_state)
+            MC_SCORES.load_from(local_state)
+            FREE_RESPONSES.load_from(local_state)
+
+            # Single join point for the concurrent requests
+            parsed_measurements = (
+                measurements_future.result() if measurements_future is not None else None
+            )
+            sample_measurements, stored_count = sample_measurements_future.result()
+
+        if from_db:
+            self._set_measurements(parsed_measurements, global_state, local_state)
+        else:
+            logger.info("Skipping retrieval of measurements from database.")
+            Ref(local_state.fields.measurements_loaded).set(True)
+
+        self._set_sample_measurements(
+            sample_measurements, stored_count, global_state, local_state
+        )
+
+        logger.info(
+            "Loaded session states in %.0f ms.", 1000 * (perf_counter() - start)
+        )
+
+    def _submit_measurements(
+        self,
+        measurements: list[StudentMeasurement],
+        endpoint: str,
+        global_state: Reactive[GlobalState],
+        local_state: Reactive[LocalState],
+    ) -> bool:
+        """
+        Send only the measurements that changed since they were last stored,
+        as a single batch when the server supports it.
+        """
+        story_id = local_state.value.story_id
+        student_id = global_state.value.student.id
+        acknowledged = _session_measurements((story_id, student_id, endpoint))
+
+        dirty = _dirty_measurements(measurements, acknowledged)
+        if not dirty:
+            logger.debug("No changed measurements to store for student `%s`.", student_id)
+            return True
+
+        stored = self._put_measurement_batch(story_id, endpoint, list(dirty.values()))
+        _invalidate_class_measurements(story_id, endpoint, global_state)
+
+        return _acknowledge_measurements(dirty, stored, acknowledged, student_id, endpoint)
+
+    def _put_measurement_batch(
+        self, story_id: str, endpoint: str, payloads: list[dict]
+    ) -> list[bool]:
+        batch_url = f"{MEASUREMENT_BATCH_URL or self.API_URL}/{story_id}/{endpoint}/batch"
+        if len(payloads) > 1 and BATCH_SUPPORTED.get(batch_url, True):
+            r = self.request_session.put(batch_url, json={"measurements": payloads})
+            if r.status_code == 200:
+                MEASUREMENT_WRITE_STATS["batches"] += 1
+                MEASUREMENT_WRITE_STATS["sent"] += len(payloads)
+                return [True] * len(payloads)
+
+            if r.status_code in (404, 405, 501):
+                logger.info("Batch measurement endpoint unavailable; using single writes.")
+                BATCH_SUPPORTED[batch_url] = False
+            else:
+                logger.error("Failed to store measurement batch.")
+                logger.error(r.text)
+                return [False] * len(payloads)
+
+        url = f"{self.API_URL}/{story_id}/{endpoint}/"
+        stored = []
+        for payload in payloads:
+            r = self.request_session.put(url, json=payload)
+            stored.append(r.status_code == 200)
+            MEASUREMENT_WRITE_STATS["sent"] += 1
+
+        return stored
+
+    def _mark_measurements_stored(
+        self,
+        measurements: list[StudentMeasurement],
+        endpoint: str,
+        global_state: Reactive[GlobalState],
+        local_state: Reactive[LocalState],
+    ):
+        # Measurements just read from the database don't need to be written back
+        acknowledged = _session_measurements(
+            (local_state.value.story_id, global_state.value.student.id, endpoint)
+        )
+        acknowledged.clear()
+        for measurement in measurements:
+            key = (measurement.galaxy_id, measurement.measurement_number)
+            acknowledged[key] = measurement.dict(exclude={"galaxy"})
+
     def put_measurements(
         self, global_state: Reactive[GlobalState], local_state: Reactive[LocalState]
     ):  
@@ -183,24 +625,13 @@ class LocalAPI(BaseAPI):
         if not GLOBAL_STATE.value.update_db or self.is_educator: 
             logger.info('Skipping DB write')
             return False
-        
-        url = f"{self.API_URL}/{local_state.value.story_id}/submit-measurement/"
-
-        for measurement in local_state.value.measurements:
-            r = self.request_session.put(url, json=measurement.dict(exclude={"galaxy"}))
-
-            if r.status_code != 200:
-                logger.warning(
-                    f"Failed to add measurement for galaxy `%s` by student `%s`.",
-                    global_state.value.student.id,
-                    measurement.galaxy_id,
-                )
 
-        logger.info(
-            "Stored measurements for student `%s`.",
-            global_state.value.student.id,
+        return self._submit_measurements(
+            local_state.value.measurements,
+            "submit-measurement",
+            global_state,
+            local_state,
         )
-        return True
 
     def put_sample_measurements(
         self, global_state: Reactive[GlobalState], local_state: Reactive[LocalState]
@@ -208,31 +639,13 @@ class LocalAPI(BaseAPI):
         if not GLOBAL_STATE.value.update_db or self.is_educator: 
             logger.info('Skipping DB write')
             return False
-        
-        url = f"{self.API_URL}/{local_state.value.story_id}/sample-measurement/"
-    
-        for i, measurement in enumerate(local_state.value.example_measurements):
-            if i == 0:
-                logger.info(
-                    f"Adding example measurement for galaxy `%s` by student `%s`.",
-                    measurement.galaxy_id,
-                    global_state.value.student.id,
-                )
-
-            r = self.request_session.put(url, json=measurement.dict(exclude={"galaxy"}))
-
-            if r.status_code != 200:
-                logger.warning(
-                    f"Failed to add example measurement for galaxy `%s` by student `%s`.",
-                    measurement.galaxy_id,
-                    global_state.value.student.id,
-                )
 
-            logger.info(
-                "Stored example measurements for student %s.",
-                global_state.value.student.id,
-            )
-        return True
+        return self._submit_measurements(
+            local_state.value.example_measurements,
+            "sample-measurement",
+            global_state,
+            local_state,
+        )
 
     def get_measurement(
         self,
@@ -305,11 +718,14 @@ class LocalAPI(BaseAPI):
                 logger.error(r.text)
 
     def get_sample_galaxy(self, local_state: Reactive[LocalState]) -> GalaxyData:
+        return self._fetch_sample_galaxy(local_state.value.story_id)
+
+    def _fetch_sample_galaxy(self, story_id: str) -> GalaxyData:
         galaxy_json = self.request_session.get(
-            f"{self.API_URL}/{local_state.value.story_id}/sample-galaxy"
+            f"{self.API_URL}/{story_id}/sample-galaxy"
         ).json()
 
-        galaxy_data = GalaxyData(**galaxy_json)
+        galaxy_data = intern_galaxy(galaxy_json)
 
         return galaxy_data
 
@@ -318,24 +734,31 @@ class LocalAPI(BaseAPI):
         global_state: Reactive[GlobalState],
         local_state: Reactive[LocalState],
     ) -> list[StudentMeasurement]:
-        url = (
-            f"{self.API_URL}/{local_state.value.story_id}/class-measurements/"
-            f"{global_state.value.student.id}/{global_state.value.classroom.class_info['id']}"
-            f"?complete_only=true"
-        )
-        r = self.request_session.get(url)
-        measurement_json = r.json()
-
-        measurements = Ref(local_state.fields.class_measurements)
-        parsed_measurements = []
-
-        for measurement in measurement_json["measurements"]:
-            measurement = StudentMeasurement(**measurement)
-            parsed_measurements.append(measurement)
+        story_id = local_state.value.story_id
+        student_id = global_state.value.student.id
+        class_id = global_state.value.classroom.class_info['id']
+
+        def _fetch(_):
+            url = (
+                f"{self.API_URL}/{story_id}/class-measurements/"
+                f"{student_id}/{class_id}?complete_only=true"
+            )
+            r = self.request_session.get(url)
+            r.raise_for_status()
+            # The cached models are shared between sessions and must not be
+            #  changed, so they are given their class here
+            parsed_measurements = tuple(
+                m if m.class_id == class_id else m.model_copy(update={"class_id": class_id})
+                for m in parse_measurements(r.content)
+            )
+            logger.info("Loaded class measurements from database.")
+            return parsed_measurements, None
 
-        measurements.set(parsed_measurements)
+        class_measurements = CLASS_MEASUREMENTS_CACHE.get((story_id, class_id), _fetch)
+        logger.debug("Class measurement cache stats: %s", CLASS_MEASUREMENTS_CACHE.stats)
 
-        logger.info("Loaded class measurements from database.")
+        measurements = Ref(local_state.fields.class_measurements)
+        measurements.set(list(class_measurements))
 
         return measurements.value
 
@@ -347,54 +770,149 @@ class LocalAPI(BaseAPI):
         if global_state.value.classroom.class_info is None or 'id' not in global_state.value.classroom.class_info:
             logger.warning("No class id found in classroom info.")
             return 0
-        url = (
-            f"{self.API_URL}/{local_state.value.story_id}/class-measurements/students-completed/"
-            f"{global_state.value.student.id}/{global_state.value.classroom.class_info['id']}"
+        return self._fetch_students_completed_count(
+            local_state.value.story_id,
+            global_state.value.student.id,
+            global_state.value.classroom.class_info['id'],
+        )
+
+    def _fetch_students_completed_count(
+        self, story_id: str, student_id: int, class_id: int
+    ) -> int:
+        r = self.request_session.get(
+            self._students_completed_url(story_id, student_id, class_id)
         )
-        r = self.request_session.get(url)
         # TODO: Handle non-200 status codes
-        return r.json()["students_completed_measurements"]
+        return loads(r.content)["students_completed_measurements"]
+
+    def _students_completed_url(self, story_id: str, student_id: int, class_id: int) -> str:
+        return (
+            f"{self.API_URL}/{story_id}/class-measurements/students-completed/"
+            f"{student_id}/{class_id}"
+        )
+
+    def subscribe_students_completed_count(
+        self,
+        global_state: Reactive[GlobalState],
+        local_state: Reactive[LocalState],
+        callback: Callable[[int], None],
+    ) -> Callable[[], None]:
+        """
+        Call `callback` with the number of students in the class who have
+        completed their measurements, now and whenever it changes. The count
+        is polled once per class on this worker, however many students are
+        waiting on it. Returns a function that ends the subscription.
+        """
+        class_info = global_state.value.classroom.class_info
+        if class_info is None or 'id' not in class_info:
+            logger.warning("No class id found in classroom info.")
+            callback(0)
+            return lambda: None
+
+        story_id = local_state.value.story_id
+        student_id = global_state.value.student.id
+        class_id = class_info['id']
+
+        return CLASS_PROGRESS_POLLER.subscribe(
+            (story_id, class_id),
+            lambda: self._fetch_students_completed_count(story_id, student_id, class_id),
+            callback,
+        )
 
     def get_all_data(
         self,
         global_state: Reactive[GlobalState],
         local_state: Reactive[LocalState],
-    ) -> tuple[list[StudentMeasurement], list[StudentSummary], list[ClassSummary]]:
-        url = f"{self.API_URL}/{local_state.value.story_id}/all-data?minimal=True"
-        if global_state.value.classroom.class_info is not None:
-            url += f"&class_id={global_state.value.classroom.class_info['id']}"
-        r = self.request_session.get(url)
-        res_json = r.json()
-
-        measurements = Ref(local_state.fields.all_measurements)
-        parsed_measurements = []
-        for measurement in res_json["measurements"]:
-            if measurement["class_id"] is None:
-                continue
-            measurement = StudentMeasurement(**measurement)
-            parsed_measurements.append(measurement)
-
-        measurements.set(parsed_measurements)
+    ) -> tuple[MeasurementTable, list[StudentSummary], list[ClassSummary]]:
+        """
+        Load the measurements and summaries of every class but the
+        student's own. The measurements are returned as a table.
+        """
+        story_id = local_state.value.story_id
+        class_info = global_state.value.classroom.class_info
+        class_id = class_info['id'] if class_info is not None else None
+
+        all_data = ALL_DATA_SNAPSHOT.get(
+            story_id, class_id, lambda since: self._fetch_all_data(story_id, since)
+        )
 
-        student_summaries = Ref(local_state.fields.student_summaries)
-        parsed_student_summaries = []
-        for summary in res_json["studentData"]:
-            summary = StudentSummary(**summary)
-            parsed_student_summaries.append(summary)
+        return self._set_all_data(all_data, local_state)
 
-        student_summaries.set(parsed_student_summaries)
+    def _set_all_data(
+        self, all_data, local_state: Reactive[LocalState]
+    ) -> tuple[MeasurementTable, list[StudentSummary], list[ClassSummary]]:
+        all_measurements, all_student_summaries, all_class_summaries = all_data
 
-        class_summaries = Ref(local_state.fields.class_summaries)
-        parsed_class_summaries = []
-        for summary in res_json["classData"]:
-            summary = ClassSummary(**summary)
-            parsed_class_summaries.append(summary)
+        student_summaries = Ref(local_state.fields.student_summaries)
+        student_summaries.set(list(all_student_summaries))
 
-        class_summaries.set(parsed_class_summaries)
+        class_summaries = Ref(local_state.fields.class_summaries)
+        class_summaries.set(list(all_class_summaries))
 
         logger.info("Loaded all measurements and summary data from database.")
 
-        return measurements.value, student_summaries.value, class_summaries.value
+        return all_measurements, student_summaries.value, class_summaries.value
+
+    def _fetch_all_data(self, story_id: str, since: datetime | None) -> AllDataPayload:
+        base_url = ALL_DATA_URL or self.API_URL
+        url = f"{base_url}/{story_id}/all-data?minimal=True"
+
+        if since is not None and INCREMENTAL_ALL_DATA_SUPPORTED.get(base_url, True):
+            with closing(
+                self.request_session.get(url, params={"since": since.isoformat()}, stream=True)
+            ) as r:
+                if r.status_code == 200:
+                    r.raw.decode_content = True
+                    return parse_all_data(r.raw)
+
+                if r.status_code in (400, 404, 405, 501):
+                    logger.info("Incremental all-data endpoint unavailable; using full refreshes.")
+                    INCREMENTAL_ALL_DATA_SUPPORTED[base_url] = False
+                else:
+                    logger.error("Failed to refresh all data incrementally.")
+                    logger.error(r.text)
+
+        with closing(self.request_session.get(url, stream=True)) as r:
+            r.raise_for_status()
+            r.raw.decode_content = True
+            # Even if the server echoes a watermark, this is the whole dataset
+            return parse_all_data(r.raw)._replace(since=None)
+
+    def get_stage_state(
+        self,
+        global_state: Reactive[GlobalState],
+        local_state: Reactive[LocalState],
+        component_state: Reactive[BaseState],
+    ) -> BaseState | None:
+        r = self.request_session.get(
+            self._stage_state_url(global_state, local_state, component_state)
+        )
+        return self._set_stage_state(r, component_state)
+
+    def _stage_state_url(
+        self,
+        global_state: Reactive[GlobalState],
+        local_state: Reactive[LocalState],
+        component_state: Reactive[BaseState],
+    ) -> str:
+        return (
+            f"{self.API_URL}/stage-state/{global_state.value.student.id}/"
+            f"{local_state.value.story_id}/{component_state.value.stage_id}"
+        )
+
+    def _set_stage_state(self, r, component_state: Reactive[BaseState]) -> BaseState | None:
+        stage_json = loads(r.content).get("state") if r.status_code == 200 else None
+
+        if stage_json is None:
+            logger.warning(
+                "No stored state for stage `%s`.", component_state.value.stage_id
+            )
+            return None
+
+        component_state.set(type(component_state.value).model_validate(stage_json))
+        logger.info("Updated stage state from database.")
+
+        return component_state.value
 
     def put_stage_state(
         self,
@@ -408,17 +926,10 @@ class LocalAPI(BaseAPI):
         
         logger.info("Serializing stage state into DB.")
 
-        comp_state_dict = component_state.value.dict(
-            exclude={"selected_galaxy", "selected_example_galaxy"}
-        )
-        comp_state_dict.update(
-            {"current_step": component_state.value.current_step.value}
-        )
-
         r = self.request_session.put(
-            f"{self.API_URL}/stage-state/{global_state.value.student.id}/"
-            f"{local_state.value.story_id}/{component_state.value.stage_id}",
-            json=comp_state_dict,
+            self._stage_state_url(global_state, local_state, component_state),
+            headers={"Content-Type": "application/json"},
+            data=_stage_state_json(component_state),
         )
 
         if r.status_code != 200:
@@ -428,6 +939,62 @@ class LocalAPI(BaseAPI):
         
         return True
 
+    def get_app_story_states(
+        self,
+        global_state: Reactive[GlobalState],
+        local_state: Reactive[LocalState],
+    ) -> LocalState | None:
+        """
+        Load the student's stored app and story states. The fields of the app
+        state that describe the session, such as the student and classroom,
+        are kept as they are.
+        """
+        r = self.request_session.get(self._story_state_url(global_state, local_state))
+        return self._set_app_story_states(r, global_state, local_state)
+
+    def _story_state_url(
+        self, global_state: Reactive[GlobalState], local_state: Reactive[LocalState]
+    ) -> str:
+        return (
+            f"{STORY_STATE_URL or self.API_URL}/story-state/"
+            f"{global_state.value.student.id}/{local_state.value.story_id}"
+        )
+
+    def _set_app_story_states(
+        self,
+        r,
+        global_state: Reactive[GlobalState],
+        local_state: Reactive[LocalState],
+    ) -> LocalState | None:
+        story_json = loads(r.content).get("state") if r.status_code == 200 else None
+
+        if story_json is None:
+            logger.warning(
+                "No stored state for story `%s` of student `%s`.",
+                local_state.value.story_id,
+                global_state.value.student.id,
+            )
+            return None
+
+        app_json = {
+            key: value
+            for key, value in story_json.get("app", {}).items()
+            if key not in SESSION_APP_FIELDS
+        }
+        if app_json:
+            global_state.set(
+                type(global_state.value).model_validate(
+                    {**global_state.value.model_dump(), **app_json}
+                )
+            )
+
+        local_state.set(
+            type(local_state.value).model_validate(story_json.get("story", {}))
+        )
+        logger.info("Updated app and story states from database.")
+
+        return local_state.value
+
     def put_story_state(
         self,
         global_state: Reactive[GlobalState],
@@ -437,17 +1004,36 @@ class LocalAPI(BaseAPI):
             logger.info('Skipping DB write')
             return False
         
-        logger.info("Serializing state into DB.")
+        state = _story_state(global_state, local_state)
+
+        student_id = global_state.value.student.id
+        story_id = local_state.value.story_id
+        session_key = (story_id, student_id)
+        acknowledged_states = _session_story_states()
+        acknowledged = acknowledged_states.get(session_key)
+
+        if acknowledged is not None:
+            version, previous = acknowledged
+            patch = make_patch(previous, state)
+            if not patch:
+                logger.debug("Story state unchanged; skipping DB write.")
+                return True
+
+            result = self._patch_story_state(student_id, story_id, version, patch)
+            if result is not None:
+                acknowledged_states[session_key] = (result, state)
+                return True
 
-        state = {
-            "app": global_state.value.model_dump(),
-            "story": local_state.value.as_dict(),
-        }
+        logger.info("Serializing state into DB.")
 
-        state_json = json.dumps(state, cls=CDSJSONEncoder)
+        version = (acknowledged[0] if acknowledged is not None else 0) + 1
+        state_json = dumps(state)
         r = self.request_session.put(
-            f"{self.API_URL}/story-state/{global_state.value.student.id}/{local_state.value.story_id}",
-            headers={"Content-Type": "application/json"},
+            f"{STORY_STATE_URL or self.API_URL}/story-state/{student_id}/{story_id}",
+            headers={
+                "Content-Type": "application/json",
+                STATE_VERSION_HEADER: str(version),
+            },
             data=state_json,
         )
 
@@ -455,9 +1041,49 @@ class LocalAPI(BaseAPI):
             logger.error("Failed to write story state to database.")
             logger.error(r.text)
             return False
+
+        acknowledged_states[session_key] = (version, state)
         
         return True
-    
+
+    def _patch_story_state(
+        self, student_id: int, story_id: str, version: int, patch: list[dict]
+    ) -> int | None:
+        """
+        Send the changes to the story state since the last acknowledged write.
+        Returns the new state version, or `None` if a full write is needed.
+        """
+        endpoint = f"{STORY_STATE_URL or self.API_URL}/story-state"
+        if not PATCH_SUPPORTED.get(endpoint, True):
+            return None
+
+        # The body is a bare RFC 6902 patch, so the versions go in headers:
+        #  the version patched (as an entity tag) and the version it creates
+        r = self.request_session.patch(
+            f"{endpoint}/{student_id}/{story_id}",
+            headers={
+                "Content-Type": "application/json-patch+json",
+                "If-Match": f'"{version}"',
+                STATE_VERSION_HEADER: str(version + 1),
+            },
+            data=dumps(patch),
+        )
+
+        if r.status_code == 200:
+            logger.info("Patched %s paths of story state.", len(patch))
+            return version + 1
+
+        if r.status_code in (404, 405, 501):
+            logger.info("Story state patch endpoint unavailable; using full writes.")
+            PATCH_SUPPORTED[endpoint] = False
+        elif r.status_code in (409, 412):
+            logger.info("Story state version mismatch; falling back to a full write.")
+        else:
+            logger.error("Failed to patch story state.")
+            logger.error(r.text)
+
+        return None
+
     import json
 
     def get_example_seed_measurement(
@@ -0,0 +1,59 @@
+"""
+Fast JSON encoding and decoding of story and stage states.
+
+States are encoded straight to bytes, either by pydantic's compiled model
+serializer or by `orjson`, both of which handle datetimes natively; `orjson`
+also encodes NumPy arrays and scalars without converting them to Python
+objects first. Anything else is passed to `CDSJSONEncoder`, so the output
+matches what `json.dumps(..., cls=CDSJSONEncoder)` produced, with one
+exception: NaN and infinite floats, including those in NumPy arrays, are
+encoded as `null`. `json.dumps` wrote them as the `NaN` and `Infinity`
+literals, which aren't valid JSON and are rejected by standard JSON parsers.
+A value that was NaN in a stored state is therefore read back as `None`.
+"""
+
+from typing import Any, Optional
+
+import orjson
+from pydantic import BaseModel
+
+from cosmicds.utils import CDSJSONEncoder
+
+_ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+_FALLBACK_ENCODER = CDSJSONEncoder()
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    # Raises `TypeError` for unsupported types, as `orjson` expects
+    return _FALLBACK_ENCODER.default(obj)
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Encode a state dictionary (or any JSON-compatible value) as UTF-8 bytes.
+    NaN and infinite floats are encoded as `null`.
+    """
+    return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+
+
+def dump_model(model: BaseModel, exclude: Optional[set[str]] = None) -> bytes:
+    """
+    Encode a model as UTF-8 bytes without building an intermediate
+    dictionary. Enums are encoded as their values, and NaN and infinite
+    floats as `null`, as by `dumps`.
+    """
+    return type(model).__pydantic_serializer__.to_json(
+        model, exclude=exclude, fallback=_default
+    )
+
+
+def loads(content: bytes | str) -> Any:
+    """
+    Decode a JSON response body.
+    """
+    return orjson.loads(content)
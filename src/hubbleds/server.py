@@ -10,6 +10,7 @@ import solara.server.starlette
 
 # Check if we need to run in demo mode
 force_demo = os.getenv("CDS_FORCE_DEMO", "false").strip().lower() == "true"
+use_stand_in = os.getenv("CDS_API_STAND_IN", "false").strip().lower() == "true"
 
 
 def root(request: Request):
@@ -26,5 +27,10 @@ else:
         Mount("/hubbles-law/", routes=solara.server.starlette.routes),
     ]
 
+if use_stand_in:
+    from hubbleds.stand_in import STAND_IN_PATH, app as stand_in_app
+
+    routes.insert(0, Mount(STAND_IN_PATH, app=stand_in_app))
+
 
 app = Starlette(routes=routes, middleware=solara.server.starlette.middleware)
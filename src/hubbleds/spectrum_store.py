@@ -0,0 +1,187 @@
+"""
+A pre-converted, memory-mapped store of the galaxy spectra.
+
+The COADD extension of every spectrum FITS file is converted once, offline,
+into a single float32 file holding three contiguous columns (wave, flux and
+ivar), plus a JSON index mapping `<folder>/<file name>` to the offset and
+length of that spectrum within the columns. At runtime the columns are opened
+with `numpy.memmap`, so reading a spectrum is a page-cache read and every
+worker process shares the same physical pages.
+
+To build the store from a directory laid out like the API's `spectra` route
+(`spiral/`, `elliptical/` and `irregular/` subfolders of FITS files)::
+
+    $ python -m hubbleds.spectrum_store <source directory> <store directory>
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+from threading import Lock
+
+from numpy import concatenate, float32, memmap, ndarray
+
+from cosmicds.logger import setup_logger
+
+from .data_management import SPECTRUM_EXTENSION, SPECTRUM_TYPE_FOLDERS
+
+logger = setup_logger("SPECTRUM-STORE")
+
+COLUMNS = ("wave", "flux", "ivar")
+COLUMNS_FILE_NAME = "spectra.f32"
+INDEX_FILE_NAME = "spectra_index.json"
+
+DEFAULT_STORE_PATH = Path(
+    os.getenv("CDS_SPECTRUM_STORE", Path(__file__).parent / "data" / "spectra")
+)
+
+
+def store_key(folder: str, file_name: str) -> str:
+    return f"{folder}/{file_name}"
+
+
+def build_spectrum_store(source: Path | str, destination: Path | str) -> int:
+    """
+    Convert the COADD spectra found under `source` into a memory-mappable
+    store in `destination`.
+
+    Parameters
+    ----------
+    source: Path or str
+        A directory containing one subfolder of FITS files per galaxy type
+    destination: Path or str
+        The directory to write the column and index files into
+
+    Returns
+    ----------
+    count: int
+        The number of spectra written to the store
+    """
+    from astropy.io import fits
+
+    source = Path(source)
+    destination = Path(destination)
+    destination.mkdir(parents=True, exist_ok=True)
+
+    columns: dict[str, list[ndarray]] = {column: [] for column in COLUMNS}
+    index: dict[str, list[int]] = {}
+    offset = 0
+
+    for folder in SPECTRUM_TYPE_FOLDERS.values():
+        for path in sorted((source / folder).glob(f"*{SPECTRUM_EXTENSION}")):
+            with fits.open(path) as hdulist:
+                if "COADD" not in hdulist:
+                    logger.warning("No extension named 'COADD' in `%s`.", path)
+                    continue
+                data = hdulist["COADD"].data
+                wave = (10 ** data["loglam"]).astype(float32)
+                flux = data["flux"].astype(float32)
+                ivar = data["ivar"].astype(float32)
+
+            length = len(wave)
+            columns["wave"].append(wave)
+            columns["flux"].append(flux)
+            columns["ivar"].append(ivar)
+            index[store_key(folder, path.name)] = [offset, length]
+            offset += length
+
+    with open(destination / COLUMNS_FILE_NAME, "wb") as f:
+        for column in COLUMNS:
+            if columns[column]:
+                concatenate(columns[column]).tofile(f)
+
+    with open(destination / INDEX_FILE_NAME, "w") as f:
+        json.dump({"length": offset, "spectra": index}, f)
+
+    logger.info("Wrote %s spectra (%s samples) to `%s`.", len(index), offset, destination)
+
+    return len(index)
+
+
+class SpectrumStore:
+    """
+    Read-only access to a store written by `build_spectrum_store`. The
+    column file is only mapped on first use, and a missing store simply
+    reports every spectrum as absent.
+    """
+
+    def __init__(self, path: Path | str = DEFAULT_STORE_PATH):
+        self.path = Path(path)
+        self._lock = Lock()
+        self._loaded = False
+        self._index: dict[str, list[int]] = {}
+        self._columns: memmap | None = None
+
+    @property
+    def available(self) -> bool:
+        self._load()
+        return self._columns is not None
+
+    def _load(self):
+        if self._loaded:
+            return
+
+        with self._lock:
+            if self._loaded:
+                return
+
+            index_path = self.path / INDEX_FILE_NAME
+            columns_path = self.path / COLUMNS_FILE_NAME
+            if index_path.exists() and columns_path.exists():
+                with open(index_path) as f:
+                    index_json = json.load(f)
+                length = index_json["length"]
+                self._index = index_json["spectra"]
+                if length > 0:
+                    self._columns = memmap(
+                        columns_path,
+                        dtype=float32,
+                        mode="r",
+                        shape=(len(COLUMNS), length),
+                    )
+                logger.info("Opened spectrum store at `%s`.", self.path)
+
+            self._loaded = True
+
+    def __contains__(self, key: str) -> bool:
+        self._load()
+        return key in self._index
+
+    def get(self, folder: str, file_name: str) -> dict[str, ndarray] | None:
+        """
+        Return memory-mapped views of the wave, flux and ivar columns for
+        a spectrum, or `None` if it is not in the store.
+        """
+        self._load()
+        entry = self._index.get(store_key(folder, file_name))
+        if entry is None or self._columns is None:
+            return None
+
+        offset, length = entry
+        return {
+            column: self._columns[i, offset:offset + length]
+            for i, column in enumerate(COLUMNS)
+        }
+
+
+SPECTRUM_STORE = SpectrumStore()
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Convert COADD spectrum FITS files into a memory-mapped store."
+    )
+    parser.add_argument("source", help="directory with one subfolder per galaxy type")
+    parser.add_argument(
+        "destination",
+        nargs="?",
+        default=DEFAULT_STORE_PATH,
+        help="directory to write the store into",
+    )
+    parsed = parser.parse_args(args)
+    build_spectrum_store(parsed.source, parsed.destination)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+An in-memory stand-in for CosmicDS API endpoints that the client can use
+but that the production server does not provide yet. It is meant for local
+testing only: nothing written here reaches the database.
+
+Enable it by setting `CDS_API_STAND_IN=true` when running the server, which
+mounts it under `/api-stand-in`, and point the client at it, e.g.
+`CDS_MEASUREMENT_BATCH_URL=http://localhost:8765/api-stand-in`,
+`CDS_STORY_STATE_URL=http://localhost:8765/api-stand-in` or
+`CDS_ALL_DATA_URL=http://localhost:8765/api-stand-in`.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from hubbleds.json_patch import apply_patch
+
+STAND_IN_PATH = "/api-stand-in"
+
+# Stored rows by (story, endpoint), keyed by student, galaxy and measurement number
+MEASUREMENTS: defaultdict[tuple[str, str], dict[tuple, dict]] = defaultdict(dict)
+
+# Story states and their versions by (student, story)
+STORY_STATES: dict[tuple[str, str], tuple[int, dict]] = {}
+
+# All-data rows by story; summaries are keyed by student or class
+ALL_DATA: defaultdict[str, dict] = defaultdict(
+    lambda: {"measurements": [], "studentData": {}, "classData": {}}
+)
+
+
+async def put_measurement_batch(request: Request):
+    story_id = request.path_params["story_id"]
+    endpoint = request.path_params["endpoint"]
+
+    try:
+        body = await request.json()
+    except ValueError:
+        return JSONResponse({"error": "Request body is not valid JSON."}, status_code=400)
+
+    rows = body.get("measurements") if isinstance(body, dict) else None
+    if not isinstance(rows, list):
+        return JSONResponse({"error": "Expected a `measurements` list."}, status_code=400)
+
+    stored = MEASUREMENTS[(story_id, endpoint)]
+    for row in rows:
+        key = (row.get("student_id"), row.get("galaxy_id"), row.get("measurement_number"))
+        stored[key] = row
+
+    return JSONResponse({"stored": len(rows)})
+
+
+async def get_measurement_batch(request: Request):
+    story_id = request.path_params["story_id"]
+    endpoint = request.path_params["endpoint"]
+
+    rows = list(MEASUREMENTS[(story_id, endpoint)].values())
+    return JSONResponse({"measurements": rows})
+
+
+def _etag(version: int) -> str:
+    return f'"{version}"'
+
+
+async def put_story_state(request: Request):
+    key = (request.path_params["student_id"], request.path_params["story_id"])
+    try:
+        state = await request.json()
+    except ValueError:
+        return JSONResponse({"error": "Request body is not valid JSON."}, status_code=400)
+
+    version = int(request.headers.get("X-State-Version", 0))
+    STORY_STATES[key] = (version, state)
+    return JSONResponse({"version": version}, headers={"ETag": _etag(version)})
+
+
+async def patch_story_state(request: Request):
+    key = (request.path_params["student_id"], request.path_params["story_id"])
+    try:
+        patch = await request.json()
+    except ValueError:
+        return JSONResponse({"error": "Request body is not valid JSON."}, status_code=400)
+
+    if not isinstance(patch, list):
+        return JSONResponse({"error": "Expected a JSON patch array."}, status_code=400)
+
+    # The patched version is given as an entity tag, and the new one by header
+    if_match = request.headers.get("If-Match")
+    if if_match is None:
+        return JSONResponse({"error": "Expected an `If-Match` header."}, status_code=428)
+
+    try:
+        version = int(request.headers["X-State-Version"])
+    except (KeyError, ValueError):
+        return JSONResponse({"error": "Expected an `X-State-Version` header."}, status_code=400)
+
+    if key not in STORY_STATES or _etag(STORY_STATES[key][0]) != if_match:
+        return JSONResponse({"error": "Version mismatch."}, status_code=412)
+
+    try:
+        state = apply_patch(STORY_STATES[key][1], patch)
+    except (KeyError, IndexError, ValueError) as e:
+        return JSONResponse({"error": f"Invalid patch: {e}"}, status_code=422)
+
+    STORY_STATES[key] = (version, state)
+    return JSONResponse({"version": version}, headers={"ETag": _etag(version)})
+
+
+async def get_story_state(request: Request):
+    key = (request.path_params["student_id"], request.path_params["story_id"])
+    if key not in STORY_STATES:
+        return JSONResponse({"state": None}, status_code=404)
+
+    version, state = STORY_STATES[key]
+    return JSONResponse({"version": version, "state": state}, headers={"ETag": _etag(version)})
+
+
+async def put_all_data(request: Request):
+    story_id = request.path_params["story_id"]
+    try:
+        body = await request.json()
+    except ValueError:
+        return JSONResponse({"error": "Request body is not valid JSON."}, status_code=400)
+
+    data = ALL_DATA[story_id]
+    for key, id_field in (("studentData", "student_id"), ("classData", "class_id")):
+        for row in body.get(key, []):
+            data[key][row[id_field]] = row
+
+    # A student's measurements are replaced together
+    rows = body.get("measurements", [])
+    updated = {row["student_id"] for row in rows}
+    data["measurements"] = [
+        row for row in data["measurements"] if row["student_id"] not in updated
+    ] + rows
+
+    return JSONResponse({"stored": len(rows)})
+
+
+def _utc(timestamp: datetime) -> datetime:
+    # Timestamps without a timezone are taken to be in UTC, as by the client,
+    #  so that naive and aware timestamps can be compared
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(timezone.utc)
+
+
+def _updated_since(row: dict, since: datetime) -> bool:
+    update = row.get("last_data_update")
+    return update is not None and _utc(datetime.fromisoformat(update)) > since
+
+
+async def get_all_data(request: Request):
+    data = ALL_DATA[request.path_params["story_id"]]
+    student_data = list(data["studentData"].values())
+    class_data = list(data["classData"].values())
+    measurements = data["measurements"]
+
+    since = request.query_params.get("since")
+    if since is None:
+        return JSONResponse({
+            "measurements": measurements,
+            "studentData": student_data,
+            "classData": class_data,
+        })
+
+    try:
+        since_time = _utc(datetime.fromisoformat(since))
+    except ValueError:
+        return JSONResponse({"error": "Invalid `since` timestamp."}, status_code=400)
+
+    student_data = [row for row in student_data if _updated_since(row, since_time)]
+    students = {row["student_id"] for row in student_data}
+    return JSONResponse({
+        "since": since,
+        "measurements": [row for row in measurements if row["student_id"] in students],
+        "studentData": student_data,
+        "classData": [row for row in class_data if _updated_since(row, since_time)],
+    })
+
+
+routes = [
+    Route("/{story_id}/{endpoint}/batch", put_measurement_batch, methods=["PUT"]),
+    Route("/{story_id}/{endpoint}/batch", get_measurement_batch, methods=["GET"]),
+    Route("/story-state/{student_id}/{story_id}", put_story_state, methods=["PUT"]),
+    Route("/story-state/{student_id}/{story_id}", patch_story_state, methods=["PATCH"]),
+    Route("/story-state/{student_id}/{story_id}", get_story_state, methods=["GET"]),
+    Route("/{story_id}/all-data", put_all_data, methods=["PUT"]),
+    Route("/{story_id}/all-data", get_all_data, methods=["GET"]),
+]
+
+app = Starlette(routes=routes)
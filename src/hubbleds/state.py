@@ -1,12 +1,14 @@
-from pydantic import BaseModel, computed_field, field_validator, Field
+from pydantic import BaseModel, ConfigDict, PrivateAttr, computed_field, field_validator, Field
 from solara import Reactive
 from cosmicds.state import BaseState, GLOBAL_STATE, BaseLocalState
 from hubbleds.base_component_state import BaseComponentState
 from typing import Optional
+from numpy import ndarray
+from threading import Lock
+from copy import copy
 import solara
 import datetime
 from functools import cached_property
-from astropy.table import Table
 from pydantic import Field
 
 from solara.toestand import Ref
@@ -14,7 +16,7 @@ from solara.toestand import Ref
 
 from typing import Callable, Tuple
 
-from .data_management import ELEMENT_REST
+from .galaxies import GalaxyCatalog, GalaxyData, intern_galaxy
 
 from cosmicds.logger import setup_logger
 
@@ -22,42 +24,26 @@ logger = setup_logger("HUBBLEDS-STATE")
 
 
 class SpectrumData(BaseModel):
-    name: str
-    wave: list[float]
-    flux: list[float]
-    ivar: list[float]
-
-
-class GalaxyData(BaseModel):
-    id: int
-    name: str
-    ra: float
-    decl: float
-    z: float
-    type: str
-    element: str
-
-    @cached_property
-    def spectrum(self):
-        from hubbleds.remote import LOCAL_API
-
-        return LOCAL_API.load_spectrum_data(self, LOCAL_STATE)
+    """
+    The columns of a spectrum, as NumPy arrays. Spectra from the local store
+    are memory-mapped views, which are kept as they are, so that every
+    worker shares the same pages rather than its own copy.
 
-    @cached_property
-    def spectrum_as_data_frame(self):
-        from hubbleds.remote import LOCAL_API
+    Spectra compare by identity, so that passing one to a component does
+    not trigger element-wise comparisons.
+    """
 
-        spec_data = LOCAL_API.load_spectrum_data(self, LOCAL_STATE)
+    model_config = ConfigDict(arbitrary_types_allowed=True)
 
-        return Table({"wave": spec_data.wave, "flux": spec_data.flux}).to_pandas()
+    name: str
+    wave: ndarray
+    flux: ndarray
+    ivar: ndarray
 
-    @property
-    def rest_wave_value(self) -> float:
-        return round(ELEMENT_REST[self.element])
+    def __eq__(self, other) -> bool:
+        return self is other
 
-    @property
-    def redshift_rest_wave_value(self) -> float:
-        return (ELEMENT_REST[self.element] * (1 + self.z))
+    __hash__ = object.__hash__
 
 
 class StudentMeasurement(BaseModel):
@@ -76,6 +62,13 @@ class StudentMeasurement(BaseModel):
     brightness: float = 0
     galaxy: Optional[GalaxyData] = None
 
+    @field_validator("galaxy", mode="before")
+    @classmethod
+    def _intern_galaxy(cls, galaxy):
+        if isinstance(galaxy, (dict, GalaxyData)):
+            return intern_galaxy(galaxy)
+        return galaxy
+
     @computed_field
     @property
     def galaxy_id(self) -> int:
@@ -102,6 +95,18 @@ class StudentMeasurement(BaseModel):
         )
     
 
+class _MeasurementList(BaseModel):
+    measurements: list[StudentMeasurement] = []
+
+
+def parse_measurements(content: bytes | str) -> list[StudentMeasurement]:
+    """
+    Hydrate the measurements of a `{"measurements": [...]}` response body in
+    a single call, which decodes and validates the whole body in pydantic's
+    compiled core instead of building a dictionary per row first.
+    """
+    return _MeasurementList.model_validate_json(content).measurements
+
 
 class BaseSummary(BaseModel):
     hubble_fit_value: Optional[float] = None
@@ -120,13 +125,57 @@ class ClassSummary(BaseSummary):
 
 
 
+class ListIndex:
+    """
+    The position of the first item of a list with each key. The index is
+    rebuilt when it is used with a different list (reactive state replaces
+    the measurement lists on each change) or one whose length changed.
+    Since items may also be replaced in place, each hit is checked and a
+    miss is retried once after a rebuild.
+    """
+
+    __slots__ = ("_key", "_items", "_length", "_positions")
+
+    def __init__(self, key: Callable):
+        self._key = key
+        self._items: list | None = None
+        self._length = 0
+        self._positions: dict = {}
+
+    def _rebuild(self, items: list):
+        positions = {}
+        for i, item in enumerate(items):
+            positions.setdefault(self._key(item), i)
+        self._items, self._length, self._positions = items, len(items), positions
+
+    def position(self, items: list, key) -> int | None:
+        if items is not self._items or len(items) != self._length:
+            self._rebuild(items)
+            return self._positions.get(key)
+
+        index = self._positions.get(key)
+        if index is None or self._key(items[index]) != key:
+            self._rebuild(items)
+            index = self._positions.get(key)
+
+        return index
+
+    def __copy__(self) -> "ListIndex":
+        # The copy starts from the same positions, which are never modified
+        #  in place, but rebuilds independently
+        index = ListIndex(self._key)
+        index._items, index._length, index._positions = (
+            self._items, self._length, self._positions
+        )
+        return index
+
+
 class LocalState(BaseLocalState):
     title: str = "Hubble's Law"
     story_id: str = "hubbles_law"
     measurements: list[StudentMeasurement] = []
     example_measurements: list[StudentMeasurement] = []
     class_measurements: list[StudentMeasurement] = []
-    all_measurements: list[StudentMeasurement] = []
     student_summaries: list[StudentSummary] = []
     class_summaries: list[ClassSummary] = []
     measurements_loaded: bool = False
@@ -137,6 +186,8 @@ class LocalState(BaseLocalState):
     enough_students_ready: bool = False
     class_data_students: list = []
     class_data_info: dict = {}
+    # Stored answers, which are moved into `MC_SCORES` and `FREE_RESPONSES`
+    #  when the session loads; these fields are empty afterwards
     mc_scoring: dict[str, dict] = {'scores': {}}
     free_responses: dict[str, dict]= {'responses': {}}
     show_snackbar: bool = False
@@ -146,12 +197,27 @@ class LocalState(BaseLocalState):
     last_route: Optional[str] = None
     route_restored: bool = Field(False, exclude=True)
 
+    _measurement_index: ListIndex = PrivateAttr(
+        default_factory=lambda: ListIndex(lambda x: x.galaxy_id)
+    )
+    _example_measurement_index: ListIndex = PrivateAttr(
+        default_factory=lambda: ListIndex(lambda x: (x.galaxy_id, x.measurement_number))
+    )
+
+    def __copy__(self):
+        # `model_copy` shares private attributes; each copy gets its own
+        #  indexes, so that copies used with different lists don't keep
+        #  rebuilding each other's
+        copied = super().__copy__()
+        copied._measurement_index = copy(self._measurement_index)
+        copied._example_measurement_index = copy(self._example_measurement_index)
+        return copied
+
     @cached_property
     def galaxies(self) -> dict[int, GalaxyData]:
         from hubbleds.remote import LOCAL_API
 
-        gal_data = LOCAL_API.get_galaxies(LOCAL_STATE)
-        return { galaxy.id: galaxy for galaxy in gal_data }
+        return LOCAL_API.get_galaxy_catalog(LOCAL_STATE).by_id
 
     def as_dict(self):
         return self.model_dump(exclude={
@@ -159,51 +225,132 @@ class LocalState(BaseLocalState):
             "measurements",
             "measurements_loaded",
             "class_measurements",
-            "all_measurements",
             "student_summaries",
             "class_summaries",
+            # Serialized from their stores instead
+            "mc_scoring",
+            "free_responses",
         })
 
     def get_measurement(self, galaxy_id: int) -> StudentMeasurement | None:
-        return next((x for x in self.measurements if x.galaxy_id == galaxy_id), None)
+        index = self.get_measurement_index(galaxy_id)
+        return self.measurements[index] if index is not None else None
 
     def get_example_measurement(self, galaxy_id: int, measurement_number = 'first') -> StudentMeasurement | None:
-        def check_example_galaxy(x: StudentMeasurement):
-            return x.galaxy_id == galaxy_id and x.measurement_number == measurement_number
-        
-        return next(
-            (x for x in self.example_measurements if check_example_galaxy(x)), None
-        )
+        index = self.get_example_measurement_index(galaxy_id, measurement_number)
+        return self.example_measurements[index] if index is not None else None
 
     def get_measurement_index(self, galaxy_id: int) -> int | None:
-        return next(
-            (i for i, x in enumerate(self.measurements) if x.galaxy_id == galaxy_id),
-            None,
-        )
+        return self._measurement_index.position(self.measurements, galaxy_id)
 
     def get_example_measurement_index(self, galaxy_id: int, measurement_number = 'first') -> int | None:
-        def check_example_galaxy(x: StudentMeasurement):
-            return x.galaxy_id == galaxy_id and x.measurement_number == measurement_number
-        
-        return next(
-            (
-                i
-                for i, x in enumerate(self.example_measurements)
-                if check_example_galaxy(x)
-            ),
-            None,
+        return self._example_measurement_index.position(
+            self.example_measurements, (galaxy_id, measurement_number)
         )
 
-    def question_completed(self, tag: str) -> bool:
-        if tag in self.free_responses['responses']:
-            return self.free_responses['responses'][tag]['response'] != ""
-        elif tag in self.mc_scoring['scores']:
-            return self.mc_scoring['scores'][tag]['score'] is not None
 
-        return False
+LOCAL_STATE = solara.reactive(LocalState())
 
 
-LOCAL_STATE = solara.reactive(LocalState())
+class TagStore:
+    """
+    Question state (multiple choice scores or free responses) kept in one
+    reactive per tag, so that answering a question only re-renders the
+    components that read that question. Tag values are per session, like
+    any other reactive value; a tag without a value reads as `None`.
+
+    The store is loaded from, and serialized to, the `{key: {tag: value}}`
+    shape of the corresponding `LocalState` field.
+
+    Parameters
+    ----------
+    field: str
+        The `LocalState` field the store replaces, e.g. `mc_scoring`
+    key: str
+        The key of the tag values in that field, e.g. `scores`
+    """
+
+    def __init__(self, field: str, key: str):
+        self.field = field
+        self.key = key
+        self._lock = Lock()
+        self._tags: dict[str, Reactive[Optional[dict]]] = {}
+        self._listeners: list[Callable[[str], None]] = []
+
+    def _reactive(self, tag: str) -> Reactive[Optional[dict]]:
+        with self._lock:
+            reactive = self._tags.get(tag)
+            if reactive is None:
+                reactive = self._tags[tag] = solara.reactive(None)
+        return reactive
+
+    def get(self, tag: str) -> Optional[dict]:
+        return self._reactive(tag).value
+
+    def peek(self, tag: str) -> Optional[dict]:
+        return self._reactive(tag).peek()
+
+    def set(self, tag: str, value: dict):
+        reactive = self._reactive(tag)
+        if reactive.peek() == value:
+            return
+
+        reactive.set(value)
+        for listener in list(self._listeners):
+            listener(tag)
+
+    def on_change(self, listener: Callable[[str], None]):
+        """
+        Call `listener(tag)`, in the session that made the change, whenever
+        a tag value is set. Loading the store does not call listeners.
+        """
+        self._listeners.append(listener)
+
+    def load(self, values: dict):
+        """
+        Replace the values of the current session with those of a stored
+        `{key: {tag: value}}` dictionary.
+        """
+        tag_values = values.get(self.key, {})
+        with self._lock:
+            tags = set(self._tags) | set(tag_values)
+        for tag in tags:
+            self._reactive(tag).set(tag_values.get(tag))
+
+    def load_from(self, local_state: Reactive[LocalState]):
+        """
+        Load the stored values from the store's `LocalState` field, and
+        empty the field, so that the store holds the only copy.
+        """
+        self.load(getattr(local_state.value, self.field))
+        Ref(getattr(local_state.fields, self.field)).set({self.key: {}})
+
+    def serialize(self) -> dict[str, dict]:
+        with self._lock:
+            reactives = list(self._tags.items())
+        return {
+            self.key: {
+                tag: value
+                for tag, reactive in reactives
+                if (value := reactive.peek()) is not None
+            }
+        }
+
+
+MC_SCORES = TagStore("mc_scoring", "scores")
+FREE_RESPONSES = TagStore("free_responses", "responses")
+
+
+def question_completed(tag: str) -> bool:
+    response = FREE_RESPONSES.get(tag)
+    if response is not None:
+        return response['response'] != ""
+
+    score = MC_SCORES.get(tag)
+    if score is not None:
+        return score['score'] is not None
+
+    return False
 
 from typing import TypeVar
 BaseComponentStateT = TypeVar('BaseComponentStateT', bound='BaseComponentState')
@@ -211,41 +358,34 @@ BaseComponentStateT = TypeVar('BaseComponentStateT', bound='BaseComponentState')
 def get_free_response(local_state: Reactive[LocalState], component_state: Reactive[BaseComponentStateT], tag: str):
     logger.debug(f"Getting Free Response for tag: {tag}")
     # check if the question present
-    if tag in local_state.value.free_responses['responses']:
-        
-        return local_state.value.free_responses['responses'][tag]
+    response = FREE_RESPONSES.get(tag)
+    if response is not None:
+        return response
     
-    # Create question on Ref
-    free_responses = Ref(local_state.fields.free_responses).value.copy()['responses']
-    new = dict(tag=tag, response="", initialized=True, stage=component_state.value.stage_id)
-    free_responses = {**free_responses, tag: new }
-    Ref(local_state.fields.free_responses).set({'responses': free_responses})
-    return free_responses[tag]
+    # The question is added to the store by its `fr-initialize` event, since
+    #  this runs while rendering
+    return dict(tag=tag, response="", initialized=True, stage=component_state.value.stage_id)
 
 
 def fix_free_responses_stage_missing(tag, local_state: Reactive[LocalState], component_state: Reactive[BaseComponentStateT]):
     # just add the state if it's missing
-    free_responses = Ref(local_state.fields.free_responses).value.copy()['responses']
-    if tag not in free_responses.keys():
+    if FREE_RESPONSES.peek(tag) is None:
         new = dict(tag=tag, response="", initialized=True, stage=component_state.value.stage_id)
-        free_responses = {**free_responses, tag: new }
-        Ref(local_state.fields.free_responses).set({'responses': free_responses})
+        FREE_RESPONSES.set(tag, new)
         
         
 def get_multiple_choice(local_state: Reactive[LocalState], component_state: Reactive[BaseComponentStateT], tag: str):
     logger.debug(f"Getting MC Score for tag: {tag}")
-    if tag in local_state.value.mc_scoring['scores']:
-        if 'stage' not in local_state.value.mc_scoring['scores'][tag]:
-            new = local_state.value.mc_scoring['scores'][tag]
-            new['stage'] = component_state.value.stage_id
-            mc_scoring = {**local_state.value.mc_scoring['scores'], tag: new }
-        return local_state.value.mc_scoring['scores'][tag]
+    score = MC_SCORES.get(tag)
+    if score is not None:
+        # The stage is stored with the next score
+        if 'stage' not in score:
+            score = {**score, 'stage': component_state.value.stage_id}
+        return score
     
-    mc_scoring = Ref(local_state.fields.mc_scoring).value.copy()['scores']
-    new = dict(tag=tag, score=None, choice=None, tries=0, wrong_attempts=0, stage=component_state.value.stage_id)
-    mc_scoring = {**mc_scoring, tag: new }
-    Ref(local_state.fields.mc_scoring).set({'scores': mc_scoring})
-    return mc_scoring[tag]
+    # The question is added to the store by its `mc-initialize-response`
+    #  event, since this runs while rendering
+    return dict(tag=tag, score=None, choice=None, tries=0, wrong_attempts=0, stage=component_state.value.stage_id)
 
 
 def mc_callback(
@@ -258,13 +398,12 @@ def mc_callback(
     Multiple Choice callback function
     """
 
-    mc_scoring = Ref(local_state.fields.mc_scoring).value.copy()['scores']
     piggybank_total = Ref(local_state.fields.piggybank_total)
 
     # mc-initialize-callback returns data which is a string
     if event[0] == "mc-initialize-response":
         # check for a missing tag
-        if event[1] not in mc_scoring.keys():
+        if MC_SCORES.peek(event[1]) is None:
             logger.debug(f"Initializing MC Score for tag: {event[1]}")
             new_score = dict(
                 tag=event[1], 
@@ -274,17 +413,15 @@ def mc_callback(
                 wrong_attempts=0,
                 stage=component_state.value.stage_id
                 )
-            mc_scoring = {**mc_scoring, event[1]: new_score}
-            Ref(local_state.fields.mc_scoring).set({'scores': mc_scoring})
+            MC_SCORES.set(event[1], new_score)
 
     # mc-score event returns a data which is an mc-score dictionary (includes tag)
     elif event[0] == "mc-score":
-        new_score = mc_scoring[event[1]["tag"]].copy() # make a copy of the current score
+        new_score = dict(MC_SCORES.peek(event[1]["tag"]) or {}) # make a copy of the current score
         if 'stage' not in new_score:
             new_score['stage'] = component_state.value.stage_id
         new_score.update(event[1]) # update with new score, choice, tries, and wrong_attempts, but keeps the stage
-        mc_scoring = {**mc_scoring, event[1]["tag"]: new_score} # update the score
-        Ref(local_state.fields.mc_scoring).set({'scores': mc_scoring})
+        MC_SCORES.set(event[1]["tag"], new_score)
 
         # update piggybank_total
         try:
@@ -318,25 +455,19 @@ def fr_callback(
     Free Response callback function
     """
     
-    free_responses = Ref(local_state.fields.free_responses).value.copy()['responses']
-    
     if event[0] == "fr-initialize":
-        if event[1]["tag"] not in free_responses.keys():
+        if FREE_RESPONSES.peek(event[1]["tag"]) is None:
             logger.debug(f"Initializing Free Response for tag: {event[1]['tag']}")
             new = dict(tag=event[1]["tag"], response="", initialized=True, stage=component_state.value.stage_id)
-            free_responses = {**free_responses, event[1]["tag"]: new }
-            Ref(local_state.fields.free_responses).set({'responses': free_responses})
+            FREE_RESPONSES.set(event[1]["tag"], new)
             if callback is not None:
                 callback()
     elif event[0] == "fr-update":
-        new = free_responses[event[1]["tag"]]
+        new = dict(FREE_RESPONSES.peek(event[1]["tag"]) or {"tag": event[1]["tag"]})
         new['response'] = event[1]["response"]
-        free_responses = {**free_responses, event[1]["tag"]: new }
-        if 'stage' not in free_responses[event[1]["tag"]]:
-            new = free_responses[event[1]["tag"]]
+        if 'stage' not in new:
             new['stage'] = component_state.value.stage_id
-            free_responses = {**free_responses, event[1]["tag"]: new }
-        Ref(local_state.fields.free_responses).set({'responses': free_responses})
+        FREE_RESPONSES.set(event[1]["tag"], new)
         if callback is not None:
                 callback()
     else:
@@ -1,32 +1,37 @@
-from collections import defaultdict
 from astropy import units as u
 from astropy.modeling import models, fitting
-from numpy import argsort, array, pi
+from numpy import argmax, argmin, argsort, arange, array, bincount, column_stack, concatenate, errstate, geomspace, inf, interp, isnan, loadtxt, log, nan, nanargmax, nanargmin, ndarray, pi, savetxt, sort, unique, where
 
+from cosmicds.logger import setup_logger
 from cosmicds.utils import component_type_for_field, mode, percent_around_center_indices
 from pydantic import BaseModel
 
 from glue.core import Data
 from glue_jupyter.app import JupyterApplication
 from numbers import Number
-from typing import List, Set, Tuple, TypeVar, Optional, cast, Any
+from typing import List, NamedTuple, Set, Tuple, TypeVar, Optional, cast, Any
 from collections.abc import Callable
+import os
 import solara
 from solara.routing import Router
 from solara.toestand import Reactive
 from solara.server import settings
 
 from hubbleds.state import StudentMeasurement
+from hubbleds.cache import SizedLRUCache
 from glue.core import Data
 from numpy import asarray
 
 from pathlib import Path
+from weakref import ref
 
 try:
     from astropy.cosmology import Planck18 as planck
 except ImportError:
     from astropy.cosmology import Planck15 as planck
 
+logger = setup_logger("UTILS")
+
 __all__ = [
     "HUBBLE_ROUTE_PATH",
     "MILKY_WAY_SIZE_MPC",
@@ -76,24 +81,88 @@ def angle_from_json(jsn, _widget):
     return jsn["value"] * u.Unit(jsn["unit"])
 
 
+# The age lookup table, which holds H0 * age (in km / s / Mpc * Gyr) on a
+#  log-spaced grid of H0 values (in km / s / Mpc). Interpolating in it is
+#  accurate to a relative error of `AGE_TABLE_TOLERANCE`.
+AGE_TABLE_PATH = Path(__file__).parent / "data" / "age_table.csv"
+AGE_TABLE_H0_RANGE = (1.0, 1e4)
+AGE_TABLE_POINTS = 257
+AGE_TABLE_TOLERANCE = 1e-4
+
+
+def _exact_age_in_gyr(H0: float) -> float:
+    age = planck.clone(H0=H0).age(0)
+    unit = age.unit
+    return age.value * unit.to(u.Gyr)
+
+
+def build_age_table(path: Path | str = AGE_TABLE_PATH):
+    """
+    Compute the age lookup table exactly and write it to `path`. The table
+    is shipped with the package, and only needs to be rebuilt if its
+    cosmology or H0 range changes:
+
+        python -c "from hubbleds.utils import build_age_table; build_age_table()"
+    """
+    h0 = geomspace(*AGE_TABLE_H0_RANGE, AGE_TABLE_POINTS)
+    scaled = array([h * _exact_age_in_gyr(h) for h in h0])
+    savetxt(
+        path,
+        column_stack([h0, scaled]),
+        delimiter=",",
+        fmt="%.17g",
+        header=f"{planck.name}\nH0,H0_age",
+    )
+
+
+def _load_age_table() -> Tuple[Any, Any]:
+    with open(AGE_TABLE_PATH) as f:
+        cosmology = f.readline().lstrip("#").strip()
+        h0, scaled = loadtxt(f, delimiter=",", comments="#", unpack=True)
+
+    if cosmology != planck.name:
+        logger.warning(
+            "The age table was built for %s, not %s; interpolated ages may be off.",
+            cosmology, planck.name,
+        )
+
+    return log(h0), scaled
+
+
+_AGE_TABLE_LOG_H0, _AGE_TABLE_SCALED = _load_age_table()
+
+
 def age_in_gyr(H0):
     """
     Given a value for the Hubble constant, computes the age of the universe
     in Gyr, based on the Planck cosmology.
 
+    Ages are interpolated in a precomputed table of H0 * age over
+    `AGE_TABLE_H0_RANGE`. Beyond the top of the range, the product no longer
+    changes (by less than 1e-7 relative), so its last value is used. Below
+    the range, where the product falls quickly, ages are computed exactly.
+    There is no age for a non-positive H0, so it is NaN.
+
     Parameters
     ----------
-    H0: float
-        The value of the Hubble constant
+    H0: float or array-like
+        The value(s) of the Hubble constant
 
     Returns
     ----------
-    age: numpy.float64
+    age: numpy.float64 or numpy.ndarray
         The age of the universe, in Gyr
     """
-    age = planck.clone(H0=H0).age(0)
-    unit = age.unit
-    return age.value * unit.to(u.Gyr)
+    h0 = asarray(H0, dtype=float)
+    with errstate(divide="ignore", invalid="ignore"):
+        ages = asarray(interp(log(h0), _AGE_TABLE_LOG_H0, _AGE_TABLE_SCALED) / h0)
+
+    ages[h0 <= 0] = nan
+    below = (h0 > 0) & (h0 < AGE_TABLE_H0_RANGE[0])
+    if below.any():
+        ages[below] = [_exact_age_in_gyr(h) for h in h0[below]]
+
+    return ages[()]
 
 
 def age_in_gyr_simple(H0):
@@ -103,15 +172,109 @@ def age_in_gyr_simple(H0):
     return round(inv * mpc_to_km * s_to_gyr, 3)
 
 
-def fit_line(x, y):
+class _Parameter(NamedTuple):
+    value: float
+
+
+class OriginLine:
+    """
+    A line through the origin, as fitted by `fit_line`. Like the astropy
+    `Linear1D` it stands in for, its parameters have a `value` and it can
+    be evaluated at `x`.
+    """
+
+    __slots__ = ("slope", "intercept")
+
+    def __init__(self, slope: float):
+        self.slope = _Parameter(float(slope))
+        self.intercept = _Parameter(0.0)
+
+    def __call__(self, x):
+        return self.slope.value * asarray(x, dtype=float)
+
+    def __repr__(self) -> str:
+        return f"<OriginLine(slope={self.slope.value})>"
+
+
+def fit_line(x, y, weights=None, through_origin: bool = True):
+    """
+    Least-squares fit of a line to the points (x, y), ignoring points with
+    a missing (None or NaN) coordinate or weight. As with astropy's fitters,
+    the weights multiply the residuals, i.e. they are 1/sigma for Gaussian
+    uncertainties.
+
+    Lines through the origin, which is what every fit in the story uses,
+    are fitted directly as slope = sum(w^2 x y) / sum(w^2 x^2). Other lines
+    are fitted with astropy. If there is nothing to fit, or the fit fails,
+    the result is a line with a NaN slope.
+    """
+    x = asarray(x, dtype=float)
+    y = asarray(y, dtype=float)
+    valid = ~(isnan(x) | isnan(y))
+    if weights is not None:
+        weights = asarray(weights, dtype=float)
+        valid &= ~isnan(weights)
+        weights = weights[valid]
+    x, y = x[valid], y[valid]
+
+    if through_origin:
+        w2 = 1 if weights is None else weights * weights
+        sum_xx = (w2 * x * x).sum()
+        if not x.size or sum_xx == 0:
+            return OriginLine(nan)
+        return OriginLine((w2 * x * y).sum() / sum_xx)
+
     try:
         fit = fitting.LinearLSQFitter()
-        line_init = models.Linear1D(intercept=0, fixed={"intercept": True})
-        fitted_line = fit(line_init, x, y)
+        line_init = models.Linear1D()
+        fitted_line = fit(line_init, x, y, weights=weights)
         return fitted_line
     except ValueError as e:
-        print(e)
-        return None
+        logger.warning("Failed to fit line: %s", e)
+        return OriginLine(nan)
+
+
+def minmax_downsample_indices(y, bins: int):
+    """
+    Choose indices of `y` that preserve its shape when drawn as a line at
+    roughly `bins` pixels of width. The samples are split into `bins`
+    consecutive chunks and the minimum and maximum of each chunk are kept,
+    along with the first and last samples, so narrow peaks and troughs
+    survive the decimation.
+
+    Parameters
+    ----------
+    y: array-like
+        The values to decimate, ordered by their x coordinate
+    bins: int
+        The number of chunks to split the values into
+
+    Returns
+    ----------
+    indices: numpy.ndarray
+        The sorted indices of the samples to keep
+    """
+    y = asarray(y, dtype=float)
+    n = len(y)
+    if bins <= 0 or n <= 2 * bins:
+        return arange(n)
+
+    per_bin = n // bins
+    chunked = y[:per_bin * bins].reshape(bins, per_bin)
+    offsets = arange(bins) * per_bin
+    nan_mask = isnan(chunked)
+    mins = argmin(where(nan_mask, inf, chunked), axis=1) + offsets
+    maxs = argmax(where(nan_mask, -inf, chunked), axis=1) + offsets
+
+    indices = [[0, n - 1], mins, maxs]
+
+    # The remainder that doesn't fill a whole chunk keeps its min and max too
+    remainder = y[per_bin * bins:]
+    if remainder.size and not isnan(remainder).all():
+        offset = per_bin * bins
+        indices.append([offset + nanargmin(remainder), offset + nanargmax(remainder)])
+
+    return unique(concatenate(indices))
 
 
 def format_fov(fov, units=True):
@@ -138,6 +301,75 @@ def distance_from_angular_size(theta):
     return round(DISTANCE_CONSTANT / theta, 0)
 
 
+class ComponentSummary(NamedTuple):
+    """
+    Summary statistics of a set of values, computed from a single sort.
+    Missing (NaN) values are left out.
+    """
+
+    mean: float
+    median: float
+    sorted_values: ndarray
+
+    def percent_interval(self, percent: float) -> Tuple[float, float]:
+        """
+        The range of the central `percent` of the values.
+        """
+        if not len(self.sorted_values):
+            return nan, nan
+        bottom_index, top_index = percent_around_center_indices(
+            len(self.sorted_values), percent
+        )
+        return self.sorted_values[bottom_index], self.sorted_values[top_index]
+
+
+def summarize_values(values) -> ComponentSummary:
+    """
+    Summarize `values` from a single sort.
+    """
+    values = asarray(values, dtype=float)
+    sorted_values = sort(values[~isnan(values)])
+    n = len(sorted_values)
+    if n == 0:
+        return ComponentSummary(nan, nan, sorted_values)
+
+    half = n // 2
+    if n % 2:
+        median = sorted_values[half]
+    else:
+        median = (sorted_values[half - 1] + sorted_values[half]) / 2
+
+    return ComponentSummary(sorted_values.mean(), median, sorted_values)
+
+
+# Summaries by (data uuid, component label), along with a weak reference to
+#  the component values they were computed from. Glue replaces a component's
+#  array when the data is updated (its arrays are read-only), so a summary is
+#  current as long as the array it was computed from is still the one in use
+STATISTICS_CACHE = SizedLRUCache(
+    max_bytes=int(os.getenv("CDS_STATISTICS_CACHE_MB", "16")) * 1024 ** 2,
+    sizeof=lambda entry: entry[1].sorted_values.nbytes + 256,
+    name="statistics cache",
+)
+
+
+def component_summary(data: Data, component_id) -> ComponentSummary:
+    """
+    The summary statistics of a component, computed once for each version of
+    its values.
+    """
+    values = data[component_id]
+    key = (data.uuid, getattr(component_id, "label", component_id))
+
+    cached = STATISTICS_CACHE.get(key)
+    if cached is not None and cached[0]() is values:
+        return cached[1]
+
+    summary = summarize_values(values)
+    STATISTICS_CACHE.put(key, (ref(values), summary))
+    return summary
+
+
 def data_summary_for_component(data, component_id):
     summary = {
         "mean": data.compute_statistic("mean", component_id),
@@ -191,36 +423,51 @@ def create_single_summary(distances: List[Number], velocities: List[Number]) ->
     return h0, age
 
 
+def grouped_slopes_through_origin(ids, x, y) -> Tuple[Any, Any]:
+    """
+    Fit a line through the origin to the points of each id at once. The
+    least-squares slope of such a line is sum(x * y) / sum(x ** 2), so each
+    group only needs two weighted bin counts. Points with a missing (None or
+    NaN) coordinate are ignored; ids without any points get a NaN slope.
+
+    Returns
+    ----------
+    ids: numpy.ndarray
+        The distinct ids, in sorted order
+    slopes: numpy.ndarray
+        The fitted slope for each id
+    """
+    group_ids, groups = unique(asarray(ids), return_inverse=True)
+    x = asarray(x, dtype=float)
+    y = asarray(y, dtype=float)
+
+    valid = ~(isnan(x) | isnan(y))
+    groups, x, y = groups[valid], x[valid], y[valid]
+
+    sum_xy = bincount(groups, weights=x * y, minlength=len(group_ids))
+    sum_xx = bincount(groups, weights=x * x, minlength=len(group_ids))
+    with errstate(divide="ignore", invalid="ignore"):
+        slopes = sum_xy / sum_xx
+
+    return group_ids, slopes
+
+
 def make_summary_data(measurement_data: Data,
                       input_id_field: str="id",
                       output_id_field: str | None=None,
                       label: str | None=None
 ) -> Data:
-    dists = defaultdict(list)
-    vels = defaultdict(list)
-    d = measurement_data["est_dist_value"]
-    v = measurement_data["velocity_value"]
-    ids: Set[int] = set()
-
-    for i in range(measurement_data.size):
-        id_num = measurement_data[input_id_field][i]
-        ids.add(id_num)
-        dist = d[i]
-        vel = v[i]
-        if dist is not None and vel is not None:
-            dists[id_num].append(dist)
-            vels[id_num].append(vel)
-
-    hubbles: List[float] = []
-    ages: List[float] = []
-    for id_num in ids:
-        h0, age = create_single_summary(dists[id_num], vels[id_num])
-        hubbles.append(h0)
-        ages.append(age)
+    ids, hubbles = grouped_slopes_through_origin(
+        measurement_data[input_id_field],
+        measurement_data["est_dist_value"],
+        measurement_data["velocity_value"],
+    )
+    with errstate(divide="ignore"):
+        ages = age_in_gyr_simple(hubbles)
 
     data_kwargs: dict = { "hubble_fit_value": hubbles, "age_value": ages }
     output_id_field = output_id_field or input_id_field
-    data_kwargs[output_id_field] = list(ids)
+    data_kwargs[output_id_field] = ids
 
     if label:
         data_kwargs["label"] = label
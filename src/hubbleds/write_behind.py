@@ -0,0 +1,298 @@
+"""
+Per-session write-behind queue for state persistence.
+
+State changes arrive in bursts (a slider drag, typing into a free response,
+several fields of a marker transition), and each one used to trigger its own
+database write. Writes are instead scheduled under a key, e.g. the story
+state or a stage's state, and the queue runs only the latest write for each
+key once the session has been quiet for `window` seconds, or at most
+`max_wait` seconds after the first of them was scheduled. Queues are flushed
+immediately on route changes and when the session's kernel shuts down.
+"""
+
+import os
+from collections import Counter
+from threading import Lock, RLock, Timer
+from time import monotonic
+from typing import Any, Callable, Hashable, Mapping, Optional
+
+from pydantic import BaseModel
+
+import solara
+from solara.server import kernel_context
+
+from .logger import setup_logger
+
+logger = setup_logger("WRITE-BEHIND")
+
+WRITE_BEHIND_WINDOW = float(os.getenv("CDS_WRITE_BEHIND_WINDOW", "1"))
+# Continuous changes, e.g. a long slider drag, still reach the database
+WRITE_BEHIND_MAX_WAIT = float(os.getenv("CDS_WRITE_BEHIND_MAX_WAIT", "5"))
+
+STORY_STATE_WRITE = "story-state"
+MEASUREMENTS_WRITE = "measurements"
+SAMPLE_MEASUREMENTS_WRITE = "sample-measurements"
+
+
+def stage_state_write(stage_id: Any) -> str:
+    return f"stage-state-{stage_id}"
+
+
+# How changes to a state field are persisted
+PERSISTENT = "persistent"
+# UI-only, never stored
+EPHEMERAL = "ephemeral"
+# Recomputed or reloaded from other stored data
+DERIVED = "derived"
+
+# The kinds of `LocalState` fields; fields that aren't listed are persistent
+LOCAL_STATE_FIELDS: Mapping[str, str] = {
+    "show_snackbar": EPHEMERAL,
+    "snackbar_message": EPHEMERAL,
+    "route_restored": EPHEMERAL,
+    "measurements_loaded": DERIVED,
+    "class_measurements": DERIVED,
+    "student_summaries": DERIVED,
+    "class_summaries": DERIVED,
+}
+
+# Persistent fields that are stored by their own write, rather than with the
+#  story state
+FIELD_WRITES: Mapping[str, str] = {
+    "measurements": MEASUREMENTS_WRITE,
+    "example_measurements": SAMPLE_MEASUREMENTS_WRITE,
+}
+
+STATE_WRITES = (STORY_STATE_WRITE, MEASUREMENTS_WRITE, SAMPLE_MEASUREMENTS_WRITE)
+
+
+def changed_fields(previous: BaseModel, current: BaseModel) -> set[str]:
+    """
+    The names of the fields whose values differ between two states.
+    """
+    if previous is current:
+        return set()
+
+    changed = set()
+    for name in type(current).model_fields:
+        old, new = getattr(previous, name, None), getattr(current, name, None)
+        # Unchanged fields are usually the same object in both states
+        if new is not old and new != old:
+            changed.add(name)
+
+    return changed
+
+
+def state_writes(
+    previous: Optional[tuple[BaseModel, BaseModel]],
+    current: tuple[BaseModel, BaseModel],
+) -> set[str]:
+    """
+    The writes needed to persist a change from the `previous` to the
+    `current` (global state, local state) pair. Every write is needed if
+    there is no previous pair.
+
+    Any change to the global state is stored with the story state. Local
+    state changes schedule the write that stores the field, if the field is
+    persistent.
+    """
+    if previous is None:
+        return set(STATE_WRITES)
+
+    writes = set()
+    if changed_fields(previous[0], current[0]):
+        writes.add(STORY_STATE_WRITE)
+
+    for name in changed_fields(previous[1], current[1]):
+        if LOCAL_STATE_FIELDS.get(name, PERSISTENT) == PERSISTENT:
+            writes.add(FIELD_WRITES.get(name, STORY_STATE_WRITE))
+
+    return writes
+
+
+# Totals across all sessions on this worker
+WRITE_BEHIND_STATS: Counter[str] = Counter()
+
+
+class WriteBehindQueue:
+    """
+    Coalesces the writes of one session. Writes run in a timer thread, inside
+    the kernel context that scheduled them, so they can read reactive state.
+
+    Parameters
+    ----------
+    context: VirtualKernelContext
+        The kernel context of the session that owns the queue
+    window: float
+        The number of quiet seconds to wait before running scheduled writes
+    max_wait: float
+        The longest time, in seconds, that a scheduled write waits to run
+    """
+
+    def __init__(
+        self,
+        context,
+        window: float = WRITE_BEHIND_WINDOW,
+        max_wait: float = WRITE_BEHIND_MAX_WAIT,
+    ):
+        self.window = window
+        self.max_wait = max_wait
+        self._context = context
+        self._lock = Lock()
+        self._flush_lock = RLock()
+        self._pending: dict[Hashable, tuple[Callable, tuple]] = {}
+        # When the oldest pending write was scheduled
+        self._pending_since: float | None = None
+        self._timer: Timer | None = None
+        self._closed = False
+        self.requested = 0
+        self.executed = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    @property
+    def coalescing_ratio(self) -> float:
+        """The number of writes requested per write performed."""
+        return self.requested / self.executed if self.executed else 0.0
+
+    @property
+    def stats(self) -> dict[str, float]:
+        return {
+            "depth": self.depth,
+            "requested": self.requested,
+            "executed": self.executed,
+            "coalescing_ratio": self.coalescing_ratio,
+        }
+
+    def schedule(self, key: Hashable, write: Callable, *args):
+        """
+        Schedule `write(*args)` to run after the quiet window, replacing any
+        write already pending under the same key. Pending writes run once
+        `max_wait` has passed since the first of them, even if changes keep
+        arriving.
+        """
+        with self._lock:
+            now = monotonic()
+            if self._pending_since is None:
+                self._pending_since = now
+            self._pending[key] = (write, args)
+            self.requested += 1
+            WRITE_BEHIND_STATS["requested"] += 1
+
+            if self._closed:
+                run_now = True
+            else:
+                run_now = False
+                if self._timer is not None:
+                    self._timer.cancel()
+                deadline = self._pending_since + self.max_wait - now
+                self._timer = Timer(max(min(self.window, deadline), 0), self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+        if run_now:
+            self.flush()
+
+    def flush(self):
+        """
+        Run all pending writes now.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                pending = self._pending
+                self._pending = {}
+                self._pending_since = None
+
+            if not pending:
+                return
+
+            if (
+                kernel_context.has_current_context()
+                and kernel_context.get_current_context() is self._context
+            ):
+                self._run(pending)
+            else:
+                with self._context:
+                    self._run(pending)
+
+            logger.debug("Flushed %s writes: %s", len(pending), self.stats)
+
+    def _run(self, pending: dict[Hashable, tuple[Callable, tuple]]):
+        for key, (write, args) in pending.items():
+            try:
+                write(*args)
+            except Exception as e:
+                logger.error("Failed to run `%s` write: %s", key, e)
+            self.executed += 1
+            WRITE_BEHIND_STATS["executed"] += 1
+
+    def close(self):
+        """
+        Flush the queue and run any later writes immediately.
+        """
+        with self._lock:
+            self._closed = True
+        self.flush()
+
+
+_QUEUES: dict[str, WriteBehindQueue] = {}
+_QUEUES_LOCK = Lock()
+
+
+def write_queue() -> WriteBehindQueue:
+    """
+    Return the write-behind queue of the current session.
+    """
+    context = kernel_context.get_current_context()
+    with _QUEUES_LOCK:
+        queue = _QUEUES.get(context.id)
+        if queue is None:
+            queue = _QUEUES[context.id] = WriteBehindQueue(context)
+    return queue
+
+
+def schedule_write(key: Hashable, write: Callable, *args):
+    write_queue().schedule(key, write, *args)
+
+
+def flush_writes():
+    """
+    Run the current session's pending writes now, and wait for them to finish.
+    """
+    write_queue().flush()
+
+
+def suppress_writes(count: int = 1):
+    """
+    Record state changes that needed no write, e.g. changes to UI-only fields.
+    """
+    WRITE_BEHIND_STATS["suppressed"] += count
+
+
+def close_write_queue(context_id: str):
+    """
+    Run the pending writes of a session whose kernel is shutting down, and
+    drop its queue. Does nothing if the queue was already closed.
+    """
+    with _QUEUES_LOCK:
+        queue = _QUEUES.pop(context_id, None)
+    if queue is not None:
+        queue.close()
+        logger.info("Closed write-behind queue: %s", queue.stats)
+
+
+def _on_kernel_start():
+    context_id = kernel_context.get_current_context().id
+
+    def _on_kernel_shutdown():
+        close_write_queue(context_id)
+
+    return _on_kernel_shutdown
+
+
+solara.lab.on_kernel_start(_on_kernel_start)
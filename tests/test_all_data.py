@@ -0,0 +1,113 @@
+import json
+from threading import Event, Thread
+
+import pytest
+
+pytest.importorskip("cosmicds")
+
+from hubbleds.all_data import AllDataSnapshot
+from hubbleds.columnar import parse_all_data
+
+
+def _payload(*student_ids: int):
+    return parse_all_data(
+        json.dumps(
+            {
+                "measurements": [
+                    {"student_id": student_id, "class_id": student_id, "galaxy_id": 1}
+                    for student_id in student_ids
+                ],
+                "studentData": [
+                    {"student_id": student_id, "last_data_update": "2024-01-01T00:00:00"}
+                    for student_id in student_ids
+                ],
+                "classData": [],
+            }
+        ).encode()
+    )
+
+
+def _fail(since):
+    raise ConnectionError("Server unavailable")
+
+
+def test_failed_refresh_keeps_previous_snapshot():
+    snapshot = AllDataSnapshot(ttl=0, full_refresh=3600)
+    snapshot.get("hubbles_law", None, lambda since: _payload(1, 2))
+
+    measurements, _, _ = snapshot.get("hubbles_law", None, _fail)
+
+    assert len(measurements) == 2
+    assert snapshot.stats["failed_refreshes"] == 1
+
+
+def test_failed_first_load_raises():
+    snapshot = AllDataSnapshot(ttl=0, full_refresh=3600)
+    with pytest.raises(ConnectionError):
+        snapshot.get("hubbles_law", None, _fail)
+
+
+def test_sessions_are_served_previous_snapshot_during_refresh():
+    snapshot = AllDataSnapshot(ttl=0, full_refresh=3600)
+    snapshot.get("hubbles_law", None, lambda since: _payload(1))
+
+    started, release = Event(), Event()
+
+    def _slow_fetch(since):
+        started.set()
+        release.wait(5)
+        return _payload(1, 2)
+
+    refresh = Thread(target=snapshot.get, args=("hubbles_law", None, _slow_fetch))
+    refresh.start()
+    assert started.wait(5)
+
+    # The refresh is in flight, so this doesn't wait for it
+    measurements, _, _ = snapshot.get("hubbles_law", None, _fail)
+    assert len(measurements) == 1
+    assert snapshot.stats["stale_hits"] == 1
+
+    release.set()
+    refresh.join(5)
+    assert len(snapshot._stories["hubbles_law"].snapshot.measurements) == 2
+
+
+def test_incremental_refresh_is_opt_in():
+    watermarks = []
+
+    def _fetch(since):
+        watermarks.append(since)
+        return _payload(1)
+
+    snapshot = AllDataSnapshot(ttl=0, full_refresh=3600)
+    snapshot.get("hubbles_law", None, _fetch)
+    snapshot.get("hubbles_law", None, _fetch)
+
+    assert watermarks == [None, None]
+
+
+@pytest.mark.parametrize(
+    "since,expected",
+    [
+        ("2024-01-01T12:00:00", [2]),
+        ("2024-01-01T12:00:00+00:00", [2]),
+        ("2024-01-01T14:00:00+02:00", [2]),
+        ("2024-01-01T12:00:00-02:00", []),
+    ],
+)
+def test_stand_in_compares_naive_and_aware_watermarks(since, expected):
+    TestClient = pytest.importorskip("starlette.testclient").TestClient
+    from hubbleds.stand_in import ALL_DATA, app
+
+    client = TestClient(app)
+    url = "/hubbles_law/all-data"
+    client.put(url, json={"studentData": [
+        {"student_id": 1, "last_data_update": "2024-01-01T11:00:00"},
+        {"student_id": 2, "last_data_update": "2024-01-01T13:00:00+00:00"},
+    ]})
+
+    r = client.get(url, params={"since": since})
+    assert r.status_code == 200
+    assert [row["student_id"] for row in r.json()["studentData"]] == expected
+
+    ALL_DATA.clear()
@@ -0,0 +1,90 @@
+import pytest
+
+from hubbleds.cache import NOT_MODIFIED, RevalidatingCache
+
+
+def test_entries_are_revalidated_after_ttl():
+    cache = RevalidatingCache(ttl=0, name="test cache")
+    validators = []
+
+    def _fetch(validator):
+        validators.append(validator)
+        return NOT_MODIFIED if validator == "v1" else ("catalog", "v1")
+
+    assert cache.get("story", _fetch) == "catalog"
+    assert cache.get("story", _fetch) == "catalog"
+    assert validators == [None, "v1"]
+    assert cache.stats["refreshed"] == 1
+    assert cache.stats["revalidated"] == 1
+
+
+def test_invalidation_during_fetch_is_not_overwritten():
+    cache = RevalidatingCache(ttl=60, name="test cache")
+
+    def _stale_fetch(validator):
+        # The student submits measurements while this fetch is in flight
+        cache.invalidate("class")
+        return "stale", None
+
+    assert cache.get("class", _stale_fetch) == "stale"
+    assert cache.get("class", lambda validator: ("fresh", None)) == "fresh"
+
+
+def test_full_invalidation_during_fetch_is_not_overwritten():
+    cache = RevalidatingCache(ttl=60, name="test cache")
+
+    def _stale_fetch(validator):
+        cache.invalidate()
+        return "stale", None
+
+    cache.get("class", _stale_fetch)
+    assert cache.stats["entries"] == 0
+
+
+def test_key_locks_are_dropped_after_fetch():
+    cache = RevalidatingCache(ttl=60, name="test cache")
+
+    def _fetch(validator):
+        cache.invalidate("class 1")
+        return "measurements", None
+
+    for key in ("class 1", "class 2"):
+        cache.get(key, _fetch)
+        cache.invalidate(key)
+
+    assert cache._key_locks == {}
+    assert cache._key_generations == {}
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = RevalidatingCache(ttl=60, max_entries=2, name="test cache")
+
+    cache.get("class 1", lambda validator: ("class 1 data", None))
+    cache.get("class 2", lambda validator: ("class 2 data", None))
+    # Reading "class 1" makes "class 2" the least recently used
+    cache.get("class 1", lambda validator: pytest.fail("Entry is fresh"))
+    cache.get("class 3", lambda validator: ("class 3 data", None))
+
+    assert list(cache._entries) == ["class 1", "class 3"]
+    assert cache.stats["evictions"] == 1
+    assert cache.get("class 2", lambda validator: ("class 2 data", None)) == "class 2 data"
+
+
+def test_not_modified_without_entry_is_a_miss():
+    cache = RevalidatingCache(ttl=60, name="test cache")
+    results = iter([NOT_MODIFIED, ("catalog", "v1")])
+
+    assert cache.get("story", lambda validator: next(results)) == "catalog"
+    assert cache.get("story", lambda validator: pytest.fail("Entry is fresh")) == "catalog"
+
+
+def test_failed_fetch_serves_stale_entry():
+    cache = RevalidatingCache(ttl=0, name="test cache")
+    cache.get("story", lambda validator: ("catalog", "v1"))
+
+    def _fail(validator):
+        raise ConnectionError("Server unavailable")
+
+    assert cache.get("story", _fail) == "catalog"
+    with pytest.raises(ConnectionError):
+        cache.get("other story", _fail)
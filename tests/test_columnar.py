@@ -0,0 +1,49 @@
+import json
+
+from numpy import isnan
+
+from hubbleds.columnar import parse_all_data
+
+
+def _measurement(student_id, class_id, **fields):
+    return {"student_id": student_id, "class_id": class_id, **fields}
+
+
+def test_parse_all_data_missing_and_null_fields():
+    content = json.dumps({
+        "measurements": [
+            _measurement(1, 10, galaxy={"id": 5}, velocity_value=1500.0, est_dist_value=None),
+            _measurement(2, 10, galaxy_id=6),
+            # Rows without a class are dropped
+            _measurement(3, None, velocity_value=900.0),
+            {"student_id": 4},
+        ],
+        "studentData": [{"student_id": 1, "last_data_update": None}],
+        "classData": [],
+    }).encode()
+
+    payload = parse_all_data(content)
+    table = payload.measurements
+
+    assert len(table) == 2
+    assert table.values("student_id").tolist() == [1, 2]
+    assert table.values("galaxy_id").tolist() == [5, 6]
+
+    assert table.nulls("velocity_value").tolist() == [False, True]
+    assert table.values("velocity_value")[0] == 1500.0
+    assert isnan(table.values("velocity_value")[1])
+    assert table.nulls("est_dist_value").all()
+    assert isnan(table.values("est_dist_value")).all()
+
+    assert payload.student_data == [{"student_id": 1, "last_data_update": None}]
+    assert payload.class_data == []
+    assert payload.since is None
+
+
+def test_parse_all_data_missing_sections():
+    payload = parse_all_data(b'{"since": "2024-09-01T12:00:00+00:00"}')
+
+    assert len(payload.measurements) == 0
+    assert payload.student_data == []
+    assert payload.class_data == []
+    assert payload.since == "2024-09-01T12:00:00+00:00"
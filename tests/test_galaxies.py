@@ -0,0 +1,57 @@
+import pytest
+from pydantic import ValidationError
+
+from hubbleds import galaxies
+from hubbleds.galaxies import intern_galaxy
+
+
+def _galaxy_json(galaxy_id: int, **fields) -> dict:
+    return {
+        "id": galaxy_id,
+        "name": f"J{galaxy_id:06d}+000000.0.fits",
+        "ra": 150.0,
+        "decl": 2.0,
+        "z": 0.01,
+        "type": "Sp",
+        "element": "H-α",
+        **fields,
+    }
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    monkeypatch.setattr(galaxies, "_GALAXY_REGISTRY", galaxies.OrderedDict())
+    return galaxies._GALAXY_REGISTRY
+
+
+def test_identical_data_shares_instance():
+    galaxy = intern_galaxy(_galaxy_json(1))
+    assert intern_galaxy(_galaxy_json(1)) is galaxy
+    assert intern_galaxy(galaxy.model_copy()) is galaxy
+
+
+def test_changed_data_is_not_shared():
+    galaxy = intern_galaxy(_galaxy_json(1))
+    changed = intern_galaxy(_galaxy_json(1, z=0.02))
+
+    assert changed is not galaxy
+    assert changed.z == 0.02
+    assert intern_galaxy(_galaxy_json(1)) is galaxy
+
+
+def test_partial_data_is_validated():
+    intern_galaxy(_galaxy_json(1))
+    with pytest.raises(ValidationError):
+        intern_galaxy({"id": 1})
+
+
+def test_registry_is_bounded(monkeypatch, registry):
+    monkeypatch.setattr(galaxies, "GALAXY_REGISTRY_SIZE", 2)
+    first = intern_galaxy(_galaxy_json(1))
+    intern_galaxy(_galaxy_json(2))
+    # Using the first galaxy again keeps it over the second
+    intern_galaxy(_galaxy_json(1))
+    intern_galaxy(_galaxy_json(3))
+
+    assert list(registry) == [1, 3]
+    assert intern_galaxy(_galaxy_json(1)) is first
@@ -0,0 +1,86 @@
+import pytest
+
+from hubbleds.json_patch import apply_patch, make_patch
+
+OLD_STATE = {
+    "app": {"update_db": True, "speech": {}},
+    "story": {
+        "mc_scoring": {"scores": {"mc-1": {"score": 10, "tries": 1}}},
+        "responses": ["a", "b"],
+        "a/b": 1,
+        "~tilde": 2,
+        "removed": None,
+    },
+}
+
+NEW_STATE = {
+    "app": {"update_db": False, "speech": {"rate": 1.0}},
+    "story": {
+        "mc_scoring": {"scores": {"mc-1": {"score": 5, "tries": 2}, "mc-2": {"score": 10}}},
+        "responses": ["a", "c", "d"],
+        "a/b": 3,
+        "~tilde": 2,
+    },
+    "added": [1, 2],
+}
+
+
+def test_round_trip():
+    patch = make_patch(OLD_STATE, NEW_STATE)
+
+    assert apply_patch(OLD_STATE, patch) == NEW_STATE
+    assert make_patch(NEW_STATE, NEW_STATE) == []
+    # The original document is left as it was
+    assert "removed" in OLD_STATE["story"]
+
+
+def test_unchanged_nan_needs_no_operation():
+    old = {"story": {"best_fit_slope": float("nan"), "ages": [1.0, float("nan")]}}
+    new = {"story": {"best_fit_slope": float("nan"), "ages": [1.0, float("nan")]}}
+
+    assert make_patch(old, new) == []
+
+    new["story"]["best_fit_slope"] = 70.0
+    assert make_patch(old, new) == [
+        {"op": "replace", "path": "/story/best_fit_slope", "value": 70.0}
+    ]
+
+
+def test_round_trip_through_stand_in():
+    TestClient = pytest.importorskip("starlette.testclient").TestClient
+    from hubbleds.stand_in import STORY_STATES, app
+
+    client = TestClient(app)
+    url = "/story-state/1/hubbles_law"
+
+    assert client.put(url, json=OLD_STATE, headers={"X-State-Version": "1"}).status_code == 200
+
+    patch = make_patch(OLD_STATE, NEW_STATE)
+    r = client.patch(
+        url,
+        json=patch,
+        headers={"If-Match": '"1"', "X-State-Version": "2"},
+    )
+    assert r.status_code == 200
+    assert r.headers["ETag"] == '"2"'
+
+    r = client.get(url)
+    assert r.json() == {"version": 2, "state": NEW_STATE}
+
+    # Patches against an outdated version are rejected
+    r = client.patch(
+        url,
+        json=patch,
+        headers={"If-Match": '"1"', "X-State-Version": "3"},
+    )
+    assert r.status_code == 412
+
+    # Patches are bare RFC 6902 arrays
+    r = client.patch(
+        url,
+        json={"patch": patch},
+        headers={"If-Match": '"2"', "X-State-Version": "3"},
+    )
+    assert r.status_code == 400
+
+    STORY_STATES.clear()
@@ -0,0 +1,83 @@
+from threading import Event
+
+from hubbleds.polling import FanOutPoller
+
+
+def test_subscribers_share_one_poller():
+    poller = FanOutPoller(interval=0.01, name="test-poller")
+    received = Event()
+    values = []
+
+    def _callback(value):
+        values.append(value)
+        received.set()
+
+    unsubscribe_first = poller.subscribe("class-1", lambda: 3, _callback)
+    unsubscribe_second = poller.subscribe("class-1", lambda: 4, lambda value: None)
+    assert received.wait(5)
+
+    assert poller.stats["pollers"] == 1
+    assert poller.stats["subscribers"] == 2
+    # Only the oldest subscriber's fetch is used, and unchanged values
+    #  aren't broadcast again
+    assert values == [3]
+
+    unsubscribe_first()
+    unsubscribe_second()
+    assert poller.stats["pollers"] == 0
+
+
+def test_thread_exits_after_last_unsubscribe():
+    poller = FanOutPoller(interval=0.01, name="test-poller")
+    fetched = Event()
+
+    def _fetch():
+        fetched.set()
+        return 1
+
+    unsubscribe = poller.subscribe("class-2", _fetch, lambda value: None)
+    thread = poller._polls["class-2"].thread
+    assert fetched.wait(5)
+
+    unsubscribe()
+    thread.join(5)
+
+    assert not thread.is_alive()
+    assert poller.stats == {"pollers": 0, "subscribers": 0, "fetches": poller.fetches, "broadcasts": 1}
+    # Unsubscribing twice is harmless
+    unsubscribe()
+
+
+def test_late_subscriber_gets_current_value():
+    poller = FanOutPoller(interval=0.01, name="test-poller")
+    received = Event()
+
+    unsubscribe_first = poller.subscribe("class-3", lambda: 7, lambda value: received.set())
+    assert received.wait(5)
+
+    values = []
+    unsubscribe_second = poller.subscribe("class-3", lambda: 8, values.append)
+    assert values == [7]
+
+    unsubscribe_first()
+    unsubscribe_second()
+
+
+def test_fetch_moves_to_remaining_subscriber():
+    poller = FanOutPoller(interval=0.01, name="test-poller")
+    received = Event()
+    values = []
+
+    def _callback(value):
+        values.append(value)
+        if value == 2:
+            received.set()
+
+    unsubscribe_first = poller.subscribe("class-4", lambda: 1, lambda value: None)
+    unsubscribe_second = poller.subscribe("class-4", lambda: 2, _callback)
+
+    # Once the first subscriber leaves, its fetch is no longer used
+    unsubscribe_first()
+    assert received.wait(5)
+
+    unsubscribe_second()
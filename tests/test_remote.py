@@ -0,0 +1,183 @@
+from types import SimpleNamespace
+
+import pytest
+from pydantic import BaseModel
+
+pytest.importorskip("cosmicds")
+
+import solara
+
+from hubbleds import remote
+from hubbleds.remote import BATCH_SUPPORTED, LocalAPI
+
+API_URL = "https://api.example.com"
+
+
+class _Response:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+        self.text = ""
+
+
+class _Session:
+    def __init__(self, batch_status: int, single_status: int = 200):
+        self.batch_status = batch_status
+        self.single_status = single_status
+        self.puts = []
+
+    def put(self, url, json=None):
+        self.puts.append((url, json))
+        if url.endswith("/batch"):
+            return _Response(self.batch_status)
+        return _Response(self.single_status)
+
+
+@pytest.fixture
+def api(monkeypatch):
+    monkeypatch.setattr(LocalAPI, "API_URL", API_URL, raising=False)
+    monkeypatch.setattr(remote, "MEASUREMENT_BATCH_URL", None)
+    BATCH_SUPPORTED.clear()
+    yield LocalAPI.__new__(LocalAPI)
+    BATCH_SUPPORTED.clear()
+
+
+def _use_session(monkeypatch, session: _Session):
+    monkeypatch.setattr(LocalAPI, "request_session", session, raising=False)
+
+
+PAYLOADS = [{"galaxy_id": 1}, {"galaxy_id": 2}]
+BATCH_URL = f"{API_URL}/hubbles_law/submit-measurement/batch"
+SINGLE_URL = f"{API_URL}/hubbles_law/submit-measurement/"
+
+
+def test_batch_write(api, monkeypatch):
+    session = _Session(batch_status=200)
+    _use_session(monkeypatch, session)
+
+    stored = api._put_measurement_batch("hubbles_law", "submit-measurement", PAYLOADS)
+
+    assert stored == [True, True]
+    assert session.puts == [(BATCH_URL, {"measurements": PAYLOADS})]
+
+
+@pytest.mark.parametrize("status_code", [404, 405, 501])
+def test_falls_back_to_single_writes(api, monkeypatch, status_code):
+    session = _Session(batch_status=status_code)
+    _use_session(monkeypatch, session)
+
+    stored = api._put_measurement_batch("hubbles_law", "submit-measurement", PAYLOADS)
+
+    assert stored == [True, True]
+    assert [url for url, _ in session.puts] == [BATCH_URL, SINGLE_URL, SINGLE_URL]
+    assert BATCH_SUPPORTED[BATCH_URL] is False
+
+    # The unsupported endpoint isn't tried again
+    session.puts.clear()
+    api._put_measurement_batch("hubbles_law", "submit-measurement", PAYLOADS)
+    assert [url for url, _ in session.puts] == [SINGLE_URL, SINGLE_URL]
+
+
+def test_failed_batch_is_not_retried_singly(api, monkeypatch):
+    session = _Session(batch_status=500)
+    _use_session(monkeypatch, session)
+
+    stored = api._put_measurement_batch("hubbles_law", "submit-measurement", PAYLOADS)
+
+    assert stored == [False, False]
+    assert [url for url, _ in session.puts] == [BATCH_URL]
+    assert BATCH_URL not in BATCH_SUPPORTED
+
+
+def test_single_measurement_skips_batch(api, monkeypatch):
+    session = _Session(batch_status=200, single_status=500)
+    _use_session(monkeypatch, session)
+
+    stored = api._put_measurement_batch("hubbles_law", "submit-measurement", PAYLOADS[:1])
+
+    assert stored == [False]
+    assert session.puts == [(SINGLE_URL, PAYLOADS[0])]
+
+
+def test_acknowledged_measurements_are_dropped_with_session(monkeypatch):
+    monkeypatch.setattr(remote, "ACKNOWLEDGED_MEASUREMENTS", {})
+    context = SimpleNamespace(id="session")
+    monkeypatch.setattr(remote.kernel_context, "has_current_context", lambda: True)
+    monkeypatch.setattr(remote.kernel_context, "get_current_context", lambda: context)
+
+    remote._session_measurements(("story", 1, "submit-measurement"))[(1, 1)] = {}
+    assert "session" in remote.ACKNOWLEDGED_MEASUREMENTS
+
+    remote._on_kernel_start()()
+    assert "session" not in remote.ACKNOWLEDGED_MEASUREMENTS
+
+
+class _PatchSession:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+        self.patches = []
+
+    def patch(self, url, headers=None, data=None):
+        self.patches.append(url)
+        return _Response(self.status_code)
+
+
+def test_unsupported_patch_endpoint_is_not_tried_for_other_students(api, monkeypatch):
+    monkeypatch.setattr(remote, "STORY_STATE_URL", None)
+    monkeypatch.setattr(remote, "PATCH_SUPPORTED", {})
+    session = _PatchSession(status_code=405)
+    _use_session(monkeypatch, session)
+
+    assert api._patch_story_state(1, "hubbles_law", 1, [{"op": "add"}]) is None
+    assert remote.PATCH_SUPPORTED == {f"{API_URL}/story-state": False}
+
+    assert api._patch_story_state(2, "hubbles_law", 1, [{"op": "add"}]) is None
+    assert session.patches == [f"{API_URL}/story-state/1/hubbles_law"]
+
+
+class _StageState(BaseModel):
+    stage_id: str = "explore_data"
+    current_step: int = 0
+    fit_slope: float | None = None
+
+
+class _StateResponse(_Response):
+    def __init__(self, status_code: int, content: bytes):
+        super().__init__(status_code)
+        self.content = content
+
+
+class _GetSession:
+    def __init__(self, status_code: int, content: bytes):
+        self.response = _StateResponse(status_code, content)
+        self.gets = []
+
+    def get(self, url):
+        self.gets.append(url)
+        return self.response
+
+
+def _states():
+    global_state = SimpleNamespace(value=SimpleNamespace(student=SimpleNamespace(id=1)))
+    local_state = SimpleNamespace(value=SimpleNamespace(story_id="hubbles_law"))
+    return global_state, local_state
+
+
+def test_get_stage_state(api, monkeypatch):
+    session = _GetSession(200, b'{"state": {"current_step": 3, "fit_slope": null}}')
+    _use_session(monkeypatch, session)
+    component_state = solara.reactive(_StageState(fit_slope=1.5))
+
+    assert api.get_stage_state(*_states(), component_state) == _StageState(current_step=3)
+    assert component_state.value == _StageState(current_step=3)
+    assert session.gets == [f"{API_URL}/stage-state/1/hubbles_law/explore_data"]
+
+
+@pytest.mark.parametrize(
+    "status_code,content", [(200, b'{"state": null}'), (404, b"Not found")]
+)
+def test_missing_stage_state_is_kept(api, monkeypatch, status_code, content):
+    _use_session(monkeypatch, _GetSession(status_code, content))
+    component_state = solara.reactive(_StageState(current_step=2))
+
+    assert api.get_stage_state(*_states(), component_state) is None
+    assert component_state.value == _StageState(current_step=2)
@@ -0,0 +1,64 @@
+import datetime
+import enum
+import json
+
+import numpy as np
+import pytest
+from pydantic import BaseModel
+
+pytest.importorskip("cosmicds")
+
+from hubbleds.serialization import dump_model, dumps, loads
+
+
+class _Marker(enum.Enum):
+    first = 1
+
+
+class _StageState(BaseModel):
+    current_step: _Marker = _Marker.first
+    fit_slope: float = float("nan")
+    histogram_range: list[float] = [10.5, float("inf")]
+    updated: datetime.datetime = datetime.datetime(2024, 9, 1, 12, 30)
+
+
+def test_nan_and_infinity_are_null():
+    state = {
+        "nan": float("nan"),
+        "inf": float("-inf"),
+        "array": np.array([1.0, np.nan, np.inf]),
+        "scalar": np.float64("nan"),
+    }
+
+    assert loads(dumps(state)) == {
+        "nan": None,
+        "inf": None,
+        "array": [1.0, None, None],
+        "scalar": None,
+    }
+
+
+def test_dump_model():
+    assert loads(dump_model(_StageState())) == {
+        "current_step": 1,
+        "fit_slope": None,
+        "histogram_range": [10.5, None],
+        "updated": "2024-09-01T12:30:00",
+    }
+    assert "fit_slope" not in loads(dump_model(_StageState(), exclude={"fit_slope"}))
+
+
+def test_matches_json_for_finite_values():
+    state = {
+        "story": {"scores": {"mc-1": {"score": 10, "stage": 1}}, "ids": {1, 2}},
+        "ages": np.linspace(10, 15, 5),
+        "count": np.int64(3),
+    }
+    expected = {
+        "story": {"scores": {"mc-1": {"score": 10, "stage": 1}}, "ids": [1, 2]},
+        "ages": np.linspace(10, 15, 5).tolist(),
+        "count": 3,
+    }
+
+    assert loads(dumps(state)) == expected
+    assert json.loads(dumps(state)) == expected
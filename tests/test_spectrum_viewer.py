@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cosmicds")
+
+from hubbleds.components.spectrum_viewer.spectrum_viewer import (
+    _level_of_detail_indices,
+    _spectrum_figure,
+)
+from hubbleds.state import SpectrumData
+
+
+@pytest.fixture
+def spectrum():
+    wave = np.linspace(3800, 9200, 4000)
+    flux = 10 + np.sin(wave / 50)
+    flux[2000] = 40
+    return SpectrumData(name="galaxy", wave=wave, flux=flux, ivar=np.ones_like(wave))
+
+
+def test_spectrum_figure_from_spectrum_data(spectrum):
+    indices = _level_of_detail_indices(spectrum.wave, spectrum.flux, [], [6563])
+    wave, flux = spectrum.wave[indices], spectrum.flux[indices]
+
+    fig = _spectrum_figure(spectrum, wave, flux, [6000, 7000], "black")
+
+    assert len(fig.data[0].x) == len(indices) < len(spectrum.wave)
+    assert fig.layout.xaxis.range == (6000, 7000)
+    assert fig.layout.yaxis.range == pytest.approx(
+        (spectrum.flux.min() * 0.95, 40 * 1.25)
+    )
+
+
+def test_spectrum_figure_without_bounds(spectrum):
+    fig = _spectrum_figure(spectrum, spectrum.wave, spectrum.flux, [], "black")
+
+    assert fig.layout.xaxis.range is None
+
+
+def test_level_of_detail_follows_plot_width(spectrum):
+    narrow = _level_of_detail_indices(spectrum.wave, spectrum.flux, [], [], plot_width=400)
+    wide = _level_of_detail_indices(spectrum.wave, spectrum.flux, [], [], plot_width=1000)
+
+    # About the min and max of each pixel column of the plot area
+    assert len(narrow) <= 2 * 400 + 2 < len(wide) <= 2 * 1000 + 2
+    assert 2000 in narrow
+
+
+def test_zoomed_window_is_full_resolution(spectrum):
+    bounds = [6000, 6500]
+    indices = _level_of_detail_indices(spectrum.wave, spectrum.flux, bounds, [], plot_width=400)
+
+    window = np.flatnonzero((spectrum.wave >= 6000) & (spectrum.wave <= 6500))
+    assert np.isin(window, indices).all()
@@ -0,0 +1,29 @@
+from copy import copy
+
+import pytest
+
+pytest.importorskip("cosmicds")
+
+from hubbleds.state import ListIndex
+
+
+def test_list_index_finds_items_replaced_in_place():
+    items = [1, 2, 3]
+    index = ListIndex(lambda x: x)
+    assert index.position(items, 3) == 2
+
+    items[0] = 4
+    assert index.position(items, 4) == 0
+    assert index.position(items, 1) is None
+
+
+def test_list_index_copies_are_independent():
+    first = [1, 2, 3]
+    second = [3, 2, 1]
+    index = ListIndex(lambda x: x)
+    assert index.position(first, 1) == 0
+
+    copied = copy(index)
+    assert copied.position(second, 1) == 2
+    assert index.position(first, 1) == 0
+    assert index._items is first
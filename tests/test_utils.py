@@ -0,0 +1,173 @@
+import math
+
+import numpy as np
+import pytest
+
+pytest.importorskip("cosmicds")
+
+from astropy.modeling import fitting, models
+
+from hubbleds.utils import create_single_summary, fit_line
+
+
+def _astropy_slope(x, y, weights=None):
+    fit = fitting.LinearLSQFitter()
+    line_init = models.Linear1D(intercept=0, fixed={"intercept": True})
+    return fit(line_init, x, y, weights=weights).slope.value
+
+
+@pytest.fixture
+def points():
+    rng = np.random.default_rng(42)
+    x = rng.uniform(10, 500, 150)
+    y = 70 * x + rng.normal(0, 800, 150)
+    return x, y
+
+
+def test_fit_line_matches_astropy(points):
+    x, y = points
+    line = fit_line(x, y)
+
+    assert line.slope.value == pytest.approx(_astropy_slope(x, y))
+    assert line.intercept.value == 0
+    assert line(np.array([0, 100])) == pytest.approx([0, 100 * line.slope.value])
+
+
+def test_fit_line_weights_match_astropy(points):
+    x, y = points
+    weights = np.random.default_rng(7).uniform(0.1, 2, x.size)
+
+    assert fit_line(x, y, weights).slope.value == pytest.approx(
+        _astropy_slope(x, y, weights)
+    )
+
+
+def test_fit_line_ignores_missing_points(points):
+    x, y = points
+    weights = np.ones_like(x)
+    x_missing, y_missing = x.copy(), y.astype(object)
+    x_missing[0] = np.nan
+    y_missing[1] = None
+    weights[2] = np.nan
+
+    valid = np.ones(x.size, dtype=bool)
+    valid[:3] = False
+
+    assert fit_line(x_missing, y_missing, weights).slope.value == pytest.approx(
+        _astropy_slope(x[valid], y[valid])
+    )
+
+
+@pytest.mark.parametrize("x, y", [([], []), ([np.nan], [1.0]), ([0.0, 0.0], [1.0, 2.0])])
+def test_fit_line_without_points(x, y):
+    line = fit_line(x, y)
+
+    assert math.isnan(line.slope.value)
+    h0, age = create_single_summary(x, y)
+    assert math.isnan(h0) and math.isnan(age)
+
+
+def test_failed_fit_has_nan_slope(points, monkeypatch):
+    class _FailingFitter:
+        def __call__(self, *args, **kwargs):
+            raise ValueError("Fit failed")
+
+    monkeypatch.setattr(fitting, "LinearLSQFitter", _FailingFitter)
+    line = fit_line(*points, through_origin=False)
+
+    assert math.isnan(line.slope.value)
+
+
+@pytest.fixture(scope="module")
+def exact_age():
+    from hubbleds.utils import _exact_age_in_gyr
+
+    return np.vectorize(_exact_age_in_gyr)
+
+
+def test_age_in_gyr_array(exact_age):
+    from hubbleds.utils import AGE_TABLE_TOLERANCE, age_in_gyr
+
+    h0 = np.random.default_rng(1).uniform(10, 300, 100).reshape(10, 10)
+    ages = age_in_gyr(h0)
+
+    assert ages.shape == h0.shape
+    assert ages == pytest.approx(exact_age(h0), rel=AGE_TABLE_TOLERANCE)
+
+
+def test_age_in_gyr_scalar(exact_age):
+    from hubbleds.utils import AGE_TABLE_TOLERANCE, age_in_gyr
+
+    age = age_in_gyr(70)
+
+    assert isinstance(age, np.float64)
+    assert age == pytest.approx(exact_age(70), rel=AGE_TABLE_TOLERANCE)
+
+
+def test_age_in_gyr_above_table(exact_age):
+    from hubbleds.utils import AGE_TABLE_H0_RANGE, age_in_gyr
+
+    _, high = AGE_TABLE_H0_RANGE
+    h0 = np.array([high, high * 2, high * 100])
+
+    assert age_in_gyr(h0) == pytest.approx(exact_age(h0), rel=1e-6)
+
+
+def test_age_in_gyr_below_table(exact_age):
+    from hubbleds.utils import AGE_TABLE_H0_RANGE, age_in_gyr
+
+    low, _ = AGE_TABLE_H0_RANGE
+    h0 = np.array([low / 100, low / 2, 70])
+
+    assert age_in_gyr(h0) == pytest.approx(exact_age(h0), rel=1e-4)
+    assert age_in_gyr(low / 2) == exact_age(low / 2)
+
+
+def test_age_in_gyr_non_positive():
+    from hubbleds.utils import age_in_gyr
+
+    assert np.isnan(age_in_gyr([0, -70, np.nan])).all()
+    assert np.isnan(age_in_gyr(0))
+
+
+def test_age_table_matches_cosmology(exact_age):
+    from hubbleds.utils import AGE_TABLE_PATH, planck
+
+    with open(AGE_TABLE_PATH) as f:
+        assert f.readline().lstrip("#").strip() == planck.name
+    h0, scaled = np.loadtxt(AGE_TABLE_PATH, delimiter=",", unpack=True)
+    assert scaled[::64] == pytest.approx(h0[::64] * exact_age(h0[::64]))
+
+
+def test_summarize_values():
+    from hubbleds.utils import summarize_values
+
+    summary = summarize_values([1, 2, 2.1, 2.2, 9, 10, np.nan])
+
+    assert summary.mean == pytest.approx(26.3 / 6)
+    assert summary.median == pytest.approx(2.15)
+    assert summary.percent_interval(100) == (1, 10)
+    assert summarize_values([3, 4, 4, 3]).median == 3.5
+    assert math.isnan(summarize_values([np.nan]).mean)
+    assert all(math.isnan(v) for v in summarize_values([np.nan]).percent_interval(50))
+
+
+def test_component_summary_is_cached_per_version():
+    from glue.core import Data
+
+    from hubbleds.utils import STATISTICS_CACHE, component_summary
+
+    data = Data(x=np.array([1.0, 2.0, 2.0, 3.0]), label="ages")
+    component_id = data.id["x"]
+
+    summary = component_summary(data, component_id)
+    assert component_summary(data, component_id) is summary
+    assert summary.median == 2
+
+    # Updated values replace the component's array
+    data.update_components({component_id: np.array([10.0, 20.0])})
+    assert component_summary(data, component_id).mean == 15
+
+    # The cache doesn't keep the values themselves alive
+    values_ref, _ = STATISTICS_CACHE.get((data.uuid, "x"))
+    assert values_ref() is data[component_id]
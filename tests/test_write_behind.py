@@ -0,0 +1,132 @@
+from contextlib import nullcontext
+from time import sleep
+
+import pytest
+from pydantic import BaseModel
+
+from hubbleds import write_behind
+from hubbleds.write_behind import (
+    MEASUREMENTS_WRITE,
+    STATE_WRITES,
+    STORY_STATE_WRITE,
+    WriteBehindQueue,
+    state_writes,
+)
+
+
+def test_writes_are_coalesced_by_key():
+    writes = []
+    queue = WriteBehindQueue(nullcontext(), window=60)
+
+    for value in range(5):
+        queue.schedule("story-state", writes.append, ("story", value))
+    queue.schedule("measurements", writes.append, ("measurements", 0))
+
+    assert writes == []
+    assert queue.depth == 2
+
+    queue.flush()
+
+    assert writes == [("story", 4), ("measurements", 0)]
+    assert queue.depth == 0
+    assert queue.stats["requested"] == 6
+    assert queue.stats["executed"] == 2
+    assert queue.coalescing_ratio == 3
+
+
+def test_close_flushes_pending_and_later_writes():
+    writes = []
+    queue = WriteBehindQueue(nullcontext(), window=60)
+
+    queue.schedule("story-state", writes.append, 1)
+    queue.close()
+    assert writes == [1]
+
+    # Writes scheduled after closing run immediately
+    queue.schedule("story-state", writes.append, 2)
+    assert writes == [1, 2]
+    assert queue.depth == 0
+
+
+def test_failed_write_does_not_stop_others():
+    writes = []
+
+    def _fail(_):
+        raise RuntimeError("Server unavailable")
+
+    queue = WriteBehindQueue(nullcontext(), window=60)
+    queue.schedule("story-state", _fail, 1)
+    queue.schedule("measurements", writes.append, 2)
+    queue.flush()
+
+    assert writes == [2]
+    assert queue.executed == 2
+
+
+def test_continuous_writes_run_after_max_wait():
+    writes = []
+    queue = WriteBehindQueue(nullcontext(), window=0.2, max_wait=0.3)
+
+    # Changes keep arriving within the quiet window
+    for value in range(8):
+        queue.schedule("story-state", writes.append, value)
+        sleep(0.05)
+
+    sleep(0.1)
+    assert writes and writes[0] < 7
+    queue.close()
+    assert writes[-1] == 7
+
+
+def test_route_change_delivers_pending_writes(monkeypatch):
+    pytest.importorskip("cosmicds")
+    from hubbleds.layout import _on_route_change
+
+    writes = []
+    queue = WriteBehindQueue(nullcontext(), window=60)
+    monkeypatch.setattr(write_behind, "write_queue", lambda: queue)
+
+    queue.schedule("stage-state", writes.append, "stage")
+    queue.schedule("story-state", writes.append, "story")
+    _on_route_change("02-distance-introduction", 2)
+
+    # The writes of the previous page were sent before the route change
+    #  returned, well within the quiet window
+    assert writes == ["stage", "story"]
+    assert queue.depth == 0
+
+
+class _GlobalState(BaseModel):
+    update_db: bool = True
+
+
+class _LocalState(BaseModel):
+    piggybank_total: int = 0
+    measurements: list[int] = []
+    show_snackbar: bool = False
+    class_measurements: list[int] = []
+
+
+def test_first_persist_needs_every_write():
+    assert state_writes(None, (_GlobalState(), _LocalState())) == set(STATE_WRITES)
+
+
+def test_only_changed_persistent_fields_are_written():
+    global_state, local_state = _GlobalState(), _LocalState()
+    previous = (global_state, local_state)
+
+    # UI-only and derived fields need no write
+    current = (
+        global_state,
+        local_state.model_copy(update={"show_snackbar": True, "class_measurements": [1]}),
+    )
+    assert state_writes(previous, current) == set()
+
+    current = (global_state, local_state.model_copy(update={"measurements": [1]}))
+    assert state_writes(previous, current) == {MEASUREMENTS_WRITE}
+
+    current = (
+        global_state.model_copy(update={"update_db": False}),
+        local_state.model_copy(update={"piggybank_total": 5}),
+    )
+    assert state_writes(previous, current) == {STORY_STATE_WRITE}